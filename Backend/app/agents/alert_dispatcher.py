@@ -0,0 +1,113 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from app.utils.cache import LRUCache
+
+class AlertDispatcher:
+    """Runs budget evaluations off the request path and pushes the results to subscribers.
+
+    Evaluations are queued per `auth_id` and drained by a fixed pool of worker
+    tasks, which bounds how many LLM checks run at once. A user with an
+    evaluation already queued is not queued twice - the pending check will
+    see the newest spends anyway.
+
+    With `band`, a cheap read of the user's threshold band (ok / warning /
+    critical) runs first, and the evaluation only runs - and an alert is only
+    published - when the band differs from the last one announced.
+    """
+
+    def __init__(self, evaluate: Callable[[str], Awaitable[Any]],
+                 band: Optional[Callable[[str], Awaitable[str]]] = None,
+                 workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 max_users: Optional[int] = None):
+        self.evaluate = evaluate
+        self.band = band
+        # auth_id -> last band announced to the user
+        self.bands = LRUCache(max_entries=max_users or int(os.getenv("ALERT_MAX_USERS", "10000")))
+        self.skipped = 0
+        self.workers = workers or int(os.getenv("ALERT_WORKERS", "4"))
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or int(os.getenv("ALERT_QUEUE_SIZE", "1000")))
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._pending: Set[str] = set()
+        self._tasks = []
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, auth_id: str) -> bool:
+        """Queue a budget evaluation; returns False if it was coalesced or dropped"""
+        if auth_id in self._pending:
+            return False
+        try:
+            self.queue.put_nowait(auth_id)
+        except asyncio.QueueFull:
+            print(f"Alert queue full, dropping budget check for {auth_id}")
+            return False
+        self._pending.add(auth_id)
+        return True
+
+    async def _worker(self):
+        while True:
+            auth_id = await self.queue.get()
+            self._pending.discard(auth_id)
+            try:
+                state = await self.band(auth_id) if self.band else None
+                if state is not None and not self.band_changed(auth_id, state):
+                    self.skipped += 1
+                    continue
+                text = await self.evaluate(auth_id)
+                self.publish(auth_id, {
+                    "type": "budget_alert",
+                    "auth_id": auth_id,
+                    "text": text,
+                    "state": state,
+                    "created_at": datetime.now(timezone.utc).isoformat()
+                })
+                if state is not None:
+                    self.bands.set(auth_id, state)
+            except Exception as e:
+                print(f"Alert worker error for {auth_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def band_changed(self, auth_id: str, state: str) -> bool:
+        """Whether `state` differs from the last band announced (unknown counts as ok)"""
+        return self.bands.peek(auth_id, "ok") != state
+
+    def announce_band(self, auth_id: str, state: str, alert: Dict[str, Any]) -> bool:
+        """Publish `alert` only if the band changed since the last announcement"""
+        if not self.band_changed(auth_id, state):
+            self.skipped += 1
+            return False
+        self.publish(auth_id, alert)
+        self.bands.set(auth_id, state)
+        return True
+
+    # Subscribers (one queue per open stream)
+    def subscribe(self, auth_id: str) -> asyncio.Queue:
+        stream: asyncio.Queue = asyncio.Queue(maxsize=100)
+        self.subscribers.setdefault(auth_id, set()).add(stream)
+        return stream
+
+    def unsubscribe(self, auth_id: str, stream: asyncio.Queue):
+        streams = self.subscribers.get(auth_id)
+        if streams:
+            streams.discard(stream)
+            if not streams:
+                del self.subscribers[auth_id]
+
+    def publish(self, auth_id: str, alert: Dict[str, Any]):
+        for stream in self.subscribers.get(auth_id, ()):
+            if stream.full():
+                # Slow consumer - drop its oldest alert rather than block the workers
+                stream.get_nowait()
+            stream.put_nowait(alert)
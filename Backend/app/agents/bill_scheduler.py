@@ -0,0 +1,228 @@
+import asyncio
+import heapq
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+def parse_date(value) -> Optional[date]:
+    """Parse a 'YYYY-MM-DD' (or ISO timestamp) column value"""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+def effective_due_date(bill: Dict[str, Any]) -> Optional[date]:
+    """Recurring bills roll forward via next_payment_date; fall back to due_date"""
+    return parse_date(bill.get("next_payment_date")) or parse_date(bill.get("due_date"))
+
+def is_autopay(bill: Dict[str, Any]) -> bool:
+    return bool(bill.get("autopay") or bill.get("auto_payment_enabled", False))
+
+class BillScheduler:
+    """Settles autopay bills when they fall due.
+
+    Upcoming bills across all users live in a min-heap ordered by due time.
+    The loop sleeps until the earliest entry is due (or until a new bill is
+    tracked), then dispatches settlements for everything due with bounded
+    concurrency. Stale heap entries are skipped lazily. Every process keeps
+    its own heap; PaymentAgent claims each bill cycle with a conditional
+    update, so when several workers dispatch the same bill only one pays.
+    """
+
+    def __init__(self, supabase_manager, payment_agent, concurrency: Optional[int] = None,
+                 page_size: Optional[int] = None, retry_seconds: Optional[float] = None):
+        self.supabase_manager = supabase_manager
+        self.payment_agent = payment_agent
+        self.semaphore = asyncio.Semaphore(concurrency or int(os.getenv("SCHEDULER_CONCURRENCY", "8")))
+        self.page_size = page_size or int(os.getenv("SCHEDULER_PAGE_SIZE", "1000"))
+        self.retry_seconds = retry_seconds or float(os.getenv("SCHEDULER_RETRY_SECONDS", "900"))
+        self._heap = []
+        # bill_id -> (due_at, auth_id) for the live entry of each bill
+        self._entries: Dict[str, Tuple[datetime, str]] = {}
+        # Known autopay bills: bill_id -> last due date settled by this scheduler
+        self._settled: Dict[str, Optional[date]] = {}
+        self._in_flight = set()
+        self._attempts: Dict[str, int] = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.dispatched = 0
+        self.failed = 0
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # Index maintenance
+    def track(self, bill: Dict[str, Any], auth_id: Optional[str] = None):
+        """Add, move or drop a bill's entry based on its current row"""
+        bill_id = str(bill["id"])
+        due = effective_due_date(bill)
+        if bill.get("status", "active") != "active" or not is_autopay(bill) or due is None:
+            self._forget(bill_id)
+            return
+        settled = self._settled.setdefault(bill_id, None)
+        if bill_id in self._in_flight or (settled and due <= settled):
+            # Being paid right now, or a stale read of a cycle already paid
+            return
+        self._schedule(bill_id, auth_id or bill["auth_id"], datetime.combine(due, time.min))
+
+    def reschedule(self, bill_id: str, auth_id: str, update_data: Dict[str, Any]):
+        """Apply a settlement's payments update to the index"""
+        bill_id = str(bill_id)
+        if bill_id not in self._settled:
+            return
+        current = self._entries.get(bill_id)
+        if current:
+            # The cycle that was pending is now paid; ignore stale reads of it
+            self._settled[bill_id] = current[0].date()
+        next_date = parse_date(update_data.get("next_payment_date"))
+        if update_data.get("status") != "active" or next_date is None:
+            self._forget(bill_id)
+            return
+        self._schedule(bill_id, auth_id, datetime.combine(next_date, time.min))
+
+    def _forget(self, bill_id: str):
+        self._entries.pop(bill_id, None)
+        self._settled.pop(bill_id, None)
+
+    def _schedule(self, bill_id: str, auth_id: str, due_at: datetime):
+        if self._entries.get(bill_id) == (due_at, auth_id):
+            return
+        self._entries[bill_id] = (due_at, auth_id)
+        heapq.heappush(self._heap, (due_at, bill_id, auth_id))
+        if self._heap[0][1] == bill_id:
+            # New earliest entry - let the loop recompute its sleep
+            self._wakeup.set()
+
+    def _peek(self) -> Optional[datetime]:
+        while self._heap:
+            due_at, bill_id, auth_id = self._heap[0]
+            if self._entries.get(bill_id) == (due_at, auth_id):
+                return due_at
+            heapq.heappop(self._heap)
+        return None
+
+    def _pop_due(self, now: datetime) -> Dict[str, list]:
+        due: Dict[str, list] = {}
+        while self._heap and self._peek() is not None and self._heap[0][0] <= now:
+            due_at, bill_id, auth_id = heapq.heappop(self._heap)
+            del self._entries[bill_id]
+            due.setdefault(auth_id, []).append((bill_id, due_at))
+        return due
+
+    async def load(self):
+        """Bootstrap the index with a keyset-paged scan of active bills"""
+        last_id = None
+        loaded = 0
+        while True:
+            query = self.supabase_manager.table("payments")\
+                .select("*")\
+                .eq("status", "active")\
+                .order("id")\
+                .limit(self.page_size)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            result = await query.execute()
+            rows = result.data or []
+            for bill in rows:
+                try:
+                    self.track(bill)
+                except (KeyError, ValueError) as e:
+                    print(f"Skipping bill {bill.get('id')}: {e}")
+            loaded += len(rows)
+            if len(rows) < self.page_size:
+                break
+            last_id = rows[-1]["id"]
+        print(f"📅 Bill scheduler indexed {len(self._entries)} autopay bills ({loaded} scanned)")
+
+    # Dispatch loop
+    async def _run(self):
+        try:
+            await self.load()
+        except Exception as e:
+            print(f"Bill scheduler load error: {e}")
+        
+        while True:
+            next_due = self._peek()
+            timeout = None if next_due is None else max(0.0, (next_due - datetime.now()).total_seconds())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            
+            due = self._pop_due(datetime.now())
+            if due:
+                await asyncio.gather(*[self._settle(auth_id, bills) for auth_id, bills in due.items()])
+
+    async def _settle(self, auth_id: str, bills):
+        async with self.semaphore:
+            bill_ids = [bill_id for bill_id, _ in bills]
+            self._in_flight.update(bill_ids)
+            # Key on bill, cycle and attempt so a duplicate dispatch can't double-pay
+            key = "autopay:" + ",".join(
+                f"{bill_id}@{due_at.date()}#{self._attempts.get(bill_id, 0)}" for bill_id, due_at in bills
+            )
+            try:
+                result = await self.payment_agent.pay_bills(bill_ids, auth_id, idempotency_key=key)
+                outcomes = {r["bill_id"]: r for r in result.get("results", [])}
+            except Exception as e:
+                print(f"Autopay error for {auth_id}: {e}")
+                outcomes = {}
+            finally:
+                self._in_flight.difference_update(bill_ids)
+            
+            retry_at = datetime.now() + timedelta(seconds=self.retry_seconds)
+            lost = []
+            for bill_id, due_at in bills:
+                outcome = outcomes.get(bill_id, {})
+                if outcome.get("success"):
+                    self.dispatched += 1
+                    self._attempts.pop(bill_id, None)
+                    if bill_id in self._settled:
+                        self._settled[bill_id] = due_at.date()
+                elif outcome.get("settled_elsewhere"):
+                    # Another worker paid this cycle; pick up the bill's new row below
+                    self._attempts.pop(bill_id, None)
+                    if bill_id in self._settled:
+                        self._settled[bill_id] = due_at.date()
+                    lost.append(bill_id)
+                elif outcome.get("error", "").startswith("Bill is"):
+                    # Settled or cancelled elsewhere - nothing to retry
+                    self._forget(bill_id)
+                else:
+                    self.failed += 1
+                    self._attempts[bill_id] = self._attempts.get(bill_id, 0) + 1
+                    if bill_id not in self._entries:
+                        self._schedule(bill_id, auth_id, retry_at)
+            if lost:
+                await self._reload(lost)
+
+    async def _reload(self, bill_ids):
+        try:
+            result = await self.supabase_manager.table("payments").select("*").in_("id", bill_ids).execute()
+        except Exception as e:
+            print(f"Bill scheduler reload error: {e}")
+            return
+        found = set()
+        for bill in result.data or []:
+            found.add(str(bill["id"]))
+            self.track(bill)
+        for bill_id in set(map(str, bill_ids)) - found:
+            self._forget(bill_id)
+
+    def stats(self) -> Dict[str, Any]:
+        next_due = self._peek()
+        return {
+            "scheduled": len(self._entries),
+            "next_due": next_due.isoformat() if next_due else None,
+            "dispatched": self.dispatched,
+            "failed": self.failed
+        }
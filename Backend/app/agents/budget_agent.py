@@ -1,81 +1,92 @@
-from google import genai
-from google.genai import types
+import asyncio
 import os
 from app.utils.supabase_client import SupabaseManager
+from app.agents.narrative_cache import BudgetNarrativeCache
+from app.agents.llm_provider import get_provider
+from app.utils.rollups import parse_period
+from app.utils.metrics import timed_tool
+
+# How each spending period reads in prompts
+PERIOD_LABELS = {"all": "overall", "today": "today", "week": "this week", "month": "this month"}
 
 class BudgetAgent:
     def __init__(self, supabase_manager: SupabaseManager):
         self.supabase_manager = supabase_manager
-        self.client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+        self.llm = get_provider("gemini")
+        # Spending window checked by default: all, today, week or month
+        self.period = os.getenv("BUDGET_AGENT_PERIOD", "month")
+        
+        self.system_prompt = f"""You are PennyPal Budget Agent. 
+NEVER ask for input. When checking budget, use get_current_spending with category='overall' and period='{self.period}'.
+Give a 1-sentence friendly summary."""
         
-        self.system_prompt = """You are PennyPal Budget Agent. 
-NEVER ask for input. When checking budget, use get_current_spending with category='overall' and period='month'.
+        # Single-pass mode: spending is fetched up front and embedded in one generation call
+        self.single_pass = os.getenv("BUDGET_AGENT_SINGLE_PASS", "true").lower() == "true"
+        self.llm_timeout = float(os.getenv("BUDGET_AGENT_TIMEOUT", "10"))
+        self.single_pass_prompt = """You are PennyPal Budget Agent.
+NEVER ask for input. The user's current spending snapshot is provided below - do not invent numbers.
 Give a 1-sentence friendly summary."""
         
         self.tools = [
-            types.Tool(
-                function_declarations=[
-                    types.FunctionDeclaration(
-                        name="get_current_spending",
-                        description="Get spending and budget",
-                        parameters=types.Schema(
-                            type=types.Type.OBJECT,
-                            properties={
-                                "category": types.Schema(type=types.Type.STRING),
-                                "period": types.Schema(type=types.Type.STRING)
-                            },
-                            required=["category", "period"]
-                        )
-                    )
-                ]
-            )
+            {
+                "name": "get_current_spending",
+                "description": "Get spending and budget",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "category": {"type": "string", "description": "Category name, or 'overall'"},
+                        "period": {"type": "string", "description": "all, today, week, month, or last_N_days"}
+                    },
+                    "required": ["category", "period"]
+                }
+            }
         ]
         self.model = "gemini-2.0-flash"
+        self.narrative_cache = BudgetNarrativeCache()
 
-    async def check_budget_status(self, auth_id: str):
+    async def check_budget_status(self, auth_id: str, single_pass: bool = None):
         """Check budget and return summary"""
-        prompt = "Check overall spending for this month."
+        if single_pass is None:
+            single_pass = self.single_pass
+        if single_pass:
+            return await self._check_budget_single_pass(auth_id)
+        
+        # Answer from the narrative cache while the snapshot stays in the same bucket
+        snapshot = await self.execute_tool("get_current_spending", {"category": "overall", "period": self.period}, auth_id)
+        cached = self.narrative_cache.lookup(auth_id, snapshot)
+        if cached:
+            return cached
+        
+        prompt = f"Check overall spending {self.period_label}."
+        messages = [{"role": "user", "content": prompt}]
 
         try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction=self.system_prompt,
-                    tools=self.tools
-                )
+            response = await self.llm.generate(
+                self.model, messages, system=self.system_prompt, tools=self.tools, timeout=self.llm_timeout
             )
 
-            # If Gemini calls a tool
-            if response.candidates and response.candidates[0].content.parts:
-                for part in response.candidates[0].content.parts:
-                    if hasattr(part, "function_call") and part.function_call:
-                        tool_name = part.function_call.name
-
-                        # Execute tool and get real spending
-                        result = await self.execute_tool(tool_name, {}, auth_id)
+            # If Gemini calls tools, answer every call with its own result
+            if response.tool_calls:
+                results = await asyncio.gather(*[
+                    self.execute_tool(call.name, call.args, auth_id) for call in response.tool_calls
+                ])
+                tool_messages = [
+                    {"role": "tool", "name": call.name, "tool_call_id": call.id, "content": result}
+                    for call, result in zip(response.tool_calls, results)
+                ]
 
-                        # Send the returned data back to Gemini
-                        final = self.client.models.generate_content(
-                            model=self.model,
-                            contents=[
-                                types.Content(role="user", parts=[types.Part(text=prompt)]),
-                                types.Content(role="model", parts=[part]),
-                                types.Content(
-                                    role="user",
-                                    parts=[types.Part(
-                                        function_response=types.FunctionResponse(
-                                            name=tool_name,
-                                            response={"result": result}
-                                        )
-                                    )]
-                                )
-                            ],
-                            config=types.GenerateContentConfig(system_instruction=self.system_prompt)
-                        )
+                # Send the returned data back to Gemini
+                final = await self.llm.generate(
+                    self.model,
+                    messages + [response.as_message()] + tool_messages,
+                    system=self.system_prompt,
+                    timeout=self.llm_timeout
+                )
 
-                        # If Gemini replied, use it — otherwise fallback dynamic text
-                        return final.text or f"📊 You've spent ₹{result['spent']} of ₹{result['limit']} ({result['percentage']}%)."
+                # If Gemini replied, use it — otherwise fallback dynamic text
+                if final.text:
+                    self.narrative_cache.store(auth_id, snapshot, final.text)
+                return final.text or self._fallback_summary(snapshot)
             
             # No function call → return plain Gemini text
             return response.text or "No AI response received."
@@ -84,47 +95,76 @@ Give a 1-sentence friendly summary."""
             print(f"Agent Error: {e}")
             return "⚠️ Could not check your budget. Try again later."
 
+    async def _check_budget_single_pass(self, auth_id: str):
+        """One generation call over a spending snapshot fetched up front"""
+        snapshot_task = asyncio.create_task(
+            self.execute_tool("get_current_spending", {"category": "overall", "period": self.period}, auth_id)
+        )
+        prompt_header = f"Check overall spending {self.period_label}.\nCurrent spending snapshot:"
+        snapshot = await snapshot_task
+        prompt = (
+            f"{prompt_header}\n"
+            f"- Spent: {snapshot['currency']}{snapshot['spent']}\n"
+            f"- Budget: {snapshot['currency']}{snapshot['limit']}\n"
+            f"- Used: {snapshot['percentage']}%"
+        )
+        cached = self.narrative_cache.lookup(auth_id, snapshot)
+        if cached:
+            return cached
+
+        try:
+            response = await self.llm.generate(
+                self.model,
+                [{"role": "user", "content": prompt}],
+                system=self.single_pass_prompt,
+                timeout=self.llm_timeout
+            )
+            if response.text:
+                self.narrative_cache.store(auth_id, snapshot, response.text)
+            return response.text or self._fallback_summary(snapshot)
+        except asyncio.TimeoutError:
+            print(f"Agent timeout after {self.llm_timeout}s, using templated summary")
+            return self._fallback_summary(snapshot)
+        except Exception as e:
+            print(f"Agent Error: {e}")
+            return self._fallback_summary(snapshot)
+
+    @property
+    def period_label(self):
+        return PERIOD_LABELS.get(self.period, f"for the {self.period} period")
+
+    def _fallback_summary(self, snapshot):
+        return f"📊 You've spent ₹{snapshot['spent']} of ₹{snapshot['limit']} ({snapshot['percentage']}%)."
+
     async def autonomous_budget_check(self, auth_id: str):
         return await self.check_budget_status(auth_id)
 
+    @timed_tool("budget")
     async def execute_tool(self, name, args, auth_id):
         if name == "get_current_spending":
             try:
-                # Get actual spending from Supabase 'spends' table
-                result = self.supabase_manager.supabase.table("spends")\
-                    .select("spent_amt, total_spent")\
-                    .eq("auth_id", auth_id)\
-                    .execute()
-                
-                # Calculate total spent (use total_spent if available, otherwise sum spent_amt)
-                if result.data:
-                    # Try to get the latest total_spent value
-                    total_spent = result.data[-1].get("total_spent", 0) if result.data else 0
-                    # If total_spent is None or 0, sum all spent_amt
-                    if not total_spent or total_spent == 0:
-                        spent_values = [row.get("spent_amt", 0) for row in result.data if row.get("spent_amt") is not None]
-                        total_spent = sum(spent_values) if spent_values else 0
-                else:
-                    total_spent = 0
+                period, days = parse_period(args.get("period"), default="")
+                if not period:
+                    period, days = parse_period(self.period, default="month")
+                category = args.get("category")
+                if not category or category.lower() in ("overall", "all"):
+                    category = None
                 
-                # Ensure total_spent is never None
-                total_spent = total_spent or 0
-                
-                # Get user's budget from 'spends' table (week_budget column)
-                budget_result = self.supabase_manager.supabase.table("spends")\
-                    .select("week_budget")\
-                    .eq("auth_id", auth_id)\
-                    .limit(1)\
-                    .execute()
-                
-                # Use week_budget from spends table, or default to 2000
-                budget_limit = budget_result.data[0].get("week_budget", 2000) if budget_result.data else 2000
+                # Windowed totals from the cached daily x category rollups;
+                # the latest week_budget (or 2000) is scaled to the period
+                spending = await self.supabase_manager.get_spending_period(
+                    auth_id, period, days, category, default_week_budget=2000
+                )
+                total_spent = spending["total_spent"] or 0
+                budget_limit = spending["period_budget"]
                 
                 return {
                     "spent": total_spent,
                     "limit": budget_limit,
                     "currency": "₹",
-                    "percentage": round((total_spent / budget_limit * 100) if budget_limit > 0 else 0, 1)
+                    "percentage": round((total_spent / budget_limit * 100) if budget_limit > 0 else 0, 1),
+                    "period": spending["period"],
+                    "category": category or "overall"
                 }
             except Exception as e:
                 print(f"Error fetching spending data: {e}")
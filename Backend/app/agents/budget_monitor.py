@@ -0,0 +1,122 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+from app.utils.rate_limit import RateLimiter
+from app.utils.rollups import parse_period, period_bounds, period_budget
+
+# Recorded for a user whose check failed; never equals a band, so the next sweep retries
+RETRY_STATE = "retry"
+
+def threshold_state(spent: float, limit: float) -> str:
+    """Budget health band used to decide whether a user needs a fresh check"""
+    if limit <= 0:
+        return "ok"
+    percentage = spent / limit * 100
+    if percentage > 100:
+        return "critical"
+    if percentage >= 75:
+        return "warning"
+    return "ok"
+
+class BudgetMonitor:
+    """Periodically sweeps every user's budget and runs agent checks where the state changed.
+
+    Each sweep reads spent/limit for all users with grouped queries, compares
+    each user's threshold band with the previous sweep, and sends only the
+    changed users through the budget agent - bounded by a semaphore and a
+    rate limiter so a sweep can't flood the LLM provider. Spend and limit
+    cover the budget agent's window (BUDGET_AGENT_PERIOD), so the bands
+    agree with what /budget-check reports.
+    """
+
+    def __init__(self, supabase_manager, budget_agent, alert_dispatcher=None,
+                 interval: Optional[float] = None, concurrency: Optional[int] = None,
+                 rate_per_second: Optional[float] = None):
+        self.supabase_manager = supabase_manager
+        self.budget_agent = budget_agent
+        self.alert_dispatcher = alert_dispatcher
+        self.interval = interval or float(os.getenv("BUDGET_MONITOR_INTERVAL", "300"))
+        self.semaphore = asyncio.Semaphore(concurrency or int(os.getenv("BUDGET_MONITOR_CONCURRENCY", "4")))
+        self.rate_limiter = RateLimiter(
+            rate_per_second or float(os.getenv("BUDGET_MONITOR_RATE", "2")),
+            burst=concurrency or int(os.getenv("BUDGET_MONITOR_CONCURRENCY", "4"))
+        )
+        self.period, self.days = parse_period(os.getenv("BUDGET_AGENT_PERIOD", "month"), default="month")
+        self.states: Dict[str, str] = {}
+        self.last_sweep: Dict[str, Any] = {}
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"Budget monitor sweep error: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        start, end = period_bounds(self.period, self.days)
+        totals = await self.supabase_manager.get_spending_totals(start, end)
+        
+        # Users missing from this sweep's totals are dropped, so the map stays bounded
+        changed = []
+        states = {}
+        for auth_id, aggregate in totals.items():
+            limit = period_budget(aggregate["week_budget"] or 2000, start, end)
+            state = threshold_state(aggregate["total_spent"], limit)
+            if state != self.states.get(auth_id, "ok"):
+                changed.append(auth_id)
+            states[auth_id] = state
+        self.states = states
+        
+        results = await asyncio.gather(*[self._check(auth_id) for auth_id in changed])
+        
+        duration = time.perf_counter() - started
+        users = len(totals)
+        self.last_sweep = {
+            "users": users,
+            "checked": len(changed),
+            "failed": results.count(False),
+            "duration_seconds": round(duration, 3),
+            "users_per_second": round(users / duration, 1) if duration > 0 else 0.0,
+            "skip_ratio": round(1 - len(changed) / users, 3) if users else 1.0
+        }
+        print(f"🔎 Budget sweep: {self.last_sweep}")
+        return self.last_sweep
+
+    async def _check(self, auth_id: str) -> bool:
+        async with self.semaphore:
+            await self.rate_limiter.acquire()
+            try:
+                text = await self.budget_agent.autonomous_budget_check(auth_id)
+            except Exception as e:
+                print(f"Budget monitor check failed for {auth_id}: {e}")
+                # The next sweep sees a changed band and retries this user
+                self.states[auth_id] = RETRY_STATE
+                return False
+            state = self.states.get(auth_id)
+            if self.alert_dispatcher and state:
+                # Skipped if an expense already announced this band
+                self.alert_dispatcher.announce_band(auth_id, state, {
+                    "type": "budget_alert",
+                    "auth_id": auth_id,
+                    "text": text,
+                    "state": state,
+                    "source": "monitor"
+                })
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tracked_users": len(self.states), "last_sweep": self.last_sweep}
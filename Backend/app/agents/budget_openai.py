@@ -1,13 +1,16 @@
-import json
-from openai import OpenAI
+import asyncio
 import os
+from app.agents.narrative_cache import BudgetNarrativeCache
+from app.agents.llm_provider import get_provider
 
 class BudgetAgentOpenAI:
     """OpenAI-powered Budget Agent for PennyPal"""
     
     def __init__(self, supabase_manager):
         self.supabase_manager = supabase_manager
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.llm = get_provider("openai")
+        # One model for the whole conversation (tool request and follow-up)
+        self.model = os.getenv("OPENAI_BUDGET_MODEL", "gpt-4o-mini")
         
         self.system_prompt = """
 You are PennyPal: A helpful financial budgeting assistant.
@@ -28,111 +31,94 @@ RULES:
         
         self.tools = [
             {
-                "type": "function",
-                "function": {
-                    "name": "get_spending_summary",
-                    "description": "Retrieve user's spending + budget data.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "auth_id": {"type": "string"}
-                        },
-                        "required": ["auth_id"]
-                    }
-                },
+                "name": "get_spending_summary",
+                "description": "Retrieve user's spending + budget data.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "auth_id": {"type": "string"}
+                    },
+                    "required": ["auth_id"]
+                }
             },
             {
-                "type": "function",
-                "function": {
-                    "name": "send_budget_alert",
-                    "description": "Notify the user when overspending.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "auth_id": {"type": "string"},
-                            "message": {"type": "string"}
-                        },
-                        "required": ["auth_id", "message"]
-                    }
+                "name": "send_budget_alert",
+                "description": "Notify the user when overspending.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "auth_id": {"type": "string"},
+                        "message": {"type": "string"}
+                    },
+                    "required": ["auth_id", "message"]
                 }
             }
         ]
+        self.narrative_cache = BudgetNarrativeCache()
     
     async def get_spending_summary(self, auth_id: str):
-        """Fetch spending total + budget limit from Supabase."""
+        """Spending total + monthly budget limit from the cached spending aggregate."""
         try:
-            # Get spending data from your 'spend' table
-            result = self.supabase_manager.supabase.table("spend")\
-                .select("spent_amt")\
-                .eq("auth_id", auth_id)\
-                .execute()
-            
-            # Get budget from 'users' table (assuming week_budget field exists)
-            budget_row = self.supabase_manager.supabase.table("users")\
-                .select("week_budget")\
-                .eq("auth_id", auth_id)\
-                .single()\
-                .execute()
-            
-            total_spent = sum(expense["spent_amt"] for expense in result.data) if result.data else 0
-            budget_limit = budget_row.data["week_budget"] * 4 if budget_row.data else 0  # Monthly budget
-            
-            return { 
-                "spent": total_spent,
-                "limit": budget_limit,
+            aggregate = await self.supabase_manager.get_spending_aggregate(auth_id)
+            return {
+                "spent": aggregate["total_spent"] or 0,
+                "limit": (aggregate["week_budget"] or 0) * 4,  # Monthly budget
                 "currency": "₹"
             }
         except Exception as e:
             print(f"Error fetching spending summary: {e}")
-            return {"spent": 0, "limit": 0, "currency": "₹"}
+            return {"spent": 0, "limit": 0, "currency": "₹", "error": str(e)}
     
     async def send_budget_alert(self, auth_id: str, message: str):
         """Send budget alert to user."""
         print(f"🚨 ALERT FOR {auth_id}: {message}")
         return {"status": "alert_sent", "message": message}
     
+    async def execute_tool(self, call, auth_id: str, snapshot):
+        # The user is already known; don't trust a model-supplied ID
+        if call.name == "get_spending_summary":
+            return snapshot
+        if call.name == "send_budget_alert":
+            return await self.send_budget_alert(auth_id, call.args.get("message", ""))
+        return {"error": "Unknown tool"}
+    
     async def check_budget_status(self, auth_id: str):
         """Main method called by FastAPI endpoint"""
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",  # Fixed model name
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": f"Check my current budget status. My user ID is {auth_id}"}
-                ],
-                tools=self.tools,
-                tool_choice="auto"
-            )
+            # Answer from the narrative cache while the snapshot stays in the same bucket.
+            # The snapshot is also the tool result, so the key and the narrated numbers match
+            snapshot = await self.get_spending_summary(auth_id)
+            cacheable = "error" not in snapshot
+            cached = self.narrative_cache.lookup(auth_id, snapshot) if cacheable else None
+            if cached:
+                return cached
             
-            message = response.choices[0].message
+            messages = [{"role": "user", "content": f"Check my current budget status. My user ID is {auth_id}"}]
+            response = await self.llm.generate(self.model, messages, system=self.system_prompt, tools=self.tools)
             
-            # If LLM calls tools
-            if message.tool_calls:
-                for call in message.tool_calls:
-                    fn_name = call.function.name
-                    args = json.loads(call.function.arguments)
-                    
-                    # Execute tool
-                    if fn_name == "get_spending_summary":
-                        result = await self.get_spending_summary(**args)
-                    elif fn_name == "send_budget_alert":
-                        result = await self.send_budget_alert(**args)
-                    else:
-                        result = {"error": "Unknown tool"}
-                    
-                    # Send tool response back to agent
-                    followup = self.client.chat.completions.create(
-                        model="o3-mini",
-                        messages=[
-                            {"role": "system", "content": self.system_prompt},
-                            message,
-                            {"role": "tool", "content": json.dumps(result), "tool_call_id": call.id}
-                        ]
-                    )
-                    return followup.choices[0].message.content
+            # If LLM calls tools, answer every call with its own result
+            if response.tool_calls:
+                results = await asyncio.gather(*[
+                    self.execute_tool(call, auth_id, snapshot) for call in response.tool_calls
+                ])
+                tool_messages = [
+                    {"role": "tool", "name": call.name, "tool_call_id": call.id, "content": result}
+                    for call, result in zip(response.tool_calls, results)
+                ]
+                
+                # Send tool responses back to agent
+                followup = await self.llm.generate(
+                    self.model,
+                    messages + [response.as_message()] + tool_messages,
+                    system=self.system_prompt
+                )
+                content = followup.text
+                if content and cacheable:
+                    self.narrative_cache.store(auth_id, snapshot, content)
+                return content
             
             # If no tools required
-            return message.content
+            return response.text
             
         except Exception as e:
             return f"Error: {str(e)}"
@@ -0,0 +1,273 @@
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Category -> keywords and well-known merchants
+CATEGORY_LEXICON = {
+    "Food": ["food", "lunch", "dinner", "breakfast", "brunch", "snack", "snacks", "meal", "restaurant",
+             "cafe", "coffee", "tea", "chai", "pizza", "burger", "biryani", "dosa", "swiggy", "zomato",
+             "dominos", "starbucks", "kfc", "mcdonalds", "eating out", "takeaway"],
+    "Groceries": ["grocery", "groceries", "vegetables", "veggies", "fruits", "milk", "bread", "eggs",
+                  "bigbasket", "blinkit", "zepto", "dmart", "supermarket", "kirana", "instamart"],
+    "Transport": ["uber", "ola", "rapido", "cab", "taxi", "auto", "rickshaw", "metro", "bus", "train",
+                  "petrol", "diesel", "fuel", "parking", "toll", "flight", "irctc", "fastag"],
+    "Shopping": ["shopping", "amazon", "flipkart", "myntra", "ajio", "meesho", "nykaa", "clothes",
+                 "shirt", "shoes", "electronics", "gadget"],
+    "Entertainment": ["movie", "movies", "cinema", "netflix", "spotify", "prime video", "hotstar",
+                      "concert", "bookmyshow", "pvr", "inox", "gaming", "party"],
+    "Utilities": ["electricity", "electricity bill", "water bill", "gas cylinder", "wifi", "internet",
+                  "broadband", "recharge", "mobile bill", "phone bill", "postpaid", "dth"],
+    "Health": ["medicine", "medicines", "pharmacy", "chemist", "doctor", "hospital", "clinic", "gym",
+               "apollo", "1mg", "pharmeasy", "dentist"],
+    "Rent": ["rent", "landlord", "pg rent", "hostel fee", "maintenance"],
+    "Education": ["books", "course", "tuition", "college fee", "exam fee", "udemy", "coursera", "stationery"],
+}
+
+# No bare "l": in "2 l milk" it is litres far more often than lakh
+SUFFIX_MULTIPLIERS = {"k": 1e3, "thousand": 1e3, "lac": 1e5, "lacs": 1e5, "lakh": 1e5,
+                      "lakhs": 1e5, "cr": 1e7, "crore": 1e7, "crores": 1e7}
+# Amounts scaled by at least this much are confirmed by the LLM rather than trusted
+LARGE_MULTIPLIER = 1e5
+WEEKDAYS = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+MONTHS = {"jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+          "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12}
+
+_CURRENCY = r"(?:₹|rs\.?|inr|rupees?)"
+AMOUNT_PATTERN = re.compile(
+    rf"(?:(?P<pre>{_CURRENCY})\s*)?"
+    r"(?<!\w)(?<!\d\.)(?P<num>\d{1,3}(?:,\d{2,3})+(?:\.\d+)?|\d+(?:\.\d+)?)"
+    r"(?:\s*(?P<suffix>k|thousand|lakhs?|lacs?|crores?|cr)\b)?"
+    # A number glued to other letters ("1mg", "4g") isn't an amount
+    r"(?!(?!rs|inr|rupee)[a-z])"
+    rf"(?:\s*(?P<post>{_CURRENCY}|/-))?",
+    re.IGNORECASE
+)
+_WEEKDAY = r"(?P<weekday>mon|tue|tues|wed|thu|thur|thurs|fri|sat|sun)(?:day|nesday|rsday|urday)?"
+_MONTH = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*"
+DATE_PATTERN = re.compile(
+    r"\b(?:"
+    r"(?P<today>today|tonight|this morning|this evening)"
+    r"|(?P<day_before>day before yesterday)"
+    r"|(?P<yesterday>yesterday|last night)"
+    r"|(?P<ago>\d{1,3})\s+days?\s+ago"
+    rf"|(?P<last>last|on|this past)\s+{_WEEKDAY}"
+    r"|(?P<iso>\d{4}-\d{2}-\d{2})"
+    r"|(?P<dmy>\d{1,2})[/-](?P<dm_month>\d{1,2})(?:[/-](?P<dm_year>\d{2,4}))?"
+    rf"|(?P<day_first>\d{{1,2}})(?:st|nd|rd|th)?\s+(?P<month_after>{_MONTH})"
+    rf"|(?P<month_first>{_MONTH})\s+(?P<day_after>\d{{1,2}})(?:st|nd|rd|th)?"
+    r")\b",
+    re.IGNORECASE
+)
+# Cues for picking the amount among several bare numbers ("bought 3 shirts for 1200")
+_AMOUNT_CUE = re.compile(r"(?:\b(?:for|of|costs?|costing|total)|[@=])\s*$", re.IGNORECASE)
+_NEXT_WORD = re.compile(r"\s*([a-z]+)", re.IGNORECASE)
+_CONNECTORS = {"on", "for", "at", "in", "to", "and", "from", "via", "by", "with", "only", "each"}
+MERCHANT_PATTERN = re.compile(r"\b(?:at|from|@)\s+(?P<merchant>[A-Za-z0-9][\w&'.-]*(?:\s+[A-Z0-9][\w&'.-]*)*)")
+FILLER_PATTERN = re.compile(r"\b(?:log|add|spent|spend|paid|pay|for|on|at|from|of|a|an|the|my|i)\b|[₹@,:;]", re.IGNORECASE)
+
+def _trie_regex(phrases: Iterable[str]) -> str:
+    """Regex alternation factored into a prefix trie, so each position is tested
+    against one character class per level instead of every phrase in turn"""
+    trie: Dict[str, dict] = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [
+            (r"\s+" if char == " " else re.escape(char)) + build(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+class KeywordMatcher:
+    """Precompiled multi-pattern matcher over many phrases.
+
+    All phrases compile into one trie-shaped regex; `find` returns
+    (phrase, value, start) for every non-overlapping match in a single scan,
+    preferring the longest phrase at each position.
+    """
+
+    def __init__(self, phrases: Dict[str, Any], plurals: bool = False):
+        self.values = {self._normalize(phrase): value for phrase, value in phrases.items() if phrase.strip()}
+        # With `plurals`, "shirts" or "buses" also match "shirt" and "bus"
+        self.plurals = plurals
+        suffix = "(?:es|s)?" if plurals else ""
+        self.pattern = re.compile(rf"\b{_trie_regex(self.values)}{suffix}\b", re.IGNORECASE) if self.values else None
+
+    @staticmethod
+    def _normalize(phrase: str) -> str:
+        return " ".join(phrase.lower().split())
+
+    def find(self, text: str) -> List[Tuple[str, Any, int]]:
+        if self.pattern is None:
+            return []
+        hits = []
+        for match in self.pattern.finditer(text):
+            value = self._lookup(self._normalize(match.group(0)))
+            if value is not None:
+                hits.append((match.group(0), value, match.start()))
+        return hits
+
+    def _lookup(self, phrase: str) -> Any:
+        value = self.values.get(phrase)
+        if value is None and self.plurals:
+            for ending in ("es", "s"):
+                if phrase.endswith(ending) and phrase[:-len(ending)] in self.values:
+                    return self.values[phrase[:-len(ending)]]
+        return value
+
+    def __len__(self):
+        return len(self.values)
+
+def lexicon_matcher(lexicon: Dict[str, Iterable[str]] = CATEGORY_LEXICON) -> KeywordMatcher:
+    return KeywordMatcher(
+        {keyword: category for category, keywords in lexicon.items() for keyword in keywords}, plurals=True
+    )
+
+def _weekday_back(weekday: int, today: date, strictly_before: bool) -> date:
+    back = (today.weekday() - weekday) % 7
+    if back == 0 and strictly_before:
+        back = 7
+    return today - timedelta(days=back)
+
+def _resolve_date(match: re.Match, today: date) -> Optional[date]:
+    groups = match.groupdict()
+    try:
+        if groups["today"]:
+            return today
+        if groups["day_before"]:
+            return today - timedelta(days=2)
+        if groups["yesterday"]:
+            return today - timedelta(days=1)
+        if groups["ago"]:
+            return today - timedelta(days=int(groups["ago"]))
+        if groups["weekday"]:
+            return _weekday_back(WEEKDAYS[groups["weekday"][:3].lower()], today, groups["last"].lower() == "last")
+        if groups["iso"]:
+            return date.fromisoformat(groups["iso"])
+        if groups["dmy"]:
+            if not groups["dm_year"]:
+                resolved = date(today.year, int(groups["dm_month"]), int(groups["dmy"]))
+                # "28/12" typed in January means last year
+                return resolved if resolved <= today else resolved.replace(year=today.year - 1)
+            year = int(groups["dm_year"])
+            year = year + 2000 if year < 100 else year
+            return date(year, int(groups["dm_month"]), int(groups["dmy"]))
+        day, month = groups["day_first"] or groups["day_after"], groups["month_after"] or groups["month_first"]
+        if day and month:
+            resolved = date(today.year, MONTHS[month[:3].lower()], int(day))
+            # "28 dec" typed in January means last year
+            return resolved if resolved <= today else resolved.replace(year=today.year - 1)
+    except ValueError:
+        return None
+    return None
+
+class ExpenseParser:
+    """Rule-based extraction of amount, date, merchant and category from a short message.
+
+    Confidence is additive: an amount (more if it carries a currency marker,
+    less if it was picked among several bare numbers, much less if a
+    lakh/crore suffix scaled it or nothing set it apart from the others), a category (more if it came from the user's own learned
+    merchants) and a small base for the date, which defaults to today.
+    """
+
+    def __init__(self, lexicon: Optional[Dict[str, Iterable[str]]] = None):
+        self.lexicon = lexicon_matcher(lexicon or CATEGORY_LEXICON)
+
+    @staticmethod
+    def _amount_score(text: str, match: re.Match, last: bool) -> int:
+        """Rank a number as the amount: a currency marker wins, then a cue such as
+        "for"/"of" before it; a number followed by a unit or noun ("3 shirts",
+        "2 l milk") is most likely a quantity, and a trailing number breaks ties."""
+        if match.group("pre") or match.group("post"):
+            return 8
+        score = 4 if _AMOUNT_CUE.search(text[:match.start()]) else 0
+        follower = _NEXT_WORD.match(text, match.end())
+        if follower and follower.group(1).lower() not in _CONNECTORS:
+            score -= 5
+        elif last:
+            score += 1
+        return score
+
+    def parse(self, text: str, learned: Optional[KeywordMatcher] = None,
+              today: Optional[date] = None) -> Dict[str, Any]:
+        today = today or date.today()
+        remaining = text
+
+        # Dates first, so "12/10" or "5th oct" is never read as an amount
+        spent_on, date_found = today, False
+        for match in DATE_PATTERN.finditer(text):
+            resolved = _resolve_date(match, today)
+            if resolved:
+                spent_on, date_found = resolved, True
+                remaining = remaining.replace(match.group(0), " ", 1)
+                break
+
+        matches = list(AMOUNT_PATTERN.finditer(remaining))
+        amount, has_currency, multiplier, clear_pick = None, False, 1, True
+        if matches:
+            scores = [self._amount_score(remaining, match, match is matches[-1]) for match in matches]
+            best = max(range(len(matches)), key=lambda i: (scores[i], -i))
+            match = matches[best]
+            clear_pick = scores.count(scores[best]) == 1
+            value = float(match.group("num").replace(",", ""))
+            multiplier = SUFFIX_MULTIPLIERS.get((match.group("suffix") or "").lower(), 1)
+            amount = round(value * multiplier, 2)
+            has_currency = bool(match.group("pre") or match.group("post"))
+            remaining = remaining[:match.start()] + " " + remaining[match.end():]
+
+        merchant_match = MERCHANT_PATTERN.search(remaining)
+        merchant = merchant_match.group("merchant").strip() if merchant_match else None
+
+        # The user's own merchant mappings win over the shared lexicon
+        category, source = None, None
+        learned_hits = learned.find(remaining) if learned else []
+        if learned_hits:
+            merchant, category, _ = learned_hits[0]
+            source = "learned"
+        else:
+            hits = self.lexicon.find(remaining)
+            categories = {hit[1] for hit in hits}
+            if hits:
+                # Prefer the category mentioned most; ties go to the first mention
+                counts = [hit[1] for hit in hits]
+                category = max(categories, key=lambda name: (counts.count(name), -counts.index(name)))
+                source = "lexicon" if len(categories) == 1 else "lexicon_ambiguous"
+
+        confidence = 0.15
+        competing = len(matches) > 1 and not has_currency
+        if amount is not None and (multiplier >= LARGE_MULTIPLIER or (competing and not clear_pick)):
+            # A lakh/crore scale, or a coin toss between several bare numbers, is a guess
+            confidence += 0.1
+        elif amount is not None and competing:
+            # Picked by a cue such as "for 1200" or a trailing number
+            confidence += 0.2
+        elif amount is not None:
+            confidence += 0.45 if has_currency else 0.3
+        if source == "learned":
+            confidence += 0.4
+        elif source == "lexicon":
+            confidence += 0.35
+        elif source == "lexicon_ambiguous":
+            confidence += 0.2
+
+        description = " ".join(FILLER_PATTERN.sub(" ", remaining).split())
+        return {
+            "amount": amount,
+            "category": category or "Other",
+            "merchant": merchant,
+            "description": description or text.strip(),
+            "date": spent_on.isoformat(),
+            "date_explicit": date_found,
+            "confidence": round(min(confidence, 1.0), 2),
+            "category_source": source,
+            "source": "rules"
+        }
@@ -0,0 +1,303 @@
+import asyncio
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+import numpy as np
+from app.utils.cache import LRUCache
+from app.utils.rollups import period_bounds, period_budget
+from app.agents.bill_scheduler import effective_due_date
+from app.agents.payment_agent import RECURRING_INTERVALS
+
+def _weekday(days: np.ndarray) -> np.ndarray:
+    """Monday=0 weekday of datetime64[D] values (1970-01-01 was a Thursday)"""
+    return (days.astype(np.int64) + 3) % 7
+
+def project(daily: np.ndarray, history_weekdays: np.ndarray, horizon_weekdays: np.ndarray,
+            spent_to_date: np.ndarray, budgets: np.ndarray, scheduled: np.ndarray,
+            alpha: float = 0.3) -> Dict[str, np.ndarray]:
+    """Project spend for many users at once.
+
+    `daily` is a (users, lookback) matrix of complete days, oldest first.
+    Each user's rate is an exponentially weighted mean of the deseasonalized
+    series, re-seasonalized with that user's day-of-week factors over the
+    horizon (tomorrow through period end). `scheduled` is a
+    (users, horizon + 1) matrix of bill amounts, column 0 being today.
+    """
+    lookback = daily.shape[1]
+
+    # Day-of-week factors: mean spend per weekday relative to the overall mean
+    onehot = np.eye(7)[history_weekdays]
+    weekday_means = (daily @ onehot) / np.maximum(onehot.sum(axis=0), 1)
+    overall = daily.mean(axis=1, keepdims=True)
+    factors = np.divide(weekday_means, overall, out=np.ones_like(weekday_means), where=overall > 0)
+
+    history_factors = factors[:, history_weekdays]
+    deseasonalized = np.divide(daily, history_factors, out=daily.copy(), where=history_factors > 0)
+    weights = alpha * (1 - alpha) ** np.arange(lookback)[::-1]
+    rate = deseasonalized @ (weights / weights.sum())
+
+    expected = rate[:, None] * factors[:, horizon_weekdays]
+    outflow = scheduled.copy()
+    outflow[:, 1:] += expected
+    cumulative = spent_to_date[:, None] + np.cumsum(outflow, axis=1)
+
+    over = cumulative > budgets[:, None]
+    exhausted = over.any(axis=1) & (budgets > 0)
+    return {
+        "rate": rate,
+        "expected": expected.sum(axis=1),
+        "scheduled": scheduled.sum(axis=1),
+        "projected_total": cumulative[:, -1],
+        "surplus": budgets - cumulative[:, -1],
+        "exhausted": exhausted,
+        "exhaustion_offset": np.where(exhausted, over.argmax(axis=1), -1)
+    }
+
+def _money(value) -> float:
+    return round(float(value), 2)
+
+def bills_fingerprint(bills: List[Dict[str, Any]]) -> int:
+    """Hash of the bill fields a forecast depends on, to spot new, paid or moved bills"""
+    return hash(tuple(sorted(
+        (str(bill.get("id")), bill.get("amount"), bill.get("frequency"), bill.get("due_date"), bill.get("next_payment_date"))
+        for bill in bills
+    )))
+
+class ForecastEngine:
+    """Budget-exhaustion forecasts for the current budget period.
+
+    Forecasts are computed for many users in one pass (a few grouped queries
+    and a handful of matrix operations) and cached per user against the
+    user's spending aggregate, state version and the date. Callers that pass
+    the user's current bills also get a recompute when those differ from the
+    ones the forecast used, which catches bills added outside the backend;
+    with `recheck_bills` the engine re-reads them itself, at most every
+    FORECAST_BILLS_RECHECK seconds while the state version is unchanged.
+    A background loop refreshes every user's forecast on an interval.
+    """
+
+    def __init__(self, supabase_manager, period: Optional[str] = None, interval: Optional[float] = None):
+        self.supabase_manager = supabase_manager
+        self.period = period or os.getenv("FORECAST_PERIOD", "week")
+        self.interval = interval or float(os.getenv("FORECAST_REFRESH_INTERVAL", "900"))
+        self.lookback_days = int(os.getenv("FORECAST_LOOKBACK_DAYS", "56"))
+        self.alpha = float(os.getenv("FORECAST_EWMA_ALPHA", "0.3"))
+        self.default_week_budget = float(os.getenv("FORECAST_DEFAULT_WEEK_BUDGET", "2000"))
+        # How long a cached forecast's bills are trusted before `recheck_bills` reads them again
+        self.bills_recheck = float(os.getenv("FORECAST_BILLS_RECHECK", "60"))
+        self._cache = LRUCache(
+            max_entries=int(os.getenv("FORECAST_CACHE_MAX_USERS", "10000")),
+            ttl_seconds=float(os.getenv("FORECAST_CACHE_TTL", "1800"))
+        )
+        self.last_refresh: Dict[str, Any] = {}
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Forecast refresh error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def window_start(self, today: date) -> date:
+        """First day of spends a forecast for `today` reads"""
+        start, _ = period_bounds(self.period, today=today)
+        history_start = today - timedelta(days=self.lookback_days)
+        return min(history_start, start) if start else history_start
+
+    def _signature(self, auth_id: str, aggregate: Dict[str, Any], today: date):
+        # The state version moves on every backend spend and bill payment
+        return (aggregate["row_count"], round(aggregate["total_spent"] or 0, 2), aggregate["week_budget"],
+                self.supabase_manager.state_versions.get(auth_id), today)
+
+    def is_current(self, auth_id: str, aggregate: Dict[str, Any]) -> bool:
+        """Whether a cached forecast exists for this aggregate (no query, no LRU touch)"""
+        entry = self._cache.peek(auth_id)
+        return entry is not None and entry[0] == self._signature(auth_id, aggregate, datetime.now(timezone.utc).date())
+
+    async def get_forecast(self, auth_id: str, spends: Optional[List[Dict[str, Any]]] = None,
+                           bills: Optional[List[Dict[str, Any]]] = None,
+                           recheck_bills: bool = False) -> Dict[str, Any]:
+        """Cached forecast for one user; recomputed after new spends, bill
+        payments or on a new day, and when `bills` differ from the cached run's.
+
+        `spends` and `bills` are the user's rows when the caller already has them.
+        `recheck_bills` re-reads the bills once the cached ones are older than
+        FORECAST_BILLS_RECHECK, to catch bills written outside the backend.
+        """
+        aggregate = await self.supabase_manager.get_spending_aggregate(auth_id)
+        today = datetime.now(timezone.utc).date()
+        signature = self._signature(auth_id, aggregate, today)
+        entry = self._cache.get(auth_id)
+        if entry is not None and entry[0] == signature:
+            checked = bills is not None
+            if not checked and recheck_bills and time.monotonic() - entry[3] >= self.bills_recheck:
+                bills = await self._scan(lambda: self._bills_query([auth_id]))
+            if bills is None or entry[1] == bills_fingerprint(bills):
+                if bills is not None and not checked:
+                    self._cache.set(auth_id, (*entry[:3], time.monotonic()))
+                return entry[2]
+
+        if bills is None:
+            bills = await self._scan(lambda: self._bills_query([auth_id]))
+        forecasts = await self.compute({auth_id: aggregate}, today, filter_users=True, spends=spends, bills=bills)
+        self._cache.set(auth_id, (signature, bills_fingerprint(bills), forecasts[auth_id], time.monotonic()))
+        return forecasts[auth_id]
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Recompute and cache forecasts for every user with spending"""
+        started = time.perf_counter()
+        today = datetime.now(timezone.utc).date()
+        aggregates, bills = await asyncio.gather(
+            self.supabase_manager.get_spending_totals(), self._scan(self._bills_query)
+        )
+        forecasts = await self.compute(aggregates, today, bills=bills)
+        bills_by_user: Dict[str, List[Dict[str, Any]]] = {}
+        for bill in bills:
+            bills_by_user.setdefault(bill["auth_id"], []).append(bill)
+        for auth_id, forecast in forecasts.items():
+            self._cache.set(auth_id, (
+                self._signature(auth_id, aggregates[auth_id], today),
+                bills_fingerprint(bills_by_user.get(auth_id, [])),
+                forecast,
+                time.monotonic()
+            ))
+
+        duration = time.perf_counter() - started
+        self.last_refresh = {
+            "users": len(forecasts),
+            "exhausting": sum(1 for forecast in forecasts.values() if forecast["exhaustion_date"]),
+            "duration_seconds": round(duration, 3)
+        }
+        return self.last_refresh
+
+    async def compute(self, aggregates: Dict[str, Dict[str, Any]], today: date, filter_users: bool = False,
+                      spends: Optional[List[Dict[str, Any]]] = None,
+                      bills: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+        """Forecasts for the users in `aggregates` (auth_id -> spending aggregate).
+
+        Spend and active-bill rows are queried unless passed in; passed
+        spends must cover window_start(today) onwards.
+        """
+        auth_ids = list(aggregates)
+        if not auth_ids:
+            return {}
+        start, end = period_bounds(self.period, today=today)
+        if start is None:
+            raise ValueError("Forecasts need a bounded period")
+        history_start = today - timedelta(days=self.lookback_days)
+
+        users = auth_ids if filter_users else None
+        loads = {}
+        if spends is None:
+            loads["spends"] = self._scan(lambda: self._spends_query(today, users))
+        if bills is None:
+            loads["bills"] = self._scan(lambda: self._bills_query(users))
+        fetched = dict(zip(loads, await asyncio.gather(*loads.values())))
+        spends = fetched.get("spends", spends)
+        bills = fetched.get("bills", bills)
+
+        index = {auth_id: i for i, auth_id in enumerate(auth_ids)}
+        # Rows handed in may span the whole history and include refunds
+        spends = [row for row in spends if row["auth_id"] in index and (row.get("spent_amt") or 0) > 0]
+        users = np.array([index[row["auth_id"]] for row in spends], dtype=np.int64)
+        amounts = np.array([row["spent_amt"] for row in spends], dtype=np.float64)
+        days = np.array([str(row["created_at"])[:10] for row in spends], dtype="datetime64[D]")
+
+        today64 = np.datetime64(today, "D")
+        start64 = np.datetime64(start, "D")
+        horizon = (end - today).days
+
+        # (users, lookback) matrix of complete days, plus spend so far this period
+        # (bincount over no rows comes back as int64 even with weights, hence the casts)
+        offset = (days - np.datetime64(history_start, "D")).astype(np.int64)
+        in_history = (offset >= 0) & (offset < self.lookback_days)
+        daily = np.bincount(
+            users[in_history] * self.lookback_days + offset[in_history],
+            weights=amounts[in_history], minlength=len(auth_ids) * self.lookback_days
+        ).astype(np.float64).reshape(len(auth_ids), self.lookback_days)
+        in_period = (days >= start64) & (days <= today64)
+        spent_to_date = np.bincount(users[in_period], weights=amounts[in_period], minlength=len(auth_ids)).astype(np.float64)
+
+        # Bill occurrences from today through period end (overdue bills land on today)
+        scheduled = np.zeros((len(auth_ids), horizon + 1))
+        for bill in bills:
+            if bill["auth_id"] not in index:
+                continue
+            due = effective_due_date(bill)
+            if due is None or due > end:
+                continue
+            step = RECURRING_INTERVALS.get((bill.get("frequency") or "").lower())
+            while due <= end:
+                scheduled[index[bill["auth_id"]], max((due - today).days, 0)] += bill.get("amount") or 0
+                if not step:
+                    break
+                due += timedelta(days=step)
+
+        budgets = np.array([
+            period_budget(aggregates[auth_id]["week_budget"] or self.default_week_budget, start, end)
+            for auth_id in auth_ids
+        ], dtype=np.float64)
+        history_days = np.datetime64(history_start, "D") + np.arange(self.lookback_days)
+        horizon_days = today64 + np.arange(1, horizon + 1)
+        projection = project(
+            daily, _weekday(history_days), _weekday(horizon_days),
+            spent_to_date, budgets, scheduled, alpha=self.alpha
+        )
+
+        forecasts = {}
+        for i, auth_id in enumerate(auth_ids):
+            offset = int(projection["exhaustion_offset"][i])
+            forecasts[auth_id] = {
+                "period": self.period,
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "as_of": today.isoformat(),
+                "budget": _money(budgets[i]),
+                "spent_to_date": _money(spent_to_date[i]),
+                "daily_rate": _money(projection["rate"][i]),
+                "expected_spend": _money(projection["expected"][i]),
+                "scheduled_payments": _money(projection["scheduled"][i]),
+                "projected_total": _money(projection["projected_total"][i]),
+                "projected_surplus": _money(projection["surplus"][i]),
+                "exhaustion_date": (today + timedelta(days=offset)).isoformat() if offset >= 0 else None
+            }
+        return forecasts
+
+    # Fleet queries, paged so max-rows never cuts them short
+    def _spends_query(self, today: date, auth_ids: Optional[List[str]] = None):
+        query = self.supabase_manager.table("spends")\
+            .select("id, auth_id, spent_amt, created_at")\
+            .gt("spent_amt", 0)\
+            .gte("created_at", self.window_start(today).isoformat())
+        return query.in_("auth_id", auth_ids) if auth_ids else query
+
+    def _bills_query(self, auth_ids: Optional[List[str]] = None):
+        query = self.supabase_manager.table("payments")\
+            .select("id, auth_id, amount, frequency, due_date, next_payment_date")\
+            .eq("status", "active")
+        return query.in_("auth_id", auth_ids) if auth_ids else query
+
+    async def _scan(self, make_query) -> List[Dict[str, Any]]:
+        rows = []
+        async for page in self.supabase_manager.scan_pages(make_query):
+            rows.extend(page)
+        return rows
+
+    def invalidate(self, auth_id: str):
+        self._cache.pop(auth_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"period": self.period, "cache": self._cache.stats(), "last_refresh": self.last_refresh}
@@ -0,0 +1,187 @@
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional
+from app.agents.expense_parser import AMOUNT_PATTERN, KeywordMatcher
+from app.agents.llm_provider import get_provider
+
+# Phrase -> weight per intent, compiled into one keyword automaton
+INTENT_KEYWORDS = {
+    "log_expense": {"log": 1.5, "add expense": 2.0, "add an expense": 2.0, "record": 1.0, "spent on": 1.2,
+                    "bought": 1.2, "paid for": 1.2, "expense": 0.6},
+    "budget_status": {"budget": 1.2, "how much have i spent": 2.5, "how much did i spend": 2.5, "spent so far": 2.0,
+                      "spending": 0.8, "left": 0.6, "remaining": 0.8, "how am i doing": 1.5, "over budget": 2.0},
+    "pending_bills": {"bills": 0.6, "pending bills": 2.5, "due": 1.0, "upcoming": 1.0, "what do i owe": 2.0,
+                      "which bills": 2.0, "bills due": 2.5, "show my bills": 2.5, "list my bills": 2.5},
+    "pay_bills": {"pay": 1.5, "pay my bills": 3.0, "pay bills": 3.0, "pay the bills": 3.0, "settle": 1.5,
+                  "clear my bills": 2.5},
+    "forecast": {"forecast": 2.5, "run out": 2.5, "end of the month": 1.5, "end of the week": 1.5,
+                 "projection": 2.0, "projected": 1.5, "will i have": 1.5, "on track": 1.5, "month end": 1.5},
+    "insights": {"insights": 2.5, "breakdown": 2.0, "where is my money going": 3.0, "where does my money go": 3.0,
+                 "categories": 1.0, "trends": 2.0, "top category": 2.0, "unusual": 1.5, "analysis": 1.5},
+}
+
+# Seed utterances for the local naive Bayes classifier
+SEED_EXAMPLES = {
+    "log_expense": ["log 250 food", "spent 1200 on groceries", "add 99 for netflix", "uber 340 yesterday",
+                    "paid 500 for dinner", "bought shoes for 2000", "coffee 120", "record 300 petrol"],
+    "budget_status": ["how is my budget", "how much have i spent this month", "am i over budget",
+                      "what is left in my budget", "check my budget", "how am i doing on spending",
+                      "remaining budget", "budget status"],
+    "pending_bills": ["what bills are due", "show my pending bills", "which bills are coming up",
+                      "list upcoming payments", "do i have any bills due", "what do i owe this week"],
+    "pay_bills": ["pay my bills", "pay the electricity bill", "settle my pending bills", "go ahead and pay",
+                  "clear all my dues", "pay whatever is due"],
+    "forecast": ["will i run out of money", "forecast my spending", "where will i end the month",
+                 "am i on track for the week", "projected spending by month end", "how much will i have left"],
+    "insights": ["where is my money going", "show spending breakdown", "what are my top categories",
+                 "any unusual expenses", "spending trends", "give me insights"],
+}
+
+_TOKEN = re.compile(r"[a-z]+")
+_CLAUSES = re.compile(r"\s*(?:[,;&]|\band then\b|\bthen\b|\band also\b|\balso\b|\band\b)\s*", re.IGNORECASE)
+
+def _tokens(text: str) -> List[str]:
+    words = _TOKEN.findall(text.lower())
+    tokens = words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+    if AMOUNT_PATTERN.search(text):
+        tokens.append("<amount>")
+    return tokens
+
+class IntentRouter:
+    """Routes chat messages to intents without a model round trip.
+
+    Each clause is scored by a keyword automaton (one compiled matcher over
+    every intent phrase) plus a naive Bayes classifier trained on seed
+    utterances; the combined softmax gives the confidence. Messages that mix
+    intents ("log 250 food and how's my budget") or several expenses ("log 250
+    food and 100 coffee") are split into clauses.
+    Only when the local router is unsure does `resolve` ask the LLM.
+    """
+
+    def __init__(self, threshold: Optional[float] = None):
+        self.threshold = threshold or float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.6"))
+        self.intents = list(INTENT_KEYWORDS)
+        self.keywords = KeywordMatcher({
+            phrase: (intent, weight)
+            for intent, phrases in INTENT_KEYWORDS.items() for phrase, weight in phrases.items()
+        })
+        self._train(SEED_EXAMPLES)
+        self.llm = get_provider("gemini")
+        self.model = "gemini-2.0-flash"
+        self.llm_timeout = float(os.getenv("INTENT_LLM_TIMEOUT", "5"))
+        self.routed = 0
+        self.llm_fallbacks = 0
+
+        self.system_prompt = """You route PennyPal chat messages. Call route_message once with every intent the message asks for."""
+        self.tools = [
+            {
+                "name": "route_message",
+                "description": "Intents requested by the message",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "intents": {"type": "array", "items": {"type": "string", "enum": self.intents}}
+                    },
+                    "required": ["intents"]
+                }
+            }
+        ]
+
+    def _train(self, examples: Dict[str, List[str]]):
+        counts = {intent: {} for intent in self.intents}
+        for intent, texts in examples.items():
+            for text in texts:
+                for token in _tokens(text):
+                    counts[intent][token] = counts[intent].get(token, 0) + 1
+        vocabulary = {token for intent_counts in counts.values() for token in intent_counts}
+        self._unseen = {}
+        self._log_likelihood = {}
+        for intent, intent_counts in counts.items():
+            # Laplace smoothing over the shared vocabulary
+            total = sum(intent_counts.values()) + len(vocabulary) + 1
+            self._log_likelihood[intent] = {token: math.log((n + 1) / total) for token, n in intent_counts.items()}
+            self._unseen[intent] = math.log(1 / total)
+        self._vocabulary = vocabulary
+
+    def classify(self, text: str) -> Dict[str, Any]:
+        """Best intent for one clause, with a softmax confidence"""
+        scores = {intent: 0.0 for intent in self.intents}
+        for token in _tokens(text):
+            if token in self._vocabulary:
+                for intent in self.intents:
+                    scores[intent] += self._log_likelihood[intent].get(token, self._unseen[intent])
+        for _, (intent, weight), _ in self.keywords.find(text):
+            scores[intent] += 1.5 * weight
+
+        top = max(scores.values())
+        weights = {intent: math.exp(score - top) for intent, score in scores.items()}
+        total = sum(weights.values())
+        intent = max(weights, key=weights.get)
+        return {"intent": intent, "confidence": round(weights[intent] / total, 3), "text": text.strip()}
+
+    def route(self, text: str) -> Dict[str, Any]:
+        """Intents for a whole message, splitting into clauses when they disagree"""
+        self.routed += 1
+        whole = self.classify(text)
+        clauses = [clause for clause in _CLAUSES.split(text) if clause and clause.strip()]
+        routes = [whole]
+        if len(clauses) > 1:
+            split = self._merge_clauses([self.classify(clause) for clause in clauses])
+            # Only trust a split when every clause is confident and it yields several tasks
+            if all(route["confidence"] >= self.threshold for route in split) and len(split) > 1:
+                routes = split
+        confidence = min(route["confidence"] for route in routes)
+        return {"intents": routes, "confidence": confidence, "uncertain": confidence < self.threshold, "source": "local"}
+
+    @staticmethod
+    def _merge_clauses(split: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep every expense clause that carries its own amount ("log 250 food and
+        100 coffee" is two expenses); fold amount-less expense clauses into their
+        neighbour and drop repeats of the read-only intents."""
+        routes: List[Dict[str, Any]] = []
+        for route in split:
+            if route["intent"] == "log_expense":
+                previous = routes[-1] if routes else None
+                if previous and previous["intent"] == "log_expense" and not (
+                    AMOUNT_PATTERN.search(previous["text"]) and AMOUNT_PATTERN.search(route["text"])
+                ):
+                    previous["text"] = f"{previous['text']} {route['text']}"
+                    previous["confidence"] = min(previous["confidence"], route["confidence"])
+                    continue
+                routes.append(dict(route))
+            elif route["intent"] not in [existing["intent"] for existing in routes]:
+                routes.append(route)
+        return routes
+
+    async def resolve(self, text: str) -> Dict[str, Any]:
+        """Local route, with an LLM fallback only when the router is uncertain"""
+        route = self.route(text)
+        if not route["uncertain"]:
+            return route
+
+        self.llm_fallbacks += 1
+        try:
+            response = await self.llm.generate(
+                self.model, [{"role": "user", "content": text}],
+                system=self.system_prompt, tools=self.tools, timeout=self.llm_timeout
+            )
+            call = next((call for call in response.tool_calls if call.name == "route_message"), None)
+            intents = [intent for intent in (call.args.get("intents") or []) if intent in self.intents] if call else []
+            if intents:
+                return {
+                    "intents": [{"intent": intent, "confidence": None, "text": text} for intent in dict.fromkeys(intents)],
+                    "confidence": None,
+                    "uncertain": False,
+                    "source": "llm"
+                }
+        except Exception as e:
+            print(f"Intent fallback error: {e}")
+        return route
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "routed": self.routed,
+            "llm_fallbacks": self.llm_fallbacks,
+            "llm_ratio": round(self.llm_fallbacks / self.routed, 3) if self.routed else 0.0
+        }
@@ -0,0 +1,305 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import httpx
+from app.utils import metrics
+
+# Provider-neutral conversation format shared by every agent:
+#   {"role": "user", "content": "..."}
+#   {"role": "assistant", "content": "...", "tool_calls": [ToolCall, ...]}
+#   {"role": "tool", "name": "...", "tool_call_id": "...", "content": {...}}
+# Tools are declared as {"name", "description", "parameters": <JSON schema>}.
+
+@dataclass
+class ToolCall:
+    name: str
+    args: Dict[str, Any]
+    id: Optional[str] = None
+    # Provider-native part, replayed verbatim when the conversation continues
+    raw: Any = None
+
+@dataclass
+class LLMResponse:
+    text: str
+    tool_calls: List[ToolCall] = field(default_factory=list)
+    model: str = ""
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+
+    def as_message(self) -> Dict[str, Any]:
+        return {"role": "assistant", "content": self.text, "tool_calls": self.tool_calls}
+
+class LLMTimeoutError(asyncio.TimeoutError):
+    """The call did not finish within its deadline (retries included)."""
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return status in RETRYABLE_STATUS
+
+class LLMProvider:
+    """Base provider: shared concurrency limit, per-call deadline and jittered retries.
+
+    Subclasses implement `_generate` for a single attempt.
+    """
+    name = "base"
+
+    def __init__(self, timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                 concurrency: Optional[int] = None):
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT", "20"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "2"))
+        self.semaphore = asyncio.Semaphore(concurrency or int(os.getenv("LLM_CONCURRENCY", "32")))
+        self.backoff_base = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+
+    async def generate(self, model: str, messages: List[Dict[str, Any]], system: Optional[str] = None,
+                       tools: Optional[List[Dict[str, Any]]] = None, timeout: Optional[float] = None) -> LLMResponse:
+        """Run one generation, retrying transient failures until the deadline"""
+        outcome = "error"
+        with metrics.timer() as elapsed:
+            try:
+                response = await self._generate_with_retries(model, messages, system, tools, timeout)
+                outcome = "ok"
+            except LLMTimeoutError:
+                outcome = "timeout"
+                raise
+            finally:
+                metrics.LLM_SECONDS.observe(elapsed["seconds"], provider=self.name, model=model, outcome=outcome)
+        metrics.LLM_TOKENS.inc(response.prompt_tokens, provider=self.name, model=model, kind="prompt")
+        metrics.LLM_TOKENS.inc(response.response_tokens, provider=self.name, model=model, kind="response")
+        metrics.record_span(
+            "llm", elapsed["seconds"], provider=self.name, model=model,
+            prompt_tokens=response.prompt_tokens, response_tokens=response.response_tokens
+        )
+        return response
+
+    async def _generate_with_retries(self, model, messages, system, tools, timeout) -> LLMResponse:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout)
+        attempt = 0
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise LLMTimeoutError(f"{self.name} call to {model} exceeded its deadline")
+            try:
+                async with self.semaphore:
+                    return await asyncio.wait_for(self._generate(model, messages, system, tools), remaining)
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    if isinstance(e, asyncio.TimeoutError) and not isinstance(e, LLMTimeoutError):
+                        raise LLMTimeoutError(f"{self.name} call to {model} exceeded its deadline") from e
+                    raise
+                # Full jitter: sleep a random slice of the exponential backoff window
+                delay = random.uniform(0, self.backoff_base * (2 ** attempt))
+                attempt += 1
+                await asyncio.sleep(min(delay, max(0.0, deadline - loop.time())))
+
+    async def _generate(self, model, messages, system, tools) -> LLMResponse:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, http_client: httpx.AsyncClient, **kwargs):
+        super().__init__(**kwargs)
+        from google import genai
+        from google.genai import types
+        self.types = types
+        self.client = genai.Client(
+            api_key=os.getenv("GOOGLE_API_KEY"),
+            http_options=types.HttpOptions(httpx_async_client=http_client)
+        )
+
+    def _contents(self, messages):
+        types = self.types
+        contents = []
+        for message in messages:
+            if message["role"] == "tool":
+                part = types.Part(function_response=types.FunctionResponse(
+                    name=message["name"],
+                    response={"result": message["content"]}
+                ))
+                # Every result of one turn goes back in a single content
+                previous = contents[-1] if contents else None
+                if previous is not None and previous.role == "user" and previous.parts and previous.parts[0].function_response:
+                    previous.parts.append(part)
+                else:
+                    contents.append(types.Content(role="user", parts=[part]))
+            elif message["role"] == "assistant":
+                parts = [types.Part(text=message["content"])] if message.get("content") else []
+                for call in message.get("tool_calls") or []:
+                    parts.append(call.raw or types.Part(
+                        function_call=types.FunctionCall(name=call.name, args=call.args)
+                    ))
+                contents.append(types.Content(role="model", parts=parts))
+            else:
+                contents.append(types.Content(role="user", parts=[types.Part(text=message["content"])]))
+        return contents
+
+    async def _generate(self, model, messages, system, tools):
+        types = self.types
+        config = types.GenerateContentConfig(
+            system_instruction=system,
+            tools=[types.Tool(function_declarations=[
+                types.FunctionDeclaration(
+                    name=tool["name"],
+                    description=tool.get("description"),
+                    parameters_json_schema=tool.get("parameters")
+                ) for tool in tools
+            ])] if tools else None
+        )
+        response = await self.client.aio.models.generate_content(
+            model=model, contents=self._contents(messages), config=config
+        )
+
+        tool_calls = []
+        if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
+            for part in response.candidates[0].content.parts:
+                if getattr(part, "function_call", None):
+                    tool_calls.append(ToolCall(
+                        name=part.function_call.name,
+                        args=dict(part.function_call.args or {}),
+                        id=part.function_call.id,
+                        raw=part
+                    ))
+        usage = response.usage_metadata
+        return LLMResponse(
+            text=(response.text or "") if not tool_calls else "",
+            tool_calls=tool_calls,
+            model=model,
+            prompt_tokens=(usage.prompt_token_count or 0) if usage else 0,
+            response_tokens=(usage.candidates_token_count or 0) if usage else 0
+        )
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, http_client: httpx.AsyncClient, **kwargs):
+        super().__init__(**kwargs)
+        from openai import AsyncOpenAI
+        # Retries are handled by LLMProvider.generate
+        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client, max_retries=0)
+
+    def _messages(self, messages, system):
+        converted = [{"role": "system", "content": system}] if system else []
+        for message in messages:
+            if message["role"] == "tool":
+                converted.append({
+                    "role": "tool",
+                    "tool_call_id": message.get("tool_call_id"),
+                    "content": json.dumps(message["content"], default=str)
+                })
+            elif message["role"] == "assistant":
+                entry = {"role": "assistant", "content": message.get("content") or None}
+                if message.get("tool_calls"):
+                    entry["tool_calls"] = [{
+                        "id": call.id,
+                        "type": "function",
+                        "function": {"name": call.name, "arguments": json.dumps(call.args)}
+                    } for call in message["tool_calls"]]
+                converted.append(entry)
+            else:
+                converted.append({"role": "user", "content": message["content"]})
+        return converted
+
+    async def _generate(self, model, messages, system, tools):
+        kwargs = {}
+        if tools:
+            kwargs["tools"] = [{"type": "function", "function": tool} for tool in tools]
+            kwargs["tool_choice"] = "auto"
+        response = await self.client.chat.completions.create(
+            model=model, messages=self._messages(messages, system), **kwargs
+        )
+        message = response.choices[0].message
+        tool_calls = [
+            ToolCall(name=call.function.name, args=json.loads(call.function.arguments or "{}"), id=call.id)
+            for call in message.tool_calls or []
+        ]
+        usage = response.usage
+        return LLMResponse(
+            text=message.content or "",
+            tool_calls=tool_calls,
+            model=model,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            response_tokens=usage.completion_tokens if usage else 0
+        )
+
+class StubProvider(LLMProvider):
+    """Deterministic offline provider for load tests.
+
+    On the first turn it requests every declared tool whose required
+    arguments are all strings; once tool results are present it answers
+    with text derived from the conversation. Latency is configurable with
+    LLM_STUB_LATENCY_MS.
+    """
+    name = "stub"
+
+    def __init__(self, latency_ms: Optional[float] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = (latency_ms if latency_ms is not None else float(os.getenv("LLM_STUB_LATENCY_MS", "0"))) / 1000
+
+    async def _generate(self, model, messages, system, tools):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        prompt = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        answered = [m for m in messages if m["role"] == "tool"]
+
+        if tools and not answered:
+            calls = []
+            for tool in tools:
+                schema = tool.get("parameters") or {}
+                required = schema.get("required", [])
+                properties = schema.get("properties", {})
+                if all(properties.get(arg, {}).get("type") == "string" for arg in required):
+                    calls.append(ToolCall(name=tool["name"], args={arg: "" for arg in required}, id=f"stub-{tool['name']}"))
+            if calls:
+                return LLMResponse(text="", tool_calls=calls, model=model,
+                                   prompt_tokens=len(prompt) // 4, response_tokens=len(calls) * 8)
+
+        digest = hashlib.sha1(json.dumps([prompt, [m["content"] for m in answered]], default=str).encode()).hexdigest()[:8]
+        used = ", ".join(m["name"] for m in answered)
+        text = f"[stub {digest}] " + prompt.splitlines()[0][:80] + (f" (tools: {used})" if used else "")
+        return LLMResponse(text=text, model=model, prompt_tokens=len(prompt) // 4, response_tokens=len(text) // 4)
+
+# Shared registry: one provider per kind, all on one pooled HTTP client
+_http_client: Optional[httpx.AsyncClient] = None
+_providers: Dict[str, LLMProvider] = {}
+PROVIDERS = {"gemini": GeminiProvider, "openai": OpenAIProvider, "stub": StubProvider}
+
+def get_provider(name: str) -> LLMProvider:
+    """Shared provider instance; LLM_PROVIDER (e.g. 'stub') overrides every agent's choice"""
+    global _http_client
+    name = os.getenv("LLM_PROVIDER") or name
+    if name not in _providers:
+        if name == "stub":
+            _providers[name] = StubProvider()
+        else:
+            if _http_client is None:
+                _http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "64")),
+                        max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", "32"))
+                    ),
+                    timeout=httpx.Timeout(float(os.getenv("LLM_TIMEOUT", "20")))
+                )
+            _providers[name] = PROVIDERS[name](_http_client)
+    return _providers[name]
+
+async def close_providers():
+    global _http_client
+    for provider in _providers.values():
+        await provider.close()
+    _providers.clear()
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
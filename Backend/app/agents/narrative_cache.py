@@ -0,0 +1,46 @@
+import os
+from typing import Any, Dict, Optional, Tuple
+from app.utils.cache import LRUCache
+
+class BudgetNarrativeCache:
+    """Caches LLM budget narratives per user against a normalized spending snapshot.
+
+    The snapshot is reduced to (budget limit, spend-percentage bucket). A lookup
+    with the same bucket is answered from memory; a lookup in a different bucket
+    invalidates the stored narrative and falls through to the model.
+    """
+
+    def __init__(self, max_users: Optional[int] = None, ttl_seconds: Optional[float] = None,
+                 bucket_pct: Optional[float] = None):
+        self._cache = LRUCache(
+            max_entries=max_users or int(os.getenv("BUDGET_CACHE_MAX_USERS", "10000")),
+            ttl_seconds=ttl_seconds or float(os.getenv("BUDGET_CACHE_TTL", "600"))
+        )
+        self.bucket_pct = bucket_pct or float(os.getenv("BUDGET_CACHE_BUCKET_PCT", "1"))
+        self.invalidations = 0
+
+    def snapshot_key(self, snapshot: Dict[str, Any]) -> Tuple[float, int]:
+        limit = snapshot.get("limit") or 0
+        spent = snapshot.get("spent") or 0
+        percentage = (spent / limit * 100) if limit > 0 else 0
+        return (round(limit, 2), int(percentage // self.bucket_pct))
+
+    def lookup(self, auth_id: str, snapshot: Dict[str, Any]) -> Optional[str]:
+        entry = self._cache.peek(auth_id)
+        if entry is not None and entry[0] != self.snapshot_key(snapshot):
+            # Snapshot moved to another bucket - the stored narrative is stale
+            self._cache.pop(auth_id)
+            self.invalidations += 1
+        # Counts the hit or miss on the underlying cache
+        entry = self._cache.get(auth_id)
+        return entry[1] if entry is not None else None
+
+    def store(self, auth_id: str, snapshot: Dict[str, Any], text: str):
+        self._cache.set(auth_id, (self.snapshot_key(snapshot), text))
+
+    def invalidate(self, auth_id: str):
+        if self._cache.pop(auth_id) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._cache.stats(), "invalidations": self.invalidations}
@@ -0,0 +1,142 @@
+import os
+from datetime import date
+from typing import Any, Dict, Optional
+from app.utils.cache import LRUCache
+from app.utils.supabase_client import SupabaseManager
+from app.agents.expense_parser import CATEGORY_LEXICON, ExpenseParser, KeywordMatcher
+from app.agents.llm_provider import get_provider
+
+class NLPAgent:
+    """Turns free-text expense messages ("Log ₹250 food") into spend records.
+
+    A local rule-based parser handles almost every message; the LLM is only
+    asked when the parser's confidence is below NLP_CONFIDENCE_THRESHOLD.
+    Merchant -> category corrections are learned per user and folded into
+    that user's keyword matcher, which is rebuilt whenever the user's cached
+    learning patterns change.
+    """
+    LEARNING_TYPE = "nlp_merchant"
+
+    def __init__(self, supabase_manager: SupabaseManager):
+        self.supabase_manager = supabase_manager
+        self.llm = get_provider("gemini")
+        self.model = "gemini-2.0-flash"
+        self.parser = ExpenseParser()
+        self.confidence_threshold = float(os.getenv("NLP_CONFIDENCE_THRESHOLD", "0.65"))
+        self.llm_timeout = float(os.getenv("NLP_LLM_TIMEOUT", "5"))
+        # auth_id -> (patterns signature, KeywordMatcher over the user's learned merchants)
+        self.merchants = LRUCache(
+            max_entries=int(os.getenv("NLP_MERCHANT_CACHE_SIZE", "5000")),
+            ttl_seconds=float(os.getenv("NLP_MERCHANT_CACHE_TTL", "3600"))
+        )
+        self.parsed = 0
+        self.llm_fallbacks = 0
+
+        self.system_prompt = f"""You are PennyPal's expense parser.
+Extract the expense from the user's message and call record_expense exactly once.
+Use one of these categories: {", ".join(CATEGORY_LEXICON)}, Other. Dates are YYYY-MM-DD."""
+        self.tools = [
+            {
+                "name": "record_expense",
+                "description": "Record the expense described in the message",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "amount": {"type": "number", "description": "Amount in rupees"},
+                        "category": {"type": "string"},
+                        "date": {"type": "string", "description": "YYYY-MM-DD"},
+                        "merchant": {"type": "string"}
+                    },
+                    "required": ["amount", "category"]
+                }
+            }
+        ]
+
+    async def _learned_matcher(self, auth_id: str) -> Optional[KeywordMatcher]:
+        try:
+            # Served from the manager's pattern cache; no round trip once warm
+            patterns = await self.supabase_manager.get_user_learning_patterns(auth_id, self.LEARNING_TYPE)
+        except Exception as e:
+            print(f"Could not load learned merchants: {e}")
+            return None
+        signature = (len(patterns), patterns[0].get("created_at") if patterns else None)
+        entry = self.merchants.get(auth_id)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        
+        mappings = {}
+        # Newest first, so the latest correction for a merchant wins
+        for row in reversed(patterns):
+            data = row.get("learning_data") or {}
+            if data.get("merchant") and data.get("category"):
+                mappings[data["merchant"]] = data["category"]
+        matcher = KeywordMatcher(mappings)
+        self.merchants.set(auth_id, (signature, matcher))
+        return matcher
+
+    async def parse_expense(self, text: str, auth_id: str, allow_llm: bool = True) -> Dict[str, Any]:
+        """Parse locally; ask the LLM only when the rules are not confident enough"""
+        self.parsed += 1
+        today = date.today()
+        parsed = self.parser.parse(text, await self._learned_matcher(auth_id), today)
+        if parsed["confidence"] >= self.confidence_threshold or not allow_llm:
+            return parsed
+
+        self.llm_fallbacks += 1
+        try:
+            response = await self.llm.generate(
+                self.model,
+                [{"role": "user", "content": f"Today is {today.isoformat()}. Message: {text}"}],
+                system=self.system_prompt,
+                tools=self.tools,
+                timeout=self.llm_timeout
+            )
+            call = next((call for call in response.tool_calls if call.name == "record_expense"), None)
+            if call and call.args.get("amount"):
+                return {
+                    **parsed,
+                    "amount": float(call.args["amount"]),
+                    "category": call.args.get("category") or parsed["category"],
+                    "merchant": call.args.get("merchant") or parsed["merchant"],
+                    "date": call.args.get("date") or parsed["date"],
+                    "date_explicit": parsed["date_explicit"] or bool(call.args.get("date")),
+                    "confidence": max(parsed["confidence"], self.confidence_threshold),
+                    "source": "llm"
+                }
+        except Exception as e:
+            print(f"NLP fallback error: {e}")
+        return parsed
+
+    async def learn_merchant(self, auth_id: str, merchant: str, category: str):
+        """Remember that this user's `merchant` belongs to `category`"""
+        await self.supabase_manager.save_agent_learning(
+            auth_id, self.LEARNING_TYPE, {"merchant": merchant, "category": category}, 1.0
+        )
+
+    async def process_expense_data(self, expense_data: dict, auth_id: str):
+        """Fill amount/category/date from `text` when the client sends a message instead of fields"""
+        text = expense_data.get("text")
+        if not text or expense_data.get("amount"):
+            return expense_data
+
+        parsed = await self.parse_expense(text, auth_id)
+        # An explicit category alongside the text is a correction worth learning
+        if expense_data.get("category") and parsed["merchant"] and expense_data["category"] != parsed["category"]:
+            await self.learn_merchant(auth_id, parsed["merchant"], expense_data["category"])
+
+        return {
+            **expense_data,
+            "amount": parsed["amount"],
+            "category": expense_data.get("category") or parsed["category"],
+            "payment_name": expense_data.get("payment_name") or parsed["merchant"] or parsed["description"],
+            "date": parsed["date"] if parsed["date_explicit"] else expense_data.get("date"),
+            "parsed": parsed
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "parsed": self.parsed,
+            "llm_fallbacks": self.llm_fallbacks,
+            "llm_ratio": round(self.llm_fallbacks / self.parsed, 3) if self.parsed else 0.0,
+            "merchant_cache": self.merchants.stats()
+        }
@@ -1,12 +1,47 @@
 from app.utils.supabase_client import SupabaseManager
 from app.agents.budget_agent import BudgetAgent
 from app.agents.payment_agent import PaymentAgent
+from app.agents.nlp_agent import NLPAgent
+from app.agents.intent_router import IntentRouter
+from app.agents.alert_dispatcher import AlertDispatcher
+from app.agents.bill_scheduler import BillScheduler
+from app.agents.budget_monitor import BudgetMonitor, threshold_state
+from app.agents.spending_analytics import SpendingAnalytics
+from app.agents.forecasting import ForecastEngine
+from app.utils.singleflight import SingleFlight
+from app.utils.rollups import parse_period, period_bounds
+from datetime import datetime, timezone
+import asyncio
+import os
 
-class NLPAgent:
-    """Mock NLP Agent for processing expenses."""
-    async def process_expense_data(self, expense_data: dict, auth_id: str):
-        # In a real app, this would use Gemini to extract structured data from text
-        return expense_data
+# Intents that change state run before the read-only ones in the same message.
+# pay_bills is not one: chat only previews payments, which the user confirms
+# through the check-payments endpoint, so no phrasing of a question moves money
+WRITE_INTENTS = ("log_expense",)
+
+# Sections of the composite overview; the default covers the dashboard,
+# ai-status, payment-status and pending-bills screens
+OVERVIEW_FIELDS = ("spending", "ai_insights", "agent_status", "budget_info", "pending_bills", "forecast")
+DEFAULT_OVERVIEW_FIELDS = ("spending", "ai_insights", "agent_status", "budget_info", "pending_bills")
+
+def spending_summary(spending: dict):
+    """Dashboard spending block from a `get_spending_period` result"""
+    total_spent = spending["total_spent"]
+    budget_limit = 0
+    
+    if spending["row_count"]:
+        # Latest budget set, or the default
+        budget_limit = spending["period_budget"]
+    
+    return {
+        "total": total_spent,
+        "budget": budget_limit,
+        "percentage": round((total_spent / budget_limit * 100) if budget_limit > 0 else 0, 1),
+        "period": spending["period"],
+        "start": spending["start"],
+        "end": spending["end"],
+        "by_category": spending["by_category"]
+    }
 
 class DecisionOrchestrator:
     def __init__(self, supabase_manager: SupabaseManager):
@@ -14,28 +49,189 @@ class DecisionOrchestrator:
         self.budget_agent = None
         self.payment_agent = None
         self.nlp_agent = None
+        self.router = None
+        self.alert_dispatcher = None
+        self.bill_scheduler = None
+        self.budget_monitor = None
+        self.analytics = SpendingAnalytics(supabase_manager)
+        self.forecaster = ForecastEngine(supabase_manager)
+        # Concurrent identical calls for the same user share one execution
+        self.single_flight = SingleFlight()
 
     async def initialize_agents(self):
         """Initializes all AI agents."""
         print("Initializing AI Agents...")
         self.budget_agent = BudgetAgent(self.supabase_manager)
         self.payment_agent = PaymentAgent(self.supabase_manager)
-        self.nlp_agent = NLPAgent()
+        self.payment_agent.forecaster = self.forecaster
+        self.nlp_agent = NLPAgent(self.supabase_manager)
+        self.router = IntentRouter()
+        self.alert_dispatcher = AlertDispatcher(self.check_budget_status, band=self.budget_band)
+        await self.alert_dispatcher.start()
+        if os.getenv("BILL_SCHEDULER_ENABLED", "true").lower() == "true":
+            self.bill_scheduler = BillScheduler(self.supabase_manager, self.payment_agent)
+            self.payment_agent.scheduler = self.bill_scheduler
+            await self.bill_scheduler.start()
+        if os.getenv("BUDGET_MONITOR_ENABLED", "true").lower() == "true":
+            self.budget_monitor = BudgetMonitor(self.supabase_manager, self, self.alert_dispatcher)
+            await self.budget_monitor.start()
+        if os.getenv("FORECAST_REFRESH_ENABLED", "true").lower() == "true":
+            await self.forecaster.start()
         print("✅ Budget Agent, Payment Agent, and NLP Agent Initialized.")
 
+    async def shutdown(self):
+        """Stops background workers."""
+        if self.alert_dispatcher:
+            await self.alert_dispatcher.stop()
+        if self.bill_scheduler:
+            await self.bill_scheduler.stop()
+        if self.budget_monitor:
+            await self.budget_monitor.stop()
+        await self.forecaster.stop()
+
     async def process_message(self, auth_id: str, message_text: str):
         """
-        Process an incoming message and route to appropriate agent.
+        Route a chat message to its intents and answer them.
+        Writes (logging an expense) run first, then every read-only intent
+        runs concurrently. Bill payments are never made from chat.
         """
-        # Simple routing logic
-        if "budget" in message_text.lower() or "spent" in message_text.lower():
-            response = await self.budget_agent.check_budget_status(auth_id)
-            return {"response": response}
-        elif "pay" in message_text.lower() or "bill" in message_text.lower():
-            response = await self.check_and_pay_bills(auth_id)
-            return {"response": response}
+        route = await self.router.resolve(message_text)
+        if route["uncertain"]:
+            return {
+                "response": "I can log expenses, check your budget, show or pay bills, forecast your spending and explain where your money goes. Try 'Log ₹250 food' or 'How is my budget?'",
+                "intents": [],
+                "route": route
+            }
+        
+        # Answers are kept by position: a message may log several expenses
+        intents = route["intents"]
+        writes = [i for i, item in enumerate(intents) if item["intent"] in WRITE_INTENTS]
+        reads = [i for i, item in enumerate(intents) if item["intent"] not in WRITE_INTENTS]
+        answers = [None] * len(intents)
+        for positions in (writes, reads):
+            results = await asyncio.gather(*[self._handle_intent(auth_id, intents[i]) for i in positions])
+            for i, result in zip(positions, results):
+                answers[i] = {"intent": intents[i]["intent"], **result}
+        return {
+            "response": "\n".join(answer["text"] for answer in answers),
+            "intents": [item["intent"] for item in intents],
+            "results": answers,
+            "route": route
+        }
+
+    async def _handle_intent(self, auth_id: str, item: dict):
+        intent = item["intent"]
+        try:
+            if intent == "log_expense":
+                expense_data = await self.nlp_agent.process_expense_data({"text": item["text"]}, auth_id)
+                if not expense_data.get("amount"):
+                    return {"text": f"I couldn't find an amount in '{item['text']}'.", "data": expense_data.get("parsed")}
+                try:
+                    result = await self.record_expense(auth_id, expense_data)
+                except ValueError as e:
+                    return {"text": f"I couldn't log that: {e}.", "data": expense_data.get("parsed")}
+                return {
+                    "text": f"Logged ₹{expense_data['amount']} for {expense_data['category']}" + (f" on {expense_data['date']}." if expense_data.get("date") else "."),
+                    "data": result.data[0] if result.data else expense_data
+                }
+            if intent == "budget_status":
+                text = await self.check_budget_status(auth_id)
+                return {"text": text, "data": None}
+            if intent == "pending_bills":
+                bills = await self.get_pending_bills(auth_id)
+                if not bills.get("bills"):
+                    return {"text": "You have no pending bills.", "data": bills}
+                overdue = sum(1 for bill in bills["bills"] if bill["is_overdue"])
+                return {
+                    "text": f"You have {bills['count']} pending bills totaling ₹{bills['total_amount']}" + (f" ({overdue} overdue)." if overdue else "."),
+                    "data": bills
+                }
+            if intent == "pay_bills":
+                return await self.preview_bill_payment(auth_id)
+            if intent == "forecast":
+                forecast = await self.get_forecast(auth_id)
+                if forecast["exhaustion_date"]:
+                    text = f"At your current pace your budget runs out on {forecast['exhaustion_date']} (projected ₹{forecast['projected_total']} of ₹{forecast['budget']})."
+                else:
+                    text = f"You're on track to finish {forecast['end']} with ₹{forecast['projected_surplus']} left."
+                return {"text": text, "data": forecast}
+            if intent == "insights":
+                insights = await self.generate_dashboard_insights(auth_id)
+                return {"text": " ".join(insight["text"] for insight in insights[:3]) or "Not enough spending yet for insights.", "data": insights}
+        except Exception as e:
+            print(f"Error handling intent {intent}: {e}")
+            return {"text": f"Sorry, I couldn't complete '{intent}' right now.", "error": str(e)}
+        return {"text": "I'm not sure how to help with that.", "data": None}
+
+    async def record_expense(self, auth_id: str, expense_data: dict):
+        """Save an expense to 'spends' and queue a background budget evaluation.
+        Raises ValueError for a date that isn't ISO 8601."""
+        spend_record = {
+            "auth_id": auth_id,
+            "category": expense_data.get("category", "Other"),
+            "spent_amt": expense_data.get("amount", 0),
+            "description": expense_data.get("payment_name", ""),
+        }
+        if expense_data.get("date"):
+            try:
+                spend_record["created_at"] = datetime.fromisoformat(str(expense_data["date"])).isoformat()
+            except ValueError:
+                raise ValueError(f"Invalid date: {expense_data['date']!r} (expected YYYY-MM-DD)")
+        
+        result = await self.supabase_manager.insert_spend(spend_record)
+        # Budget evaluation runs in the background; alerts arrive on the alert stream
+        self.alert_dispatcher.enqueue(auth_id)
+        return result
+
+    # Coalesced agent calls
+    def _flight_key(self, name: str, auth_id: str, *args):
+        # Keyed on the state version so a read requested after a write (an
+        # expense, a bill payment) never joins one that started before it
+        return (name, auth_id, self.supabase_manager.state_versions.get(auth_id), *args)
+
+    def _budget_check_key(self, auth_id: str):
+        return self._flight_key("budget_check", auth_id)
+
+    async def check_budget_status(self, auth_id: str):
+        return await self.single_flight.do(self._budget_check_key(auth_id), self.budget_agent.check_budget_status, auth_id)
+
+    async def budget_band(self, auth_id: str) -> str:
+        """Threshold band over the budget agent's window, as the budget monitor computes it"""
+        period, days = parse_period(self.budget_agent.period, default="month")
+        spending = await self.supabase_manager.get_spending_period(auth_id, period, days, default_week_budget=2000)
+        return threshold_state(spending["total_spent"] or 0, spending["period_budget"] or 0)
+
+    async def autonomous_budget_check(self, auth_id: str):
+        return await self.single_flight.do(self._budget_check_key(auth_id), self.budget_agent.autonomous_budget_check, auth_id)
+
+    async def get_pending_bills(self, auth_id: str):
+        return await self.single_flight.do(self._flight_key("pending_bills", auth_id), self.payment_agent.get_pending_bills, auth_id)
+
+    async def get_available_budget(self, auth_id: str, period: str = None):
+        return await self.single_flight.do(
+            self._flight_key("available_budget", auth_id, period), self.payment_agent.get_available_budget, auth_id, period
+        )
+
+    async def get_forecast(self, auth_id: str):
+        return await self.single_flight.do(self._flight_key("forecast", auth_id), self.forecaster.get_forecast, auth_id)
+
+    async def preview_bill_payment(self, auth_id: str):
+        """What check_and_pay_bills would consider, without paying anything.
+        The reply carries a confirm action pointing at the paying endpoint."""
+        bills, budget_info = await asyncio.gather(self.get_pending_bills(auth_id), self.get_available_budget(auth_id))
+        if not bills.get("bills"):
+            return {"text": "You have no pending bills to pay.", "data": {"bills": bills, "budget_info": budget_info}}
+        
+        text = f"You have {bills['count']} pending bills totaling ₹{bills['total_amount']}."
+        if budget_info.get("safe_to_pay"):
+            text += " Your budget has room for them. Confirm to let the Payment Agent pay them."
         else:
-            return {"response": "I can help you with your budget and bills. Try asking 'How is my budget?' or 'Pay my bills'"}
+            text += f" Your budget looks tight (₹{budget_info.get('available', 0)} available), so the Payment Agent may hold some back. Confirm to let it decide."
+        return {
+            "text": text,
+            "data": {"bills": bills, "budget_info": budget_info},
+            "confirm": {"action": "check_and_pay_bills", "method": "POST", "path": f"/api/user/{auth_id}/check-payments"}
+        }
 
     async def check_and_pay_bills(self, auth_id: str):
         """
@@ -45,19 +241,37 @@ class DecisionOrchestrator:
         """
         try:
             # Get available budget
-            budget_info = await self.payment_agent.get_available_budget(auth_id)
+            budget_info = await self.get_available_budget(auth_id)
+            forecast = budget_info.get("forecast") or {}
+            await self.supabase_manager.log_autonomous_decision(
+                auth_id, "bill_payment_gate",
+                {
+                    "available": budget_info.get("available"),
+                    "percentage_remaining": budget_info.get("percentage_remaining"),
+                    "projected_surplus": forecast.get("projected_surplus"),
+                    "rule": budget_info.get("decision")
+                },
+                {"safe_to_pay": budget_info.get("safe_to_pay", False)},
+                1.0
+            )
             
             if not budget_info.get("safe_to_pay", False):
+                if forecast:
+                    exhaustion = f", budget runs out {forecast['exhaustion_date']}" if forecast["exhaustion_date"] else ""
+                    message = f"Not enough projected surplus to pay bills. Expected ₹{forecast['projected_surplus']} left on {forecast['end']}{exhaustion}"
+                else:
+                    message = f"Not enough surplus to pay bills. Available: ₹{budget_info.get('available', 0)} ({budget_info.get('percentage_remaining', 0)}% remaining)"
                 return {
                     "action": "no_surplus",
-                    "message": f"Not enough surplus to pay bills. Available: ₹{budget_info.get('available', 0)} ({budget_info.get('percentage_remaining', 0)}% remaining)",
+                    "message": message,
                     "budget_info": budget_info
                 }
             
             # Trigger Payment Agent to process bills
             payment_result = await self.payment_agent.process_bills(
                 auth_id, 
-                budget_info.get("available", 0)
+                budget_info.get("available", 0),
+                budget_info
             )
             
             return {
@@ -73,19 +287,24 @@ class DecisionOrchestrator:
                 "message": f"Error processing bills: {str(e)}"
             }
 
+    async def get_spending_insights(self, auth_id: str):
+        """Vectorized spending analytics (cached per user)"""
+        return await self.single_flight.do(self._flight_key("spending_insights", auth_id), self.analytics.get_insights, auth_id)
+
     async def generate_dashboard_insights(self, auth_id: str):
-        """Generates AI insights for the dashboard."""
-        # Mock insights
-        return [
-            {"type": "tip", "text": "You're doing great on your savings goal!"},
-            {"type": "warning", "text": "Dining expenses are 10% higher than last month."}
-        ]
+        """Generates insights for the dashboard from the user's spending analytics."""
+        analytics = await self.get_spending_insights(auth_id)
+        return analytics["insights"]
 
     async def get_agent_status(self, auth_id: str):
         """Returns the health status of agents."""
+        return await self.single_flight.do(self._flight_key("agent_status", auth_id), self._get_agent_status, auth_id)
+
+    async def _get_agent_status(self, auth_id: str, pending_bills: dict = None):
         # Check if Payment Agent has pending bills
         try:
-            pending_bills = await self.payment_agent.get_pending_bills(auth_id)
+            if pending_bills is None:
+                pending_bills = await self.get_pending_bills(auth_id)
             bills_count = pending_bills.get("count", 0)
         except:
             bills_count = 0
@@ -98,3 +317,90 @@ class DecisionOrchestrator:
             "pending_bills": bills_count
         }
 
+    async def get_overview(self, auth_id: str, fields=None, period: str = "all", days: int = None,
+                           category: str = None, budget_period: str = None):
+        """Dashboard, agent status, budget info, pending bills and forecast in one call.
+        Raises ValueError for unknown fields or periods."""
+        fields = tuple(dict.fromkeys(fields or DEFAULT_OVERVIEW_FIELDS))
+        unknown = [field for field in fields if field not in OVERVIEW_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(OVERVIEW_FIELDS)}")
+        period_bounds(period, days)
+        return await self.single_flight.do(
+            self._flight_key("overview", auth_id, fields, period, days, category, budget_period),
+            self._get_overview, auth_id, fields, period, days, category, budget_period
+        )
+
+    async def _get_overview(self, auth_id: str, fields: tuple, period: str, days: int,
+                            category: str, budget_period: str):
+        """
+        Plan the data once, then fan out.
+        1. Work out which raw tables the requested sections need that the
+           caches can't already answer: at most one spends scan, covering
+           only the window analytics and the forecast read, and one payments
+           scan, run concurrently with warming the spending aggregate
+        2. Build every section concurrently from those shared rows
+        A failing section is reported under "errors" instead of failing the rest.
+        """
+        wanted = set(fields)
+        wants_bills = bool(wanted & {"agent_status", "pending_bills"})
+        wants_forecast = "forecast" in wanted or ("budget_info" in wanted and self.payment_agent.use_forecast)
+        
+        aggregate = self.supabase_manager.spending_cache.get(auth_id)
+        forecast_stale = wants_forecast and (aggregate is None or not self.forecaster.is_current(auth_id, aggregate))
+        insights_stale = "ai_insights" in wanted and (aggregate is None or not self.analytics.is_current(auth_id, aggregate))
+        
+        loads = {}
+        if aggregate is None and wanted & {"spending", "ai_insights", "budget_info", "forecast"}:
+            loads["aggregate"] = self.supabase_manager.get_spending_aggregate(auth_id)
+        if insights_stale or forecast_stale:
+            today = datetime.now(timezone.utc).date()
+            starts = ([self.analytics.window_start(today)] if insights_stale else []) + \
+                ([self.forecaster.window_start(today)] if forecast_stale else [])
+            loads["spends"] = self.supabase_manager.get_spend_history(auth_id, start=min(starts))
+        if wants_bills or forecast_stale:
+            loads["bills"] = self.payment_agent.get_active_bills(auth_id)
+        loaded = dict(zip(loads, await asyncio.gather(*loads.values())))
+        spends, bills = loaded.get("spends"), loaded.get("bills")
+        
+        tasks = {}
+        if wants_bills:
+            tasks["pending_bills"] = self.payment_agent.get_pending_bills(auth_id, bills)
+        if "spending" in wanted:
+            tasks["spending"] = self.supabase_manager.get_spending_period(
+                auth_id, period, days, category, default_week_budget=2000
+            )
+        if "ai_insights" in wanted:
+            tasks["ai_insights"] = self.analytics.get_insights(auth_id, spends)
+        if wants_forecast:
+            tasks["forecast"] = self.forecaster.get_forecast(auth_id, spends, bills)
+        results = dict(zip(tasks, await asyncio.gather(*tasks.values(), return_exceptions=True)))
+        
+        errors = {}
+        for name, value in list(results.items()):
+            if isinstance(value, Exception):
+                print(f"Overview {name} error: {value}")
+                errors[name] = str(value)
+                results[name] = None
+        
+        overview = {"user": {"name": "User", "auth_id": auth_id}}
+        if "spending" in wanted and results["spending"]:
+            overview["spending"] = spending_summary(results["spending"])
+        if "ai_insights" in wanted:
+            analytics = results["ai_insights"]
+            overview["ai_insights"] = (analytics["insights"] if analytics else None) or [
+                {"type": "tip", "text": "Click 'CHECK MY BUDGET' to analyze your spending!"}
+            ]
+        if "agent_status" in wanted:
+            overview["agent_status"] = await self._get_agent_status(auth_id, results["pending_bills"] or {})
+        if "pending_bills" in wanted:
+            overview["pending_bills"] = results["pending_bills"]
+        if "budget_info" in wanted:
+            overview["budget_info"] = await self.payment_agent.get_available_budget(
+                auth_id, budget_period, forecast=results.get("forecast")
+            )
+        if "forecast" in wanted:
+            overview["forecast"] = results["forecast"]
+        if errors:
+            overview["errors"] = errors
+        return overview
@@ -1,156 +1,258 @@
-from google import genai
-from google.genai import types
+import asyncio
+import json
 import os
 from datetime import datetime, timedelta
+from app.utils.cache import LRUCache
 from app.utils.supabase_client import SupabaseManager
+from app.agents.bill_scheduler import parse_date
+from app.utils.rollups import parse_period
+from app.agents.llm_provider import get_provider
+from app.utils.metrics import timed_tool
+
+# Days until the next charge for recurring bills
+RECURRING_INTERVALS = {"weekly": 7, "monthly": 30, "yearly": 365}
+# Tools that move money; a bill may be claimed by only one of them per run
+PAYING_TOOLS = ("pay_bill", "pay_bills")
+# Result error when another worker or process claimed the bill's cycle first
+SETTLED_ELSEWHERE = "Bill was already settled by another run"
 
 class PaymentAgent:
     def __init__(self, supabase_manager: SupabaseManager):
         self.supabase_manager = supabase_manager
-        self.client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+        self.llm = get_provider("gemini")
         
         self.system_prompt = """You are the **PennyPal Payment Agent**, an intelligent bill payment assistant.
 
 Your responsibilities:
-1. IMMEDIATELY check pending bills using get_pending_bills
-2. Check available budget using get_available_budget
-3. If surplus budget > 40% AND there are bills to pay, pay them using pay_bill
-4. If budget is too low, inform the user they don't have enough surplus
-5. NEVER ask for user information - it's already provided
+1. Pending bills and the available budget are already in the first message
+2. If the budget is safe to pay AND there are bills to pay, pay them in one call using pay_bills
+3. If budget is too low, inform the user they don't have enough surplus
+4. NEVER ask for user information - it's already provided
 
 CRITICAL RULES:
 - DO NOT ask "What is your user ID?" - you already have it
-- IMMEDIATELY call get_pending_bills and get_available_budget
-- Only pay bills if surplus > 40% of total budget
+- Only call get_pending_bills or get_available_budget if you need fresher data than the snapshot
+- When you need several tools, request them all in the same turn
+- Only pay bills if the budget snapshot says safe_to_pay
 - Prioritize: Overdue → Due within 3 days → Regular bills
 - Provide clear, direct responses about what bills were paid or why payment wasn't possible
 - Be concise and actionable in your responses
 """
         
         self.tools = [
-            types.Tool(
-                function_declarations=[
-                    types.FunctionDeclaration(
-                        name="get_pending_bills",
-                        description="Get list of unpaid bills with due dates and amounts",
-                        parameters=types.Schema(
-                            type=types.Type.OBJECT,
-                            properties={
-                                "auth_id": types.Schema(type=types.Type.STRING, description="User ID")
-                            },
-                            required=["auth_id"]
-                        )
-                    ),
-                    types.FunctionDeclaration(
-                        name="pay_bill",
-                        description="Pay a specific bill and update its status",
-                        parameters=types.Schema(
-                            type=types.Type.OBJECT,
-                            properties={
-                                "bill_id": types.Schema(type=types.Type.STRING, description="Bill ID to pay"),
-                                "amount": types.Schema(type=types.Type.NUMBER, description="Amount to pay")
-                            },
-                            required=["bill_id", "amount"]
-                        )
-                    ),
-                    types.FunctionDeclaration(
-                        name="get_available_budget",
-                        description="Get current available budget (budget - spent)",
-                        parameters=types.Schema(
-                            type=types.Type.OBJECT,
-                            properties={
-                                "auth_id": types.Schema(type=types.Type.STRING, description="User ID")
-                            },
-                            required=["auth_id"]
-                        )
-                    )
-                ]
-            )
+            {
+                "name": "get_pending_bills",
+                "description": "Get list of unpaid bills with due dates and amounts",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "auth_id": {"type": "string", "description": "User ID"}
+                    },
+                    "required": ["auth_id"]
+                }
+            },
+            {
+                "name": "pay_bill",
+                "description": "Pay a specific bill and update its status",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "bill_id": {"type": "string", "description": "Bill ID to pay"},
+                        "amount": {"type": "number", "description": "Amount to pay"}
+                    },
+                    "required": ["bill_id", "amount"]
+                }
+            },
+            {
+                "name": "pay_bills",
+                "description": "Pay several bills at once; prefer this over repeated pay_bill calls",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "bill_ids": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "IDs of the bills to pay"
+                        }
+                    },
+                    "required": ["bill_ids"]
+                }
+            },
+            {
+                "name": "get_available_budget",
+                "description": "Get current available budget (budget - spent)",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "auth_id": {"type": "string", "description": "User ID"},
+                        "period": {"type": "string", "description": "all, today, week, month, or last_N_days"}
+                    },
+                    "required": ["auth_id"]
+                }
+            }
         ]
         self.model = "gemini-2.5-flash"
+        
+        # Settled batches by (auth_id, idempotency key), so a retried request can't double-pay
+        self.settlements = LRUCache(
+            max_entries=int(os.getenv("SETTLEMENT_CACHE_SIZE", "10000")),
+            ttl_seconds=float(os.getenv("SETTLEMENT_CACHE_TTL", "86400"))
+        )
+        self._settling = {}
+        # Optional BillScheduler kept in sync with bill reads and settlements
+        self.scheduler = None
+        # Spending window the surplus check is measured over
+        self.budget_period = os.getenv("PAYMENT_BUDGET_PERIOD", "all")
+        # Optional ForecastEngine; when set, safe_to_pay uses the projected period-end surplus
+        self.forecaster = None
+        self.use_forecast = os.getenv("PAYMENT_USE_FORECAST", "true").lower() == "true"
+        self.forecast_margin_pct = float(os.getenv("PAYMENT_FORECAST_MARGIN_PCT", "10"))
+        # Agent loop limits: model turns, and wall-clock seconds for the whole run
+        self.max_steps = int(os.getenv("PAYMENT_AGENT_MAX_STEPS", "6"))
+        self.time_budget = float(os.getenv("PAYMENT_AGENT_TIME_BUDGET", "30"))
 
-    async def process_bills(self, auth_id: str, available_budget: float):
-        """Main method to check and pay bills"""
-        prompt = f"""Check pending bills for user and determine which bills to pay.
-Available budget: ₹{available_budget}
-Only pay bills if it's safe (won't leave budget too low).
-Prioritize by due date and importance."""
+    async def process_bills(self, auth_id: str, available_budget: float, budget_info: dict = None):
+        """
+        Agent loop for checking and paying bills.
+        Pending bills and the budget are prefetched into the first prompt. Every
+        tool call in a turn runs concurrently and all results go back in one
+        turn; the loop ends when the model stops calling tools, after
+        PAYMENT_AGENT_MAX_STEPS turns, or when PAYMENT_AGENT_TIME_BUDGET runs out.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.time_budget
+        claimed = set()
+        paid = []
         
         try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction=self.system_prompt,
-                    tools=self.tools
-                )
+            bills, budget_info = await asyncio.gather(
+                self.get_pending_bills(auth_id),
+                self._budget_snapshot(auth_id, budget_info)
             )
+            prompt = f"""Check pending bills for user and determine which bills to pay.
+Available budget: ₹{available_budget}
+Only pay bills if it's safe (won't leave budget too low).
+Prioritize by due date and importance.
+
+Pending bills: {json.dumps(self._bills_context(bills), default=str)}
+Budget: {json.dumps(self._budget_context(budget_info), default=str)}"""
+            messages = [{"role": "user", "content": prompt}]
             
-            # Handle tool calls
-            if response.candidates and response.candidates[0].content.parts:
-                for part in response.candidates[0].content.parts:
-                    if hasattr(part, 'function_call') and part.function_call:
-                        tool_name = part.function_call.name
-                        tool_args = dict(part.function_call.args)
-                        
-                        # Execute tool
-                        result = await self.execute_tool(tool_name, tool_args, auth_id)
-                        
-                        # Send result back to model for final decision
-                        final_response = self.client.models.generate_content(
-                            model=self.model,
-                            contents=[
-                                types.Content(role="user", parts=[types.Part(text=prompt)]),
-                                types.Content(role="model", parts=[part]),
-                                types.Content(role="user", parts=[types.Part(
-                                    function_response=types.FunctionResponse(
-                                        name=tool_name,
-                                        response={"result": result}
-                                    )
-                                )])
-                            ],
-                            config=types.GenerateContentConfig(system_instruction=self.system_prompt)
-                        )
-                        return final_response.text
+            for step in range(self.max_steps):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                response = await self.llm.generate(
+                    self.model, messages, system=self.system_prompt, tools=self.tools, timeout=remaining
+                )
+                if not response.tool_calls:
+                    return response.text or self._run_summary(paid, "No bills need payment at this time.")
+                
+                # Tool calls are not bounded by the deadline: a payment is never cut off half-written
+                results = await asyncio.gather(*[
+                    self._run_tool(call, auth_id, claimed) for call in response.tool_calls
+                ], return_exceptions=True)
+                messages.append(response.as_message())
+                for call, result in zip(response.tool_calls, results):
+                    if isinstance(result, Exception):
+                        print(f"Payment tool {call.name} failed: {result}")
+                        result = {"error": str(result)}
+                    if call.name in PAYING_TOOLS:
+                        paid.append(result)
+                    messages.append({"role": "tool", "name": call.name, "tool_call_id": call.id, "content": result})
             
-            return response.text if response.text else "No bills need payment at this time."
+            print(f"Payment agent stopped at its step/time budget for {auth_id}")
+            return self._run_summary(paid, "Stopped before the payment agent finished; no bills were paid.")
             
+        except asyncio.TimeoutError:
+            print(f"Payment agent ran out of time for {auth_id}")
+            return self._run_summary(paid, "The payment agent timed out before paying any bills.")
         except Exception as e:
             print(f"Payment Agent Error: {e}")
             import traceback
             traceback.print_exc()
             return f"Error processing bills: {str(e)}"
 
+    async def _budget_snapshot(self, auth_id: str, budget_info: dict = None):
+        return budget_info if budget_info is not None else await self.get_available_budget(auth_id)
+
+    async def _run_tool(self, call, auth_id: str, claimed: set):
+        """Execute one tool call, refusing to pay a bill another call in this run already took"""
+        if call.name in PAYING_TOOLS:
+            requested = [str(bill_id) for bill_id in (call.args.get("bill_ids") or [call.args.get("bill_id")]) if bill_id]
+            fresh = [bill_id for bill_id in dict.fromkeys(requested) if bill_id not in claimed]
+            claimed.update(fresh)
+            if not fresh:
+                return {"success": False, "error": "Bills already paid in this run", "bill_ids": requested}
+            if call.name == "pay_bills":
+                return await self.execute_tool(call.name, {**call.args, "bill_ids": fresh}, auth_id)
+        return await self.execute_tool(call.name, call.args, auth_id)
+
+    @staticmethod
+    def _bills_context(bills: dict):
+        return [
+            {key: bill[key] for key in ("id", "name", "amount", "due_date", "priority", "is_overdue")}
+            for bill in bills.get("bills") or []
+        ]
+
+    @staticmethod
+    def _budget_context(budget_info: dict):
+        context = {key: budget_info.get(key) for key in ("available", "budget", "spent", "percentage_remaining", "safe_to_pay")}
+        forecast = budget_info.get("forecast")
+        if forecast:
+            context["projected_surplus"] = forecast["projected_surplus"]
+            context["exhaustion_date"] = forecast["exhaustion_date"]
+        return context
+
+    @staticmethod
+    def _run_summary(paid: list, default: str):
+        """Plain-text outcome when the model didn't get to write one"""
+        count = sum(result.get("paid_count", 1 if result.get("success") else 0) for result in paid if isinstance(result, dict))
+        total = sum(result.get("total_paid", result.get("amount") if result.get("success") else 0) or 0
+                    for result in paid if isinstance(result, dict))
+        return f"Paid {count} bill(s) totaling ₹{total}." if count else default
+
+    @timed_tool("payment")
     async def execute_tool(self, name, args, auth_id):
         """Execute tools called by the agent"""
         if name == "get_pending_bills":
             return await self.get_pending_bills(auth_id)
         elif name == "pay_bill":
             return await self.pay_bill(args.get("bill_id"), args.get("amount"), auth_id)
+        elif name == "pay_bills":
+            return await self.pay_bills(list(args.get("bill_ids") or []), auth_id)
         elif name == "get_available_budget":
-            return await self.get_available_budget(auth_id)
+            return await self.get_available_budget(auth_id, args.get("period"))
         return {"error": "Unknown tool"}
 
-    async def get_pending_bills(self, auth_id: str):
-        """Fetch pending bills from payments table"""
+    async def get_active_bills(self, auth_id: str):
+        """Raw active rows from the payments table"""
+        # Get ALL active bills (not just autopay-enabled)
+        result = await self.supabase_manager.table("payments")\
+            .select("*")\
+            .eq("auth_id", auth_id)\
+            .eq("status", "active")\
+            .execute()
+        return result.data or []
+
+    async def get_pending_bills(self, auth_id: str, rows=None):
+        """Fetch pending bills from payments table (or prioritise `rows` already fetched)"""
         try:
-            # Get ALL active bills (not just autopay-enabled)
             today = datetime.now().date()
             three_days_later = today + timedelta(days=3)
             
-            result = self.supabase_manager.supabase.table("payments")\
-                .select("*")\
-                .eq("auth_id", auth_id)\
-                .eq("status", "active")\
-                .execute()
+            if rows is None:
+                rows = await self.get_active_bills(auth_id)
             
-            if not result.data:
+            if not rows:
                 return {"bills": [], "message": "No pending bills"}
             
             # Process all active bills
             pending_bills = []
-            for bill in result.data:
-                due_date = datetime.strptime(bill.get("due_date"), "%Y-%m-%d").date() if bill.get("due_date") else None
+            for bill in rows:
+                due_date = parse_date(bill.get("due_date"))
+                if self.scheduler:
+                    self.scheduler.track(bill, auth_id)
                 
                 # Determine priority based on due date
                 is_overdue = due_date < today if due_date else False
@@ -194,38 +296,24 @@ Prioritize by due date and importance."""
         try:
             today = datetime.now().date()
             
-            # Update payment record
-            update_data = {
-                "last_payment_date": str(today),
-                "status": "completed"
-            }
-            
             # If it's a recurring payment, calculate next payment date
-            bill_result = self.supabase_manager.supabase.table("payments")\
-                .select("frequency, due_date")\
+            bill_result = await self.supabase_manager.table("payments")\
+                .select("frequency, due_date, next_payment_date")\
                 .eq("id", bill_id)\
                 .single()\
                 .execute()
             
-            if bill_result.data:
-                frequency = bill_result.data.get("frequency", "").lower()
-                if frequency in ["monthly", "weekly", "yearly"]:
-                    # Calculate next payment date
-                    if frequency == "monthly":
-                        next_date = today + timedelta(days=30)
-                    elif frequency == "weekly":
-                        next_date = today + timedelta(days=7)
-                    elif frequency == "yearly":
-                        next_date = today + timedelta(days=365)
-                    
-                    update_data["next_payment_date"] = str(next_date)
-                    update_data["status"] = "active"  # Keep active for recurring
+            update_data = self._settlement_update(
+                bill_result.data.get("frequency") if bill_result.data else None, today
+            )
             
-            # Update the payment record
-            result = self.supabase_manager.supabase.table("payments")\
-                .update(update_data)\
-                .eq("id", bill_id)\
-                .execute()
+            # Update the payment record, only if no other run paid this cycle first
+            result = await self._claim(update_data, [bill_id], (bill_result.data or {}).get("next_payment_date"))
+            if not result.data:
+                return {"success": False, "bill_id": bill_id, "error": SETTLED_ELSEWHERE, "settled_elsewhere": True}
+            self.supabase_manager.state_versions.bump(auth_id)
+            if self.scheduler:
+                self.scheduler.reschedule(bill_id, auth_id, update_data)
             
             # Record the payment in spends table
             spend_record = {
@@ -235,7 +323,11 @@ Prioritize by due date and importance."""
                 "description": f"Auto-paid bill #{bill_id}"
             }
             
-            self.supabase_manager.supabase.table("spends").insert(spend_record).execute()
+            await self.supabase_manager.insert_spend(spend_record)
+            await self.supabase_manager.log_autonomous_decision(
+                auth_id, "bill_settlement", {"bill_ids": [bill_id]},
+                {"paid": [bill_id], "total_paid": amount}, 1.0
+            )
             
             return {
                 "success": True,
@@ -251,34 +343,203 @@ Prioritize by due date and importance."""
             traceback.print_exc()
             return {"success": False, "error": str(e)}
 
-    async def get_available_budget(self, auth_id: str):
-        """Calculate available budget"""
+    def _claim(self, update_data, bill_ids, next_payment_date):
+        """Conditional settlement update: only rows still active and still on the
+        cycle that was read match, so of several workers or processes settling
+        the same bill exactly one gets it back in the response"""
+        query = self.supabase_manager.table("payments")\
+            .update(update_data)\
+            .in_("id", bill_ids)\
+            .eq("status", "active")
+        if next_payment_date:
+            query = query.eq("next_payment_date", next_payment_date)
+        else:
+            query = query.is_("next_payment_date", "null")
+        return query.execute()
+
+    def _settlement_update(self, frequency, today):
+        """Fields to write on a paid bill: recurring bills roll forward and stay active"""
+        update_data = {
+            "last_payment_date": str(today),
+            "status": "completed"
+        }
+        interval = RECURRING_INTERVALS.get((frequency or "").lower())
+        if interval:
+            update_data["next_payment_date"] = str(today + timedelta(days=interval))
+            update_data["status"] = "active"  # Keep active for recurring
+        return update_data
+
+    async def pay_bills(self, bill_ids, auth_id: str, idempotency_key: str = None):
+        """Settle several bills with bulk writes.
+
+        Retrying with the same idempotency key returns the original result
+        (or joins the settlement still in flight) instead of paying again.
+        That replay is per process; across processes the conditional update
+        in _claim is what keeps a bill from being paid twice.
+        """
+        if not idempotency_key:
+            return await self._settle_bills(bill_ids, auth_id)
+        
+        key = (auth_id, idempotency_key)
+        cached = self.settlements.get(key)
+        if cached is not None:
+            return {**cached, "replayed": True}
+        if key in self._settling:
+            return {**(await self._settling[key]), "replayed": True}
+        
+        future = asyncio.get_running_loop().create_future()
+        self._settling[key] = future
         try:
-            # Get spending data
-            result = self.supabase_manager.supabase.table("spends")\
-                .select("spent_amt, week_budget")\
-                .eq("auth_id", auth_id)\
-                .execute()
+            result = await self._settle_bills(bill_ids, auth_id)
+            result["idempotency_key"] = idempotency_key
+            self.settlements.set(key, result)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be awaiting; mark the exception as retrieved
+            future.exception()
+            raise
+        finally:
+            del self._settling[key]
+
+    async def _settle_bills(self, bill_ids, auth_id: str):
+        today = datetime.now().date()
+        bill_ids = [str(bill_id) for bill_id in dict.fromkeys(bill_ids)]
+        results = {bill_id: {"bill_id": bill_id, "success": False, "error": "Bill not found"} for bill_id in bill_ids}
+        if not bill_ids:
+            return {"success": True, "results": [], "paid_count": 0, "total_paid": 0}
+        
+        # One query for every bill's metadata
+        bills_result = await self.supabase_manager.table("payments")\
+            .select("id, payment_name, amount, frequency, status, next_payment_date")\
+            .eq("auth_id", auth_id)\
+            .in_("id", bill_ids)\
+            .execute()
+        
+        # Bills sharing the same update payload and current cycle are claimed together
+        groups = {}
+        bills = {}
+        for bill in bills_result.data or []:
+            bill_id = str(bill["id"])
+            if bill.get("status") != "active":
+                results[bill_id]["error"] = f"Bill is {bill.get('status')}"
+                continue
+            bills[bill_id] = bill
+            update_data = self._settlement_update(bill.get("frequency"), today)
+            key = (json.dumps(update_data, sort_keys=True), bill.get("next_payment_date"))
+            groups.setdefault(key, (update_data, bill.get("next_payment_date"), []))[2].append(bill_id)
+        
+        # At most one conditional update per group, issued concurrently
+        group_list = list(groups.values())
+        outcomes = await asyncio.gather(*[
+            self._claim(update_data, group_ids, next_payment_date)
+            for update_data, next_payment_date, group_ids in group_list
+        ], return_exceptions=True)
+        
+        paid = []
+        for (update_data, _, group_ids), outcome in zip(group_list, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"Error settling bills {group_ids}: {outcome}")
+                for bill_id in group_ids:
+                    results[bill_id]["error"] = str(outcome)
+                continue
+            claimed = {str(row["id"]) for row in outcome.data or []}
+            for bill_id in group_ids:
+                if bill_id not in claimed:
+                    results[bill_id].update(error=SETTLED_ELSEWHERE, settled_elsewhere=True)
+            group_paid = [bill_id for bill_id in group_ids if bill_id in claimed]
+            if group_paid:
+                paid.extend(group_paid)
+                self.supabase_manager.state_versions.bump(auth_id)
+                if self.scheduler:
+                    for bill_id in group_paid:
+                        self.scheduler.reschedule(bill_id, auth_id, update_data)
+        
+        # Record every payment in the spends table with a single insert
+        spend_records = [{
+            "auth_id": auth_id,
+            "category": "Bill Payment",
+            "spent_amt": float(bills[bill_id]["amount"] or 0),
+            "description": f"Auto-paid bill #{bill_id}"
+        } for bill_id in paid]
+        spend_error = None
+        if spend_records:
+            try:
+                await self.supabase_manager.insert_spend(spend_records)
+            except Exception as e:
+                print(f"Error recording bill payments: {e}")
+                spend_error = str(e)
+        
+        await self.supabase_manager.log_autonomous_decision(
+            auth_id, "bill_settlement", {"bill_ids": bill_ids},
+            {"paid": paid, "total_paid": sum(record["spent_amt"] for record in spend_records), "spend_error": spend_error},
+            1.0
+        )
+        
+        for bill_id, record in zip(paid, spend_records):
+            results[bill_id] = {
+                "bill_id": bill_id,
+                "success": True,
+                "name": bills[bill_id].get("payment_name"),
+                "amount": record["spent_amt"],
+                "paid_date": str(today),
+                "spend_recorded": spend_error is None
+            }
+            if spend_error:
+                results[bill_id]["error"] = f"Paid, but spend not recorded: {spend_error}"
+        
+        return {
+            "success": len(paid) == len(bill_ids) and spend_error is None,
+            "results": [results[bill_id] for bill_id in bill_ids],
+            "paid_count": len(paid),
+            "total_paid": sum(record["spent_amt"] for record in spend_records)
+        }
+
+    async def get_available_budget(self, auth_id: str, period: str = None, forecast=None):
+        """Calculate available budget over a spending period (default PAYMENT_BUDGET_PERIOD).
+        `forecast` is used as-is when the caller has already computed it."""
+        try:
+            period, days = parse_period(period or self.budget_period)
+            # Windowed totals from the cached daily rollups
+            spending = await self.supabase_manager.get_spending_period(
+                auth_id, period, days, default_week_budget=2000
+            )
             
-            total_spent = 0
+            total_spent = spending["total_spent"]
             budget_limit = 0
             
-            if result.data:
-                total_spent = sum(row.get("spent_amt", 0) for row in result.data)
-                budgets = [row.get("week_budget", 0) for row in result.data if row.get("week_budget", 0) > 0]
-                budget_limit = budgets[-1] if budgets else 2000
+            if spending["row_count"]:
+                budget_limit = spending["period_budget"]
             
             available = budget_limit - total_spent
             percentage_remaining = (available / budget_limit * 100) if budget_limit > 0 else 0
             
-            return {
+            budget_info = {
                 "available": available,
                 "budget": budget_limit,
                 "spent": total_spent,
                 "percentage_remaining": round(percentage_remaining, 1),
-                "safe_to_pay": percentage_remaining > 40
+                "safe_to_pay": percentage_remaining > 40,
+                "period": period,
+                "decision": "threshold"
             }
             
+            if self.forecaster and self.use_forecast:
+                try:
+                    # Pending bills are already folded into the projection, so the
+                    # surplus is what's left after paying them and spending at pace.
+                    # Payments bump the state version; bills added straight into
+                    # Supabase are caught by the engine's periodic bill recheck
+                    forecast = forecast or await self.forecaster.get_forecast(auth_id, recheck_bills=True)
+                    budget_info["forecast"] = forecast
+                    budget_info["safe_to_pay"] = forecast["projected_surplus"] >= forecast["budget"] * self.forecast_margin_pct / 100
+                    budget_info["decision"] = "forecast"
+                except Exception as e:
+                    print(f"Forecast unavailable, using threshold: {e}")
+            
+            return budget_info
+            
         except Exception as e:
             print(f"Error getting budget: {e}")
             return {"available": 0, "safe_to_pay": False, "error": str(e)}
@@ -0,0 +1,262 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+import numpy as np
+from app.utils.cache import LRUCache
+
+def _money(value) -> float:
+    return round(float(value), 2)
+
+def _delta(current: float, previous: float) -> Dict[str, Any]:
+    change = (current - previous) / previous * 100 if previous else None
+    return {
+        "current": _money(current),
+        "previous": _money(previous),
+        "change_pct": round(float(change), 1) if change is not None else None
+    }
+
+def to_columns(rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Columnar arrays over spend rows: amount, day (datetime64[D]) and category codes.
+
+    This is the only pass over individual rows; everything in `analyze` works
+    on whole arrays.
+    """
+    amounts = np.array([row.get("spent_amt") or 0 for row in rows], dtype=np.float64)
+    # Date part of the ISO timestamps, parsed by NumPy in one call
+    days = np.array([(row.get("created_at") or "")[:10] for row in rows], dtype="datetime64[D]")
+    names: Dict[str, int] = {}
+    codes = np.fromiter(
+        (names.setdefault(row.get("category") or "Other", len(names)) for row in rows),
+        dtype=np.int64, count=len(rows)
+    )
+    return {"amount": amounts, "day": days, "code": codes, "categories": np.array(list(names), dtype=str)}
+
+def analyze(columns: Dict[str, np.ndarray], week_budget: Optional[float], today: np.datetime64,
+            z_threshold: float = 3.0, min_samples: int = 5, series_days: int = 30) -> Dict[str, Any]:
+    """Vectorized spending analytics for one user.
+
+    Week- and month-over-month compare the last 7/30 days with the 7/30 days
+    before them; anomalies are transactions more than `z_threshold` standard
+    deviations above their category's mean.
+    """
+    amounts, days, codes, names = columns["amount"], columns["day"], columns["code"], columns["categories"]
+    if amounts.size == 0:
+        return {"transactions": 0, "total_spent": 0, "categories": [], "week_over_week": None,
+                "month_over_month": None, "rolling_average": None, "burn_rate": None, "anomalies": []}
+
+    # Category shares
+    category_totals = np.bincount(codes, weights=amounts, minlength=len(names))
+    total = category_totals.sum()
+    order = np.argsort(category_totals)[::-1]
+    categories = [
+        {"category": str(names[i]), "total": _money(category_totals[i]),
+         "share_pct": round(float(category_totals[i] / total * 100), 1) if total else 0.0}
+        for i in order if category_totals[i] > 0
+    ]
+
+    # Period-over-period deltas, overall and per category
+    age = (today - days).astype(np.int64)
+    def window_totals(start: int, length: int) -> np.ndarray:
+        mask = (age >= start) & (age < start + length)
+        return np.bincount(codes[mask], weights=amounts[mask], minlength=len(names))
+
+    def period_delta(length: int) -> Dict[str, Any]:
+        current, previous = window_totals(0, length), window_totals(length, length)
+        delta = _delta(current.sum(), previous.sum())
+        change = current - previous
+        movers = np.argsort(np.abs(change))[::-1][:3]
+        delta["top_movers"] = [
+            {"category": str(names[i]), **_delta(current[i], previous[i])}
+            for i in movers if change[i] != 0
+        ]
+        return delta
+
+    # Daily totals from the first spend through today, then trailing means via cumulative sums
+    first = days.min()
+    span = max(int((today - first).astype(np.int64)) + 1, 1)
+    index = (days - first).astype(np.int64)
+    in_range = (index >= 0) & (index < span)
+    daily = np.bincount(index[in_range], weights=amounts[in_range], minlength=span)
+    cumulative = np.concatenate(([0.0], np.cumsum(daily)))
+    def trailing_mean(width: int) -> np.ndarray:
+        width = min(width, span)
+        return (cumulative[width:] - cumulative[:-width]) / width
+
+    rolling_7 = trailing_mean(7)
+    series = rolling_7[-series_days:]
+
+    # Burn rate for the current Monday-Sunday week (1970-01-01 was a Thursday)
+    weekday = int((today.astype(np.int64) + 3) % 7)
+    spent_week = float(amounts[(age >= 0) & (age <= weekday)].sum())
+    daily_rate = spent_week / (weekday + 1)
+    burn_rate = {
+        "spent_this_week": _money(spent_week),
+        "daily_rate": _money(daily_rate),
+        "projected_week": _money(daily_rate * 7),
+        "week_budget": week_budget
+    }
+    if week_budget:
+        remaining = week_budget - spent_week
+        burn_rate.update({
+            "used_pct": round(spent_week / week_budget * 100, 1),
+            "projected_pct": round(daily_rate * 7 / week_budget * 100, 1),
+            "days_until_exhausted": round(remaining / daily_rate, 1) if daily_rate > 0 and remaining > 0 else None,
+            "on_track": daily_rate * 7 <= week_budget
+        })
+
+    # Per-category z-scores from bincount moments
+    counts = np.bincount(codes, minlength=len(names))
+    means = category_totals / np.maximum(counts, 1)
+    variances = np.bincount(codes, weights=amounts ** 2, minlength=len(names)) / np.maximum(counts, 1) - means ** 2
+    stds = np.sqrt(np.maximum(variances, 0))
+    row_std = stds[codes]
+    eligible = (counts[codes] >= min_samples) & (row_std > 0)
+    z = np.zeros_like(amounts)
+    np.divide(amounts - means[codes], row_std, out=z, where=eligible)
+    flagged = np.flatnonzero(z > z_threshold)
+    flagged = flagged[np.argsort(days[flagged])[::-1]]
+
+    return {
+        "transactions": int(amounts.size),
+        "total_spent": _money(total),
+        "categories": categories,
+        "week_over_week": period_delta(7),
+        "month_over_month": period_delta(30),
+        "rolling_average": {
+            "daily_7d": _money(rolling_7[-1]),
+            "daily_30d": _money(trailing_mean(30)[-1]),
+            "series_7d": {
+                "start": str(today - np.timedelta64(len(series) - 1, "D")),
+                "values": [_money(v) for v in series]
+            }
+        },
+        "burn_rate": burn_rate,
+        "anomalies": [
+            {"index": int(i), "category": str(names[codes[i]]), "amount": _money(amounts[i]),
+             "date": str(days[i]), "z_score": round(float(z[i]), 2),
+             "category_mean": _money(means[codes[i]])}
+            for i in flagged
+        ]
+    }
+
+def describe(analytics: Dict[str, Any], currency: str = "₹") -> List[Dict[str, str]]:
+    """Short dashboard insights derived from the numbers"""
+    insights = []
+    if analytics["categories"]:
+        top = analytics["categories"][0]
+        insights.append({"type": "info", "text": f"{top['category']} is {top['share_pct']}% of your spending."})
+
+    week = analytics["week_over_week"]
+    if week and week["change_pct"] is not None and abs(week["change_pct"]) >= 10:
+        direction = "up" if week["change_pct"] > 0 else "down"
+        insights.append({
+            "type": "warning" if direction == "up" else "tip",
+            "text": f"Spending is {direction} {abs(week['change_pct'])}% versus the previous 7 days."
+        })
+        for mover in week["top_movers"][:1]:
+            if mover["change_pct"] is not None and mover["change_pct"] > 0:
+                insights.append({"type": "info", "text": f"{mover['category']} rose {mover['change_pct']}% over the last 7 days."})
+
+    burn = analytics["burn_rate"]
+    if burn and burn.get("week_budget"):
+        if burn["on_track"]:
+            insights.append({"type": "tip", "text": f"On pace for {currency}{burn['projected_week']} this week, within your {currency}{burn['week_budget']} budget."})
+        else:
+            insights.append({"type": "warning", "text": f"At {currency}{burn['daily_rate']}/day you'll spend {currency}{burn['projected_week']} this week, over your {currency}{burn['week_budget']} budget."})
+
+    for anomaly in analytics["anomalies"][:2]:
+        insights.append({
+            "type": "warning",
+            "text": f"Unusual {anomaly['category']} expense of {currency}{anomaly['amount']} on {anomaly['date']} (typically {currency}{anomaly['category_mean']})."
+        })
+    return insights
+
+class SpendingAnalytics:
+    """Per-user spending analytics over columnar NumPy arrays.
+
+    Only the last ANALYTICS_LOOKBACK_DAYS (at least the 60 days the
+    month-over-month delta compares) are loaded, so a recompute costs the
+    same however long the ledger grows; shares and anomalies cover that
+    window. Results are cached against the user's spending aggregate (row
+    count, total and budget) and the current date, so a new spend or a new
+    day recomputes.
+    """
+
+    def __init__(self, supabase_manager):
+        self.supabase_manager = supabase_manager
+        self._cache = LRUCache(
+            max_entries=int(os.getenv("ANALYTICS_CACHE_MAX_USERS", "5000")),
+            ttl_seconds=float(os.getenv("ANALYTICS_CACHE_TTL", "900"))
+        )
+        self.z_threshold = float(os.getenv("ANALYTICS_Z_THRESHOLD", "3"))
+        self.min_samples = int(os.getenv("ANALYTICS_MIN_SAMPLES", "5"))
+        self.max_anomalies = int(os.getenv("ANALYTICS_MAX_ANOMALIES", "10"))
+        self.lookback_days = max(int(os.getenv("ANALYTICS_LOOKBACK_DAYS", "90")), 60)
+
+    def window_start(self, today=None):
+        """First day (UTC) of the lookback window"""
+        today = today or datetime.now(timezone.utc).date()
+        return today - timedelta(days=self.lookback_days - 1)
+
+    @staticmethod
+    def _version(aggregate: Dict[str, Any]):
+        today = datetime.now(timezone.utc).date()
+        return (aggregate["row_count"], aggregate["total_spent"], aggregate["week_budget"], today)
+
+    def is_current(self, auth_id: str, aggregate: Dict[str, Any]) -> bool:
+        """Whether a cached result exists for this aggregate (no query, no LRU touch)"""
+        entry = self._cache.peek(auth_id)
+        return entry is not None and entry[0] == self._version(aggregate)
+
+    async def get_insights(self, auth_id: str, rows: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Cached analytics; `rows` (the user's spends from at least
+        window_start(), oldest first) skips the spends query"""
+        aggregate = await self.supabase_manager.get_spending_aggregate(auth_id)
+        version = self._version(aggregate)
+        today = version[-1]
+        entry = self._cache.get(auth_id)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        since = self.window_start(today)
+        if rows is None:
+            rows = []
+            async for page in self.supabase_manager.iter_spend_pages(
+                auth_id, start=since, desc=False, columns="id, spent_amt, category, description, created_at"
+            ):
+                rows.extend(page)
+        rows = [
+            row for row in rows
+            if (row.get("spent_amt") or 0) > 0 and (row.get("created_at") or "")[:10] >= since.isoformat()
+        ]
+
+        # NumPy work stays off the event loop
+        analytics = await asyncio.to_thread(self._analyze, rows, aggregate["week_budget"], today)
+        analytics["since"] = since.isoformat()
+        analytics["as_of"] = today.isoformat()
+
+        self._cache.set(auth_id, (version, analytics))
+        return analytics
+
+    def _analyze(self, rows: List[Dict[str, Any]], week_budget: Optional[float], today) -> Dict[str, Any]:
+        analytics = analyze(
+            to_columns(rows), week_budget, np.datetime64(today, "D"),
+            z_threshold=self.z_threshold, min_samples=self.min_samples
+        )
+        analytics["anomalies"] = [
+            self._attach_row(anomaly, rows) for anomaly in analytics["anomalies"][:self.max_anomalies]
+        ]
+        analytics["insights"] = describe(analytics)
+        return analytics
+
+    @staticmethod
+    def _attach_row(anomaly: Dict[str, Any], rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        row = rows[anomaly.pop("index")]
+        return {"id": row.get("id"), "description": row.get("description"), **anomaly}
+
+    def invalidate(self, auth_id: str):
+        self._cache.pop(auth_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
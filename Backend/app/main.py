@@ -1,11 +1,20 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+import asyncio
+import json
 import os
+import time
+from datetime import date
 from dotenv import load_dotenv
 
 load_dotenv()
-from app.agents.orchestrator import DecisionOrchestrator
+from app.agents.orchestrator import DecisionOrchestrator, spending_summary
 from app.utils.supabase_client import SupabaseManager
+from app.utils.ingest import detect_format, ingest_expenses
+from app.utils.pagination import decode_cursor
+from app.agents.llm_provider import close_providers
+from app.utils import metrics
 
 app = FastAPI(title="PennyPal Budget Agent API", version="1.0.0")
 
@@ -16,82 +25,323 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag"],
 )
 
 # Initialize global components
 supabase_manager = SupabaseManager()
 decision_orchestrator = DecisionOrchestrator(supabase_manager)
 
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+HISTORY_MAX_PAGE = int(os.getenv("HISTORY_MAX_PAGE", "200"))
+# Requests slower than this log every span with its attributes (0 disables)
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "2"))
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """Time every request and, when enabled, report per-kind spans in a Server-Timing header.
+    Slow requests log their spans in full (table, filters, model, tokens...)."""
+    spans = metrics.start_trace()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    
+    route = request.scope.get("route")
+    metrics.HTTP_SECONDS.observe(
+        elapsed,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code
+    )
+    if SERVER_TIMING_ENABLED or request.headers.get("X-Server-Timing") == "1":
+        response.headers["Server-Timing"] = metrics.server_timing(spans, elapsed)
+    if SLOW_REQUEST_SECONDS > 0 and elapsed >= SLOW_REQUEST_SECONDS:
+        print(f"Slow request {request.method} {request.url.path} took {elapsed * 1000:.0f}ms "
+              f"({len(spans)} spans):\n{metrics.describe_spans(spans)}")
+    return response
+
+def _collect_runtime_gauges():
+    """Cache, coalescing and queue gauges sampled at scrape time"""
+    for key, value in supabase_manager.spending_cache.stats().items():
+        yield "pennypal_spending_cache", "Spending aggregate cache stats", {"stat": key}, value
+    if decision_orchestrator.budget_agent:
+        for key, value in decision_orchestrator.budget_agent.narrative_cache.stats().items():
+            yield "pennypal_narrative_cache", "Budget narrative cache stats", {"stat": key}, value
+    for key, value in decision_orchestrator.analytics.stats().items():
+        yield "pennypal_analytics_cache", "Spending analytics cache stats", {"stat": key}, value
+    for key, value in supabase_manager.learning_cache.stats().items():
+        yield "pennypal_learning_cache", "Agent learning pattern cache stats", {"stat": key}, value
+    for key, value in supabase_manager.learning_writer.stats().items():
+        yield "pennypal_learning_writer", "Buffered agent learning writes", {"stat": key}, value
+    for key, value in supabase_manager.decision_writer.stats().items():
+        yield "pennypal_decision_log", "Write-behind decision log", {"stat": key}, value
+    for key, value in decision_orchestrator.single_flight.stats().items():
+        yield "pennypal_single_flight", "Coalesced agent call stats", {"stat": key}, value
+    if decision_orchestrator.alert_dispatcher:
+        yield "pennypal_alert_queue_depth", "Budget evaluations waiting for a worker", {}, decision_orchestrator.alert_dispatcher.queue.qsize()
+    if decision_orchestrator.bill_scheduler:
+        yield "pennypal_scheduled_bills", "Autopay bills in the due-date index", {}, decision_orchestrator.bill_scheduler.stats()["scheduled"]
+
+metrics.registry.register_collector(_collect_runtime_gauges)
+
+def _not_modified(request: Request, response: Response, auth_id: str):
+    """Tag a per-user read with the user's state version.
+
+    Returns a 304 when the client's If-None-Match is still current, so the
+    handler can answer before touching caches or Supabase. The tag is taken
+    before the read: a write racing the read only makes the tag stale early.
+    Nothing is tagged when versions are disabled (several workers).
+    """
+    versions = supabase_manager.state_versions
+    if not versions.enabled:
+        return None
+    etag = versions.etag(auth_id, f"{request.url.path}?{request.url.query}")
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if versions.matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+def _drop_etag(response: Response):
+    """Fallback payloads must not be cached against the current version"""
+    for header in ("ETag", "Cache-Control"):
+        if header in response.headers:
+            del response.headers[header]
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize AI agents on startup"""
     await decision_orchestrator.initialize_agents()
     print("✅ All agents initialized successfully")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers, flush buffered writes and release the Supabase query pool and LLM connections"""
+    await decision_orchestrator.shutdown()
+    await supabase_manager.flush_writers()
+    await close_providers()
+    supabase_manager.close()
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 # API Endpoints for React Frontend
 
+@app.get("/api/monitor/status")
+async def get_monitor_status():
+    """Background engine stats: budget sweeps and the autopay scheduler"""
+    monitor = decision_orchestrator.budget_monitor
+    scheduler = decision_orchestrator.bill_scheduler
+    return {
+        "budget_monitor": monitor.stats() if monitor else "disabled",
+        "bill_scheduler": scheduler.stats() if scheduler else "disabled",
+        "forecast_engine": decision_orchestrator.forecaster.stats(),
+        "state_versions": supabase_manager.state_versions.stats()
+    }
+
 @app.get("/api/user/{auth_id}/dashboard")
-async def get_user_dashboard(auth_id: str):
-    """Get user dashboard data with real spending and budget"""
+async def get_user_dashboard(auth_id: str, request: Request, response: Response, period: str = "all",
+                             days: int = None, category: str = None):
+    """Get user dashboard data with real spending and budget.
+
+    `period` is all, today, week, month or days (with `days=N`); the budget
+    is the weekly budget scaled to that window.
+    """
+    not_modified = _not_modified(request, response, auth_id)
+    if not_modified:
+        return not_modified
+    # Windowed totals from the cached daily x category rollups
+    spending, insights = await asyncio.gather(
+        supabase_manager.get_spending_period(auth_id, period, days, category, default_week_budget=2000),
+        decision_orchestrator.generate_dashboard_insights(auth_id),
+        return_exceptions=True
+    )
+    if isinstance(spending, ValueError):
+        raise HTTPException(status_code=400, detail=str(spending))
+    if isinstance(spending, Exception):
+        print(f"Dashboard error: {spending}")
+        _drop_etag(response)
+        return {"user": {"name": "User"}, "spending": {"total": 0, "budget": 0}, "ai_insights": []}
+    if isinstance(insights, Exception):
+        # Analytics are optional here; keep the real spending block
+        print(f"Dashboard insights error: {insights}")
+        _drop_etag(response)
+        insights = None
+    
+    return {
+        "user": {"name": "User", "auth_id": auth_id},
+        "spending": spending_summary(spending),
+        "ai_insights": insights or [
+            {"type": "tip", "text": "Click 'CHECK MY BUDGET' to analyze your spending!"}
+        ]
+    }
+
+@app.get("/api/user/{auth_id}/overview")
+async def get_user_overview(auth_id: str, request: Request, response: Response, fields: str = None,
+                            period: str = "all", days: int = None, category: str = None,
+                            budget_period: str = None):
+    """Dashboard, agent status, budget info and pending bills in one round trip.
+
+    `fields` is a comma-separated subset of spending, ai_insights,
+    agent_status, budget_info, pending_bills and forecast (default: all but
+    forecast). `period`/`days`/`category` shape the spending block and
+    `budget_period` the budget info, as on the individual endpoints.
+    """
+    not_modified = _not_modified(request, response, auth_id)
+    if not_modified:
+        return not_modified
     try:
-        # Fetch spending data from 'spends' table
-        result = supabase_manager.supabase.table("spends")\
-            .select("spent_amt, week_budget")\
-            .eq("auth_id", auth_id)\
-            .execute()
-            
-        total_spent = 0
-        budget_limit = 0
-        
-        if result.data:
-            # Calculate total spent
-            total_spent = sum(row.get("spent_amt", 0) for row in result.data)
-            
-            # Find the latest budget set
-            budgets = [row.get("week_budget", 0) for row in result.data if row.get("week_budget", 0) > 0]
-            if budgets:
-                budget_limit = budgets[-1]
-            else:
-                budget_limit = 2000
-        
-        return {
-            "user": {"name": "User", "auth_id": auth_id},
-            "spending": {
-                "total": total_spent, 
-                "budget": budget_limit,
-                "percentage": round((total_spent / budget_limit * 100) if budget_limit > 0 else 0, 1)
-            },
-            "ai_insights": [
-                {"type": "tip", "text": "Click 'CHECK MY BUDGET' to analyze your spending!"}
-            ]
-        }
+        selected = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+        overview = await decision_orchestrator.get_overview(auth_id, selected, period, days, category, budget_period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Dashboard error: {e}")
-        return {"user": {"name": "User"}, "spending": {"total": 0, "budget": 0}, "ai_insights": []}
+        print(f"Overview error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if overview.get("errors") or (overview.get("pending_bills") or {}).get("error"):
+        # Partial result; the next request should retry the failed sections
+        _drop_etag(response)
+    return {"status": "success", **overview}
+
+@app.get("/api/user/{auth_id}/insights")
+async def get_spending_insights(auth_id: str, request: Request, response: Response):
+    """Category shares, period deltas, rolling averages, burn rate and anomalous spends"""
+    not_modified = _not_modified(request, response, auth_id)
+    if not_modified:
+        return not_modified
+    try:
+        return await decision_orchestrator.get_spending_insights(auth_id)
+    except Exception as e:
+        print(f"Insights error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/user/{auth_id}/forecast")
+async def get_budget_forecast(auth_id: str, request: Request, response: Response):
+    """Projected period-end spend, scheduled bills, surplus and expected exhaustion date"""
+    not_modified = _not_modified(request, response, auth_id)
+    if not_modified:
+        return not_modified
+    try:
+        return await decision_orchestrator.get_forecast(auth_id)
+    except Exception as e:
+        print(f"Forecast error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/user/{auth_id}/expense")
 async def add_expense_via_api(auth_id: str, expense_data: dict):
-    """Add expense through React UI - saves to 'spends' table"""
+    """Add expense through React UI - saves to 'spends' table.
+
+    Accepts either fields (amount, category, payment_name) or a message
+    such as {"text": "Log ₹250 food yesterday"} parsed by the NLP agent.
+    """
     try:
-        spend_record = {
-            "auth_id": auth_id,
-            "category": expense_data.get("category", "Other"),
-            "spent_amt": expense_data.get("amount", 0),
-            "description": expense_data.get("payment_name", ""),
-        }
+        expense_data = await decision_orchestrator.nlp_agent.process_expense_data(expense_data, auth_id)
+        if expense_data.get("text") and not expense_data.get("amount"):
+            raise HTTPException(status_code=422, detail={"error": "Could not find an amount", "parsed": expense_data.get("parsed")})
         
-        result = supabase_manager.supabase.table("spends").insert(spend_record).execute()
-        alerts = await decision_orchestrator.budget_agent.check_budget_status(auth_id)
+        result = await decision_orchestrator.record_expense(auth_id, expense_data)
         
         return {
             "success": True,
             "expense": result.data[0] if result.data else {},
-            "alerts": alerts
+            "parsed": expense_data.get("parsed"),
+            "alert_stream": f"/api/user/{auth_id}/alerts/stream"
         }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Expense error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/user/{auth_id}/chat")
+async def chat_with_agents(auth_id: str, chat_data: dict):
+    """Natural-language chat: log expenses, check budget, bills, forecast and insights"""
+    message = (chat_data.get("message") or "").strip()
+    if not message:
+        raise HTTPException(status_code=400, detail="message is required")
+    try:
+        return await decision_orchestrator.process_message(auth_id, message)
+    except Exception as e:
+        print(f"Chat error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/user/{auth_id}/expenses")
+async def get_expense_history(auth_id: str, request: Request, response: Response, limit: int = 50,
+                              cursor: str = None, start: str = None, end: str = None, category: str = None,
+                              order: str = "desc", format: str = "json"):
+    """Spending history, newest first by default, paginated by cursor.
+
+    Pass `next_cursor` back as `cursor` for the following page. `start`/`end`
+    (YYYY-MM-DD, inclusive) and `category` filter in the query. With
+    `format=ndjson` every matching row from `cursor` on is streamed, one JSON
+    object per line, fetching a page at a time.
+    """
+    try:
+        filters = {
+            "start": date.fromisoformat(start) if start else None,
+            "end": date.fromisoformat(end) if end else None,
+            "category": category,
+            "desc": order.lower() != "asc"
+        }
+        if cursor:
+            decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if order.lower() not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail=f"Unsupported order: {order}")
+    
+    if format == "ndjson":
+        async def rows_as_ndjson():
+            try:
+                async for rows in supabase_manager.iter_spend_pages(auth_id, cursor=cursor, **filters):
+                    yield "".join(json.dumps(row, default=str) + "\n" for row in rows)
+            except Exception as e:
+                # Headers are already sent; report the failure in-band
+                print(f"History export error: {e}")
+                yield json.dumps({"error": str(e)}) + "\n"
+        
+        return StreamingResponse(rows_as_ndjson(), media_type="application/x-ndjson")
+    if format != "json":
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    
+    not_modified = _not_modified(request, response, auth_id)
+    if not_modified:
+        return not_modified
+    try:
+        page = await supabase_manager.get_spend_page(
+            auth_id, max(1, min(limit, HISTORY_MAX_PAGE)), cursor, **filters
+        )
+    except Exception as e:
+        print(f"History error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "status": "success",
+        "expenses": page["rows"],
+        "next_cursor": page["next_cursor"],
+        "has_more": page["next_cursor"] is not None
+    }
+
+@app.post("/api/user/{auth_id}/expenses/bulk")
+async def bulk_import_expenses(auth_id: str, request: Request, format: str = None):
+    """Import many expenses from a JSON array, NDJSON or CSV body (streamed)"""
+    fmt = format or detect_format(request.headers.get("content-type"))
+    if fmt not in ("json", "ndjson", "csv"):
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    try:
+        report = await ingest_expenses(supabase_manager, auth_id, request.stream(), fmt)
+        # One budget evaluation for the whole import
+        if report["inserted"]:
+            decision_orchestrator.alert_dispatcher.enqueue(auth_id)
+        
+        return {"success": report["failed"] == 0, **report}
+    except Exception as e:
+        print(f"Bulk import error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/user/{auth_id}/budget")
 async def set_user_budget(auth_id: str, budget_data: dict):
     """Set weekly budget in spends table"""
@@ -104,26 +354,30 @@ async def set_user_budget(auth_id: str, budget_data: dict):
             "spent_amt": 0
         }
         
-        result = supabase_manager.supabase.table("spends").insert(record).execute()
+        result = await supabase_manager.insert_spend(record)
         return {"success": True, "data": result.data}
     except Exception as e:
         print(f"Budget set error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/user/{auth_id}/ai-status")
-async def get_ai_agent_status(auth_id: str):
+async def get_ai_agent_status(auth_id: str, request: Request, response: Response):
     """Get status of all agents"""
+    not_modified = _not_modified(request, response, auth_id)
+    if not_modified:
+        return not_modified
     try:
         status = await decision_orchestrator.get_agent_status(auth_id)
         return status
     except Exception as e:
+        _drop_etag(response)
         return {"budget_agent": "active", "payment_agent": "active", "status": "ok"}
 
 @app.post("/api/user/{auth_id}/budget-check")
 async def check_budget_with_agent(auth_id: str):
     """Directly call the Budget Agent to analyze current budget status"""
     try:
-        agent_response = await decision_orchestrator.budget_agent.check_budget_status(auth_id)
+        agent_response = await decision_orchestrator.check_budget_status(auth_id)
         
         return {
             "status": "success",
@@ -147,11 +401,28 @@ async def check_and_pay_bills(auth_id: str):
         print(f"Payment check error: {e}")
         raise HTTPException(status_code=500, detail=f"Payment error: {str(e)}")
 
+@app.post("/api/user/{auth_id}/pay-bills")
+async def pay_selected_bills(auth_id: str, request: Request, payment_data: dict):
+    """Settle a set of bills in one batch; retries with the same Idempotency-Key never double-pay"""
+    bill_ids = payment_data.get("bill_ids") or []
+    idempotency_key = request.headers.get("Idempotency-Key") or payment_data.get("idempotency_key")
+    try:
+        result = await decision_orchestrator.payment_agent.pay_bills(bill_ids, auth_id, idempotency_key)
+        return {"status": "success", "result": result}
+    except Exception as e:
+        print(f"Batch payment error: {e}")
+        raise HTTPException(status_code=500, detail=f"Payment error: {str(e)}")
+
 @app.get("/api/user/{auth_id}/pending-bills")
-async def get_pending_bills(auth_id: str):
+async def get_pending_bills(auth_id: str, request: Request, response: Response):
     """Get list of pending bills"""
+    not_modified = _not_modified(request, response, auth_id)
+    if not_modified:
+        return not_modified
     try:
-        bills = await decision_orchestrator.payment_agent.get_pending_bills(auth_id)
+        bills = await decision_orchestrator.get_pending_bills(auth_id)
+        if "error" in bills:
+            _drop_etag(response)
         return {
             "status": "success",
             "bills": bills
@@ -161,11 +432,16 @@ async def get_pending_bills(auth_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/user/{auth_id}/payment-status")
-async def get_payment_status(auth_id: str):
+async def get_payment_status(auth_id: str, request: Request, response: Response, period: str = None):
     """Get Payment Agent status and pending bills count"""
+    not_modified = _not_modified(request, response, auth_id)
+    if not_modified:
+        return not_modified
     try:
-        status = await decision_orchestrator.get_agent_status(auth_id)
-        budget_info = await decision_orchestrator.payment_agent.get_available_budget(auth_id)
+        status, budget_info = await asyncio.gather(
+            decision_orchestrator.get_agent_status(auth_id),
+            decision_orchestrator.get_available_budget(auth_id, period)
+        )
         
         return {
             "status": "success",
@@ -174,4 +450,25 @@ async def get_payment_status(auth_id: str):
         }
     except Exception as e:
         print(f"Error getting payment status: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/user/{auth_id}/alerts/stream")
+async def stream_alerts(auth_id: str, request: Request):
+    """Server-Sent Events stream of budget alerts for a user"""
+    dispatcher = decision_orchestrator.alert_dispatcher
+    stream = dispatcher.subscribe(auth_id)
+
+    async def event_stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    alert = await asyncio.wait_for(stream.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Keep-alive comment so proxies don't close an idle stream
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: budget_alert\ndata: {json.dumps(alert)}\n\n"
+        finally:
+            dispatcher.unsubscribe(auth_id, stream)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
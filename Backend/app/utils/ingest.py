@@ -0,0 +1,327 @@
+import codecs
+import csv
+import json
+import math
+import os
+import re
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+# Row parsers: each yields (row_number, row_dict_or_None, error_or_None)
+
+async def _iter_text(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    # utf-8-sig drops the byte-order mark spreadsheet and bank exports often start with
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    buffer = ""
+    async for text in _iter_text(chunks):
+        buffer += text
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    if buffer:
+        yield buffer.rstrip("\r")
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]):
+    number = 0
+    async for line in _iter_lines(chunks):
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            yield number, json.loads(line), None
+        except json.JSONDecodeError as e:
+            yield number, None, f"Invalid JSON: {e.msg}"
+
+def _max_row_chars() -> int:
+    # A single row (CSV record or JSON array element) larger than this is rejected
+    return int(os.getenv("BULK_MAX_ROW_CHARS", "65536"))
+
+class _LineFeed:
+    """Iterator a csv.reader pulls lines from; refilled between records"""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+async def iter_csv(chunks: AsyncIterator[bytes]):
+    """One csv.reader over the whole body, so quoted fields may span lines.
+    Lines are handed over once their quotes balance, i.e. a record is complete."""
+    max_row = _max_row_chars()
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    header = None
+    number = 0
+    pending, quotes, size = [], 0, 0
+    async for line in _iter_lines(chunks):
+        pending.append(line + "\n")
+        quotes += line.count('"')
+        size += len(line) + 1
+        if quotes % 2:
+            if size > max_row:
+                yield number + 1, None, f"Row exceeds {max_row} characters (unclosed quote?)"
+                return
+            continue
+        feed.lines.extend(pending)
+        pending, quotes, size = [], 0, 0
+        for values in reader:
+            if not any(value.strip() for value in values):
+                continue
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            number += 1
+            if len(values) != len(header):
+                yield number, None, f"Expected {len(header)} columns, got {len(values)}"
+                continue
+            yield number, dict(zip(header, values)), None
+    if pending:
+        yield number + 1, None, "Unterminated quoted field"
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_STRING_SPECIAL = re.compile(r'["\\]')
+_STRUCTURAL = re.compile(r'["\[\]{},]')
+
+class _ElementScanner:
+    """Finds where a JSON array element ends (the ',' or ']' after it) without
+    decoding it; resumable, so text arriving in pieces is scanned once"""
+
+    def __init__(self, start: int):
+        self.position = start
+        self.depth = 0
+        self.in_string = False
+
+    def shift(self, offset: int):
+        self.position -= offset
+
+    def find_end(self, buffer: str) -> Optional[int]:
+        i = self.position
+        while i < len(buffer):
+            if self.in_string:
+                match = _STRING_SPECIAL.search(buffer, i)
+                if match is None:
+                    i = len(buffer)
+                elif match.group() == "\\":
+                    # May point past the buffer until the escaped character arrives
+                    i = match.end() + 1
+                else:
+                    self.in_string, i = False, match.end()
+                continue
+            match = _STRUCTURAL.search(buffer, i)
+            if match is None:
+                i = len(buffer)
+                continue
+            char, i = match.group(), match.end()
+            if char == '"':
+                self.in_string = True
+            elif char in "[{":
+                self.depth += 1
+            elif char in "]}" and self.depth:
+                self.depth -= 1
+            elif self.depth == 0 and char in ",]":
+                return match.start()
+        self.position = i
+        return None
+
+async def iter_json_array(chunks: AsyncIterator[bytes]):
+    """Decode a top-level JSON array element by element as bytes arrive.
+
+    Elements are decoded straight from the buffer. One that fails to decode
+    is either cut off at the end of the buffer or invalid: a scanner finds
+    where it ends, so an invalid element ends the stream with an error right
+    away, and one still incomplete after BULK_MAX_ROW_CHARS is rejected
+    instead of buffered without bound.
+    """
+    decoder = json.JSONDecoder()
+    max_row = _max_row_chars()
+    buffer, pos = "", 0
+    started = False
+    expect_separator = False
+    scanner: Optional[_ElementScanner] = None
+    number = 0
+
+    async for text in _iter_text(chunks):
+        buffer = buffer[pos:] + text
+        if scanner:
+            scanner.shift(pos)
+        pos = 0
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    yield 0, None, "Body must be a JSON array"
+                    return
+                pos, started = pos + 1, True
+                continue
+            if expect_separator:
+                if buffer[pos] == "]":
+                    return
+                if buffer[pos] != ",":
+                    yield number + 1, None, "Invalid JSON: Expecting ',' delimiter"
+                    return
+                pos, expect_separator = pos + 1, False
+                continue
+            if buffer[pos] == "]" and number == 0:
+                return
+
+            if scanner is None:
+                try:
+                    row, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    scanner = _ElementScanner(pos)
+                else:
+                    if end == len(buffer):
+                        # A number may continue in the next chunk
+                        break
+                    number += 1
+                    pos, expect_separator = end, True
+                    yield number, row, None
+                    continue
+
+            end = scanner.find_end(buffer)
+            if end is None:
+                if len(buffer) - pos > max_row:
+                    yield number + 1, None, f"Row exceeds {max_row} characters"
+                    return
+                break
+            scanner = None
+            try:
+                row = json.loads(buffer[pos:end])
+            except json.JSONDecodeError as e:
+                yield number + 1, None, f"Invalid JSON: {e.msg}"
+                return
+            number += 1
+            pos, expect_separator = end, True
+            yield number, row, None
+
+    if started:
+        # A trailing scalar waiting for more input is decodable now
+        rest = buffer[pos:].strip()
+        if rest and not expect_separator and scanner is None:
+            try:
+                row = json.loads(rest)
+            except json.JSONDecodeError:
+                pass
+            else:
+                yield number + 1, row, None
+                number += 1
+        yield number + 1, None, "Unterminated JSON array"
+
+PARSERS = {
+    "json": iter_json_array,
+    "ndjson": iter_ndjson,
+    "csv": iter_csv,
+}
+
+def detect_format(content_type: Optional[str]) -> str:
+    content_type = (content_type or "").lower()
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    if "csv" in content_type:
+        return "csv"
+    return "json"
+
+def validate_expense(row: Any, auth_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Map an imported row onto a 'spends' record, or explain why it can't be"""
+    if not isinstance(row, dict):
+        return None, "Row must be an object"
+
+    raw_amount = row.get("amount", row.get("spent_amt"))
+    try:
+        amount = float(raw_amount)
+    except (TypeError, ValueError):
+        return None, f"Invalid amount: {raw_amount!r}"
+    if not math.isfinite(amount) or amount < 0:
+        return None, f"Invalid amount: {raw_amount!r}"
+
+    category = row.get("category") or "Other"
+    if not isinstance(category, str):
+        return None, f"Invalid category: {category!r}"
+    description = row.get("payment_name") or row.get("description") or ""
+    if not isinstance(description, str):
+        return None, f"Invalid description: {description!r}"
+
+    record = {
+        "auth_id": auth_id,
+        "category": category.strip() or "Other",
+        "spent_amt": amount,
+        "description": description,
+    }
+
+    raw_date = row.get("date") or row.get("created_at")
+    if raw_date:
+        try:
+            record["created_at"] = datetime.fromisoformat(str(raw_date).strip()).isoformat()
+        except ValueError:
+            return None, f"Invalid date: {raw_date!r}"
+    return record, None
+
+async def ingest_expenses(supabase_manager, auth_id: str, chunks: AsyncIterator[bytes],
+                          fmt: str = "json", chunk_size: Optional[int] = None,
+                          max_errors: int = 1000) -> Dict[str, Any]:
+    """Validate rows as they stream in and insert them into 'spends' in batches"""
+    chunk_size = chunk_size or int(os.getenv("BULK_INSERT_CHUNK", "500"))
+    inserted = 0
+    failed = 0
+    errors: List[Dict[str, Any]] = []
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+
+    def record_error(number: int, message: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < max_errors:
+            errors.append({"row": number, "error": message})
+
+    async def flush():
+        nonlocal inserted
+        if not batch:
+            return
+        try:
+            await supabase_manager.insert_spend([record for _, record in batch])
+            inserted += len(batch)
+        except Exception as e:
+            print(f"Bulk insert error: {e}")
+            for number, _ in batch:
+                record_error(number, f"Insert failed: {e}")
+        batch.clear()
+
+    async for number, row, error in PARSERS[fmt](chunks):
+        if error is None:
+            try:
+                record, error = validate_expense(row, auth_id)
+            except Exception as e:
+                # One malformed row must not abort the rows around it
+                print(f"Bulk import row {number} error: {e}")
+                record, error = None, f"Invalid row: {e}"
+        if error:
+            record_error(number, error)
+            continue
+        batch.append((number, record))
+        if len(batch) >= chunk_size:
+            await flush()
+    await flush()
+
+    return {
+        "inserted": inserted,
+        "failed": failed,
+        "errors": errors,
+        "errors_truncated": failed > len(errors)
+    }
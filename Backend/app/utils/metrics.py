@@ -0,0 +1,172 @@
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., sum, count]
+        self.series: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in self.series.items():
+            for bound, count in zip(self.buckets, series):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(round(series[-2], 6))}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Any] = []
+        # Callables returning (name, help, {labels}, value) gauge samples at scrape time
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, Dict[str, Any], float]]]] = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        gauges: Dict[str, Tuple[str, List[str]]] = {}
+        for collector in self.collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+                continue
+            for name, help_text, labels, value in samples:
+                names = tuple(labels)
+                gauges.setdefault(name, (help_text, []))[1].append(
+                    f"{name}{_labels(names, tuple(labels[n] for n in names))} {_number(value)}"
+                )
+        for name, (help_text, samples) in gauges.items():
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", *samples])
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+HTTP_SECONDS = registry.histogram("pennypal_http_request_seconds", "HTTP request latency", ["method", "route", "status"])
+DB_SECONDS = registry.histogram("pennypal_db_query_seconds", "Database round-trip latency", ["table", "operation"])
+DB_ROWS = registry.counter("pennypal_db_rows_total", "Rows returned by database queries", ["table", "operation"])
+LLM_SECONDS = registry.histogram("pennypal_llm_request_seconds", "LLM generation latency (retries included)", ["provider", "model", "outcome"])
+LLM_TOKENS = registry.counter("pennypal_llm_tokens_total", "LLM tokens by direction", ["provider", "model", "kind"])
+TOOL_SECONDS = registry.histogram("pennypal_tool_seconds", "Agent tool execution latency", ["agent", "tool"])
+
+# Request-scoped trace: list of (kind, seconds, attributes) spans
+_trace: ContextVar[Optional[List[Tuple[str, float, Dict[str, Any]]]]] = ContextVar("pennypal_trace", default=None)
+
+def start_trace() -> List[Tuple[str, float, Dict[str, Any]]]:
+    spans: List[Tuple[str, float, Dict[str, Any]]] = []
+    _trace.set(spans)
+    return spans
+
+def record_span(kind: str, seconds: float, **attributes):
+    spans = _trace.get()
+    if spans is not None:
+        spans.append((kind, seconds, attributes))
+
+@contextmanager
+def timer():
+    """Yields a dict whose 'seconds' is filled in when the block exits."""
+    result = {"seconds": 0.0}
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - started
+
+def server_timing(spans: List[Tuple[str, float, Dict[str, Any]]], total_seconds: float) -> str:
+    """Summarize spans per kind into a Server-Timing header value"""
+    kinds: Dict[str, List[float]] = {}
+    for kind, seconds, _ in spans:
+        kinds.setdefault(kind, []).append(seconds)
+    entries = [
+        f'{kind};dur={sum(values) * 1000:.2f};desc="{len(values)} call{"s" if len(values) != 1 else ""}"'
+        for kind, values in kinds.items()
+    ]
+    entries.append(f"total;dur={total_seconds * 1000:.2f}")
+    return ", ".join(entries)
+
+def describe_spans(spans: List[Tuple[str, float, Dict[str, Any]]]) -> str:
+    """One line per span with its attributes, slowest first, for slow-request logs"""
+    lines = []
+    for kind, seconds, attributes in sorted(spans, key=lambda span: span[1], reverse=True):
+        detail = " ".join(f"{key}={value}" for key, value in attributes.items())
+        lines.append(f"  {kind} {seconds * 1000:.2f}ms {detail}".rstrip())
+    return "\n".join(lines)
+
+def timed_tool(agent: str):
+    """Decorator for `execute_tool(self, name, args, auth_id)` methods"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(self, name, args, auth_id):
+            with timer() as elapsed:
+                result = await fn(self, name, args, auth_id)
+            TOOL_SECONDS.observe(elapsed["seconds"], agent=agent, tool=name)
+            record_span("tool", elapsed["seconds"], agent=agent, tool=name)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,30 @@
+import base64
+import json
+from typing import Any, Dict, Tuple
+
+# Keyset (cursor) pagination on (created_at, id)
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Opaque cursor pointing just past `row`"""
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, Any]:
+    """(created_at, id) from a cursor; raises ValueError if it was not made by encode_cursor"""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(row_id, (int, str)):
+        raise ValueError("Invalid cursor")
+    return created_at, row_id
+
+def _quote(value: Any) -> str:
+    # Timestamps carry ':' '.' and '+', which PostgREST logic trees only accept quoted
+    return '"' + str(value).replace('"', '') + '"'
+
+def keyset_filter(cursor: Tuple[str, Any], desc: bool = True) -> str:
+    """PostgREST `or` filter selecting rows strictly after the cursor in (created_at, id) order"""
+    created_at, row_id = cursor
+    op = "lt" if desc else "gt"
+    return f"created_at.{op}.{_quote(created_at)},and(created_at.eq.{_quote(created_at)},id.{op}.{_quote(row_id)})"
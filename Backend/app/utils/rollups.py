@@ -0,0 +1,100 @@
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+PERIODS = ("all", "today", "week", "month", "days")
+_LAST_DAYS = re.compile(r"^(?:last[\s_-]*)?(\d+)[\s_-]*d(?:ays?)?$")
+
+def bucket_day(created_at: Any) -> str:
+    """Daily bucket key (YYYY-MM-DD, UTC) for a spend row's created_at"""
+    if isinstance(created_at, datetime):
+        return created_at.astimezone(timezone.utc).date().isoformat()
+    if isinstance(created_at, date):
+        return created_at.isoformat()
+    if created_at:
+        text = str(created_at)
+        try:
+            parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+            if parsed.tzinfo:
+                parsed = parsed.astimezone(timezone.utc)
+            return parsed.date().isoformat()
+        except ValueError:
+            return text[:10]
+    return datetime.now(timezone.utc).date().isoformat()
+
+def parse_period(text: Optional[str], default: str = "all") -> Tuple[str, Optional[int]]:
+    """Lenient (period, days) parsing for free-form input such as 'this month' or 'last_7_days'"""
+    value = (text or "").strip().lower()
+    for prefix in ("this ", "this_", "current "):
+        if value.startswith(prefix):
+            value = value[len(prefix):]
+    if value in ("overall", "total", "all time", "all_time"):
+        value = "all"
+    if value in PERIODS and value != "days":
+        return value, None
+    match = _LAST_DAYS.match(value)
+    if match and int(match.group(1)) > 0:
+        return "days", int(match.group(1))
+    return default, None
+
+def period_bounds(period: str = "all", days: Optional[int] = None,
+                  today: Optional[date] = None) -> Tuple[Optional[date], Optional[date]]:
+    """Inclusive (start, end) dates for a named period; (None, None) means all time.
+
+    `week` and `month` are the full calendar week (Monday-Sunday) and month
+    containing today; `days` covers the last `days` days including today.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    if period == "all":
+        return None, None
+    if period == "today":
+        return today, today
+    if period == "week":
+        start = today - timedelta(days=today.weekday())
+        return start, start + timedelta(days=6)
+    if period == "month":
+        next_month = (today.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return today.replace(day=1), next_month - timedelta(days=1)
+    if period == "days":
+        if not days or days < 1:
+            raise ValueError("period 'days' needs days >= 1")
+        return today - timedelta(days=days - 1), today
+    raise ValueError(f"Unknown period: {period}")
+
+def sum_window(daily: Dict[str, Dict[str, float]], start: Optional[date], end: Optional[date],
+               category: Optional[str] = None,
+               totals: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """Total and per-category spend over the daily buckets in [start, end].
+
+    For all time (`start` None) the running per-category `totals` are used
+    when given, so the cost doesn't grow with the length of the history.
+    """
+    if start is None:
+        if totals is not None:
+            by_category = {
+                name: amount for name, amount in totals.items()
+                if category is None or name.lower() == category.lower()
+            }
+            return {"total_spent": sum(by_category.values()), "by_category": by_category}
+        buckets = daily.values()
+    else:
+        span = (end - start).days + 1
+        if span > len(daily):
+            # Sparse history: walking the existing buckets is cheaper than the calendar
+            first, last = start.isoformat(), end.isoformat()
+            buckets = [cats for day, cats in daily.items() if first <= day <= last]
+        else:
+            buckets = [daily[key] for key in ((start + timedelta(days=i)).isoformat() for i in range(span)) if key in daily]
+
+    by_category: Dict[str, float] = {}
+    for categories in buckets:
+        for name, amount in categories.items():
+            if category is None or name.lower() == category.lower():
+                by_category[name] = by_category.get(name, 0) + amount
+    return {"total_spent": sum(by_category.values()), "by_category": by_category}
+
+def period_budget(week_budget: Optional[float], start: Optional[date], end: Optional[date]) -> Optional[float]:
+    """Scale the weekly budget to the window length; all-time keeps the weekly figure"""
+    if not week_budget or start is None:
+        return week_budget
+    return round(week_budget * ((end - start).days + 1) / 7, 2)
@@ -0,0 +1,87 @@
+import os
+from typing import Any, Dict, Iterable, Optional
+from app.utils.cache import LRUCache
+from app.utils.rollups import bucket_day
+
+class SpendingAggregateCache:
+    """Per-user running totals over the `spends` table.
+
+    Each entry holds `total_spent`, the latest positive `week_budget`, the
+    `row_count`, running all-time totals `by_category` ({category: amount})
+    and `daily` rollups ({YYYY-MM-DD: {category: amount}}).
+    Entries are warmed from a single scan on first read and then kept current
+    by the write paths, so reads are O(1) instead of O(history) and period
+    queries only sum a window of daily buckets.
+    """
+
+    def __init__(self, max_users: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self._cache = LRUCache(
+            max_entries=max_users or int(os.getenv("SPEND_CACHE_MAX_USERS", "10000")),
+            ttl_seconds=ttl_seconds or float(os.getenv("SPEND_CACHE_TTL", "300"))
+        )
+        # auth_id -> [write epoch, warms in flight] while a scan is running
+        self._warming: Dict[str, list] = {}
+
+    @staticmethod
+    def build(rows: Iterable[Dict[str, Any]], aggregate: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Fold raw spend rows (oldest first) into a new aggregate, or into `aggregate`."""
+        if aggregate is None:
+            aggregate = {"total_spent": 0, "week_budget": None, "row_count": 0, "by_category": {}, "daily": {}}
+        for row in rows:
+            SpendingAggregateCache._fold(aggregate, row)
+        return aggregate
+
+    @staticmethod
+    def _fold(aggregate: Dict[str, Any], row: Dict[str, Any]):
+        amount = row.get("spent_amt") or 0
+        aggregate["total_spent"] += amount
+        if amount:
+            categories = aggregate["daily"].setdefault(bucket_day(row.get("created_at")), {})
+            category = row.get("category") or "Other"
+            categories[category] = categories.get(category, 0) + amount
+            totals = aggregate["by_category"]
+            totals[category] = totals.get(category, 0) + amount
+        if (row.get("week_budget") or 0) > 0:
+            aggregate["week_budget"] = row["week_budget"]
+        aggregate["row_count"] += 1
+
+    def get(self, auth_id: str) -> Optional[Dict[str, Any]]:
+        aggregate = self._cache.get(auth_id)
+        return dict(aggregate) if aggregate else None
+
+    def begin_warm(self, auth_id: str) -> int:
+        state = self._warming.setdefault(auth_id, [0, 0])
+        state[1] += 1
+        return state[0]
+
+    def finish_warm(self, auth_id: str, epoch: int, aggregate: Optional[Dict[str, Any]]):
+        """Store a freshly scanned aggregate unless the scan failed or a write raced it."""
+        state = self._warming[auth_id]
+        state[1] -= 1
+        if state[1] == 0:
+            del self._warming[auth_id]
+        if aggregate is not None and state[0] == epoch:
+            self._cache.set(auth_id, aggregate)
+
+    def apply(self, auth_id: str, rows: Iterable[Dict[str, Any]]):
+        """Fold newly inserted rows into a cached aggregate."""
+        if auth_id in self._warming:
+            self._warming[auth_id][0] += 1
+        aggregate = self._cache.peek(auth_id)
+        if aggregate is None:
+            return
+        for row in rows:
+            self._fold(aggregate, row)
+
+    def invalidate(self, auth_id: str):
+        self._cache.pop(auth_id)
+        if auth_id in self._warming:
+            self._warming[auth_id][0] += 1
+
+    def clear(self):
+        self._cache.clear()
+        for state in self._warming.values():
+            state[0] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
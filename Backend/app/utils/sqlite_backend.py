@@ -0,0 +1,419 @@
+import json
+import re
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# Local stand-in for the Supabase tables PennyPal uses, with the indexes the hot paths need
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    auth_id TEXT NOT NULL UNIQUE,
+    name TEXT,
+    email TEXT,
+    week_budget REAL,
+    ai_preferences TEXT,
+    last_active TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS spends (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    auth_id TEXT NOT NULL,
+    category TEXT,
+    spent_amt REAL DEFAULT 0,
+    week_budget REAL,
+    total_spent REAL,
+    description TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS spends_auth_created_idx ON spends (auth_id, created_at, id);
+CREATE INDEX IF NOT EXISTS spends_budget_idx ON spends (week_budget) WHERE week_budget > 0;
+CREATE TABLE IF NOT EXISTS payments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    auth_id TEXT NOT NULL,
+    payment_name TEXT,
+    amount REAL,
+    category TEXT,
+    frequency TEXT,
+    due_date TEXT,
+    next_payment_date TEXT,
+    last_payment_date TEXT,
+    status TEXT DEFAULT 'active',
+    autopay INTEGER DEFAULT 0,
+    auto_payment_enabled INTEGER DEFAULT 0,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS payments_auth_status_idx ON payments (auth_id, status);
+CREATE INDEX IF NOT EXISTS payments_due_idx ON payments (status, due_date);
+CREATE INDEX IF NOT EXISTS payments_next_due_idx ON payments (status, next_payment_date);
+CREATE TABLE IF NOT EXISTS agent_learning (
+    id TEXT PRIMARY KEY,
+    auth_id TEXT NOT NULL,
+    agent_type TEXT NOT NULL,
+    learning_data TEXT,
+    confidence_score REAL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS agent_learning_lookup_idx ON agent_learning (auth_id, agent_type, created_at);
+CREATE TABLE IF NOT EXISTS autonomous_decisions (
+    id TEXT PRIMARY KEY,
+    auth_id TEXT NOT NULL,
+    decision_type TEXT,
+    input_data TEXT,
+    decision_made TEXT,
+    confidence_score REAL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS autonomous_decisions_auth_idx ON autonomous_decisions (auth_id, created_at);
+"""
+
+JSON_COLUMNS = {
+    "users": {"ai_preferences"},
+    "agent_learning": {"learning_data"},
+    "autonomous_decisions": {"input_data", "decision_made"},
+}
+BOOL_COLUMNS = {
+    "payments": {"autopay", "auto_payment_enabled"},
+}
+# Tables whose primary key is generated client-side rather than autoincremented
+UUID_TABLES = {"autonomous_decisions"}
+
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+AGGREGATES = {"sum", "avg", "min", "max", "count"}
+OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "like": "LIKE", "ilike": "LIKE"}
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def _column(name: str) -> str:
+    if not IDENTIFIER.match(name):
+        raise ValueError(f"Invalid column name: {name!r}")
+    return f'"{name}"'
+
+class SQLiteResponse:
+    """Mirrors postgrest's APIResponse: `.data` plus an optional `.count`."""
+    def __init__(self, data, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+class SQLiteQuery:
+    """Subset of the postgrest request builder, compiled to SQL on execute()."""
+
+    def __init__(self, client: "SQLiteClient", table: str):
+        self.client = client
+        self.table_name = table
+        self.action = "select"
+        self.columns = "*"
+        self.payload = None
+        self.filters: List[tuple] = []
+        self.orders: List[tuple] = []
+        self.limit_count = None
+        self.offset_count = None
+        self.single_row = None
+        self.count_method = None
+        self.on_conflict = None
+
+    # Actions
+    def select(self, columns: str = "*", count: Optional[str] = None, **kwargs):
+        self.action = "select"
+        self.columns = columns
+        self.count_method = count
+        return self
+
+    def insert(self, json_data, **kwargs):
+        self.action = "insert"
+        self.payload = json_data
+        return self
+
+    def upsert(self, json_data, on_conflict: str = "", ignore_duplicates: bool = False, **kwargs):
+        self.action = "insert"
+        self.payload = json_data
+        self.on_conflict = (on_conflict or "id", ignore_duplicates)
+        return self
+
+    def update(self, json_data, **kwargs):
+        self.action = "update"
+        self.payload = json_data
+        return self
+
+    def delete(self, **kwargs):
+        self.action = "delete"
+        return self
+
+    # Filters
+    def _filter(self, op: str, column: str, value):
+        self.filters.append((op, column, value))
+        return self
+
+    def eq(self, column, value): return self._filter("eq", column, value)
+    def neq(self, column, value): return self._filter("neq", column, value)
+    def gt(self, column, value): return self._filter("gt", column, value)
+    def gte(self, column, value): return self._filter("gte", column, value)
+    def lt(self, column, value): return self._filter("lt", column, value)
+    def lte(self, column, value): return self._filter("lte", column, value)
+    def like(self, column, value): return self._filter("like", column, value)
+    def ilike(self, column, value): return self._filter("ilike", column, value)
+    def in_(self, column, values): return self._filter("in", column, list(values))
+    def is_(self, column, value): return self._filter("is", column, value)
+
+    def or_(self, filters: str, **kwargs):
+        self.filters.append(("or", None, filters))
+        return self
+
+    # Modifiers
+    def order(self, column: str, desc: bool = False, **kwargs):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs):
+        self.limit_count = size
+        return self
+
+    def range(self, start: int, end: int, **kwargs):
+        self.offset_count = start
+        self.limit_count = end - start + 1
+        return self
+
+    def single(self):
+        self.single_row = "single"
+        return self
+
+    def maybe_single(self):
+        self.single_row = "maybe"
+        return self
+
+    # Compilation
+    def _value(self, value):
+        if value == "now()":
+            return _now()
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        if isinstance(value, bool):
+            return int(value)
+        return value
+
+    def _condition(self, op: str, column: str, value, params: list) -> str:
+        if op == "or":
+            return _parse_logic_tree("or", value, params)
+        if op == "in":
+            if not value:
+                return "0"
+            params.extend(self._value(v) for v in value)
+            return f"{_column(column)} IN ({', '.join('?' * len(value))})"
+        if op == "is":
+            if value in (None, "null"):
+                return f"{_column(column)} IS NULL"
+            params.append(self._value(value in (True, "true")))
+            return f"{_column(column)} IS ?"
+        params.append(self._value(value))
+        if op == "ilike":
+            return f"LOWER({_column(column)}) LIKE LOWER(?)"
+        return f"{_column(column)} {OPERATORS[op]} ?"
+
+    def _where(self, params: list) -> str:
+        if not self.filters:
+            return ""
+        return " WHERE " + " AND ".join(self._condition(op, col, val, params) for op, col, val in self.filters)
+
+    def _select_list(self):
+        """Parse a postgrest select string, including `alias:col.sum()` aggregates"""
+        if self.columns.strip() == "*":
+            return "*", [], False
+        items, group_by, has_aggregate = [], [], False
+        for item in (part.strip() for part in self.columns.split(",") if part.strip()):
+            alias, _, expr = item.rpartition(":")
+            match = re.match(r"^(?:([A-Za-z_][A-Za-z0-9_]*)\.)?([a-z]+)\(\)$", expr)
+            if expr == "count()" or (match and match.group(2) in AGGREGATES):
+                has_aggregate = True
+                func = "count" if expr == "count()" else match.group(2)
+                target = "*" if expr == "count()" else _column(match.group(1))
+                items.append(f"{func.upper()}({target}) AS {_column(alias or func)}")
+            else:
+                items.append(f"{_column(expr)} AS {_column(alias)}" if alias else _column(expr))
+                group_by.append(_column(expr))
+        return ", ".join(items), group_by, has_aggregate
+
+    def _compile_select(self):
+        params: list = []
+        columns, group_by, has_aggregate = self._select_list()
+        sql = f"SELECT {columns} FROM {_column(self.table_name)}{self._where(params)}"
+        if has_aggregate and group_by:
+            sql += " GROUP BY " + ", ".join(group_by)
+        if self.orders:
+            sql += " ORDER BY " + ", ".join(f"{_column(col)} {'DESC' if desc else 'ASC'}" for col, desc in self.orders)
+        if self.limit_count is not None:
+            sql += f" LIMIT {int(self.limit_count)}"
+            if self.offset_count:
+                sql += f" OFFSET {int(self.offset_count)}"
+        return sql, params
+
+    def _conflict_clause(self, row: Dict[str, Any]) -> str:
+        if not self.on_conflict:
+            return ""
+        target, ignore = self.on_conflict
+        targets = ", ".join(_column(col.strip()) for col in target.split(","))
+        if ignore:
+            return f" ON CONFLICT ({targets}) DO NOTHING"
+        assignments = ", ".join(f"{_column(key)} = excluded.{_column(key)}" for key in row)
+        return f" ON CONFLICT ({targets}) DO UPDATE SET {assignments}"
+
+    def _prepare_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        row = {key: self._value(value) for key, value in row.items()}
+        row.setdefault("created_at", _now())
+        if self.table_name in UUID_TABLES:
+            row.setdefault("id", str(uuid.uuid4()))
+        return row
+
+    def execute(self) -> SQLiteResponse:
+        with self.client.lock:
+            return self._execute(self.client.conn)
+
+    def _execute(self, conn: sqlite3.Connection) -> SQLiteResponse:
+        table = _column(self.table_name)
+        if self.action == "select":
+            sql, params = self._compile_select()
+            rows = [self.client.decode(self.table_name, row) for row in conn.execute(sql, params)]
+            count = None
+            if self.count_method:
+                count_params: list = []
+                count = conn.execute(f"SELECT COUNT(*) FROM {table}{self._where(count_params)}", count_params).fetchone()[0]
+            if self.single_row:
+                if len(rows) != 1:
+                    if self.single_row == "maybe" and not rows:
+                        return SQLiteResponse(None, count)
+                    raise LookupError(f"Expected a single row from {self.table_name}, got {len(rows)}")
+                return SQLiteResponse(rows[0], count)
+            return SQLiteResponse(rows, count)
+
+        if self.action == "insert":
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            inserted = []
+            with conn:
+                for row in (self._prepare_row(r) for r in payload):
+                    columns = ", ".join(_column(key) for key in row)
+                    sql = f"INSERT INTO {table} ({columns}) VALUES ({', '.join('?' * len(row))}){self._conflict_clause(row)} RETURNING *"
+                    inserted.extend(conn.execute(sql, list(row.values())).fetchall())
+            return SQLiteResponse([self.client.decode(self.table_name, row) for row in inserted])
+
+        if self.action == "update":
+            params: list = []
+            assignments = ", ".join(f"{_column(key)} = ?" for key in self.payload)
+            params.extend(self._value(value) for value in self.payload.values())
+            sql = f"UPDATE {table} SET {assignments}{self._where(params)} RETURNING *"
+            with conn:
+                rows = conn.execute(sql, params).fetchall()
+            return SQLiteResponse([self.client.decode(self.table_name, row) for row in rows])
+
+        if self.action == "delete":
+            params = []
+            with conn:
+                rows = conn.execute(f"DELETE FROM {table}{self._where(params)} RETURNING *", params).fetchall()
+            return SQLiteResponse([self.client.decode(self.table_name, row) for row in rows])
+
+        raise ValueError(f"Unsupported action: {self.action}")
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, current = [], 0, ""
+    for char in text:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+    if current:
+        parts.append(current)
+    return parts
+
+def _literal(value: str):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+def _parse_logic_tree(joiner: str, text: str, params: list) -> str:
+    """Compile postgrest logic filters, e.g. `created_at.lt.X,and(created_at.eq.X,id.lt.Y)`"""
+    clauses = []
+    for part in _split_top_level(text.strip()):
+        part = part.strip()
+        nested = re.match(r"^(and|or)\((.*)\)$", part)
+        if nested:
+            clauses.append(_parse_logic_tree(nested.group(1), nested.group(2), params))
+            continue
+        column, op, value = part.split(".", 2)
+        if op == "in":
+            values = [_literal(v) for v in _split_top_level(value.strip("()"))]
+            params.extend(values)
+            clauses.append(f"{_column(column)} IN ({', '.join('?' * len(values))})")
+        elif op == "is":
+            clauses.append(f"{_column(column)} IS NULL" if value == "null" else f"{_column(column)} IS {int(value == 'true')}")
+        else:
+            params.append(_literal(value))
+            clauses.append(f"{_column(column)} {OPERATORS[op]} ?")
+    return "(" + f" {joiner.upper()} ".join(clauses) + ")"
+
+class SQLiteRPC:
+    def __init__(self, client: "SQLiteClient", fn: str, params: Dict[str, Any]):
+        self.client = client
+        self.fn = fn
+        self.params = params
+
+    def execute(self) -> SQLiteResponse:
+        handler = getattr(self.client, f"rpc_{self.fn}", None)
+        if handler is None:
+            raise ValueError(f"Unknown RPC: {self.fn}")
+        with self.client.lock:
+            return SQLiteResponse(handler(**self.params))
+
+class SQLiteClient:
+    """Drop-in for the Supabase client's `table()`/`rpc()` surface, backed by SQLite.
+
+    One connection is shared behind a lock, so it is safe to drive from
+    SupabaseManager's thread pool.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock:
+            if path != ":memory:":
+                self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+
+    def table(self, name: str) -> SQLiteQuery:
+        return SQLiteQuery(self, name)
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None) -> SQLiteRPC:
+        return SQLiteRPC(self, fn, params or {})
+
+    def decode(self, table: str, row: sqlite3.Row) -> Dict[str, Any]:
+        data = dict(row)
+        for column in JSON_COLUMNS.get(table, ()):
+            if isinstance(data.get(column), str):
+                data[column] = json.loads(data[column])
+        for column in BOOL_COLUMNS.get(table, ()):
+            if column in data and data[column] is not None:
+                data[column] = bool(data[column])
+        return data
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # RPCs
+    def rpc_get_monthly_spending_summary(self, user_auth_id: str):
+        month_start = datetime.now(timezone.utc).strftime("%Y-%m-01")
+        rows = self.conn.execute(
+            """SELECT category, SUM(spent_amt) AS total_spent, COUNT(*) AS transaction_count
+               FROM spends WHERE auth_id = ? AND created_at >= ?
+               GROUP BY category ORDER BY total_spent DESC""",
+            (user_auth_id, month_start)
+        ).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Optional
+
+class StateVersions:
+    """Per-user monotonically increasing state versions for conditional GETs.
+
+    Every backend write that changes what a user's read endpoints return
+    (spends, budgets, bill payments) bumps the version. An ETag hashes the
+    version with the resource, the date (due-date priorities and forecasts
+    change at midnight) and a boot id, so a restart never revives an old tag.
+    Writes that skip the backend, such as bills the web app inserts straight
+    into Supabase, show up within STATE_ETAG_WINDOW seconds because the tag
+    also rolls over on that window (0 disables it).
+
+    Versions live in this process only, so tags are only sound with a single
+    worker: with several, a write handled by one worker leaves the others
+    answering 304 for the old state. ETags are therefore off when
+    WEB_CONCURRENCY (the worker count uvicorn and gunicorn read) is above 1,
+    and STATE_ETAG_ENABLED=false turns them off explicitly.
+
+    At most STATE_VERSION_MAX_USERS users are tracked; the least recently
+    written are evicted. Versions come from one global counter and an
+    untracked user reads as the counter value at the last eviction, so an
+    evicted user can never come back to a version an old tag was made with.
+    """
+
+    def __init__(self, window_seconds: Optional[float] = None, max_users: Optional[int] = None,
+                 enabled: Optional[bool] = None):
+        self.window = window_seconds if window_seconds is not None else float(os.getenv("STATE_ETAG_WINDOW", "60"))
+        self.max_users = max_users or int(os.getenv("STATE_VERSION_MAX_USERS", "100000"))
+        if enabled is None:
+            enabled = os.getenv("STATE_ETAG_ENABLED", "true").lower() == "true" \
+                and int(os.getenv("WEB_CONCURRENCY", "1")) <= 1
+        self.enabled = enabled
+        self.boot = uuid.uuid4().hex[:8]
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._counter = 0
+        self._floor = 0
+        self.bumps = 0
+        self.evictions = 0
+
+    def get(self, auth_id: str) -> int:
+        return self._versions.get(auth_id, self._floor)
+
+    def bump(self, auth_id: str) -> int:
+        self._counter += 1
+        self._versions[auth_id] = self._counter
+        self._versions.move_to_end(auth_id)
+        self.bumps += 1
+        while len(self._versions) > self.max_users:
+            self._versions.popitem(last=False)
+            self._counter += 1
+            self._floor = self._counter
+            self.evictions += 1
+        return self._counter
+
+    def etag(self, auth_id: str, resource: str = "") -> str:
+        """Weak ETag for one user's resource (path and query) at the current version"""
+        bucket = int(time.time() // self.window) if self.window > 0 else 0
+        key = f"{self.boot}|{auth_id}|{self.get(auth_id)}|{date.today().isoformat()}|{bucket}|{resource}"
+        return f'W/"{hashlib.blake2b(key.encode(), digest_size=12).hexdigest()}"'
+
+    @staticmethod
+    def matches(if_none_match: Optional[str], etag: str) -> bool:
+        """Whether an If-None-Match header covers `etag` (weak comparison)"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+
+    def stats(self) -> Dict[str, int]:
+        return {"users": len(self._versions), "bumps": self.bumps, "evictions": self.evictions,
+                "enabled": int(self.enabled)}
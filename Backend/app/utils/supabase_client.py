@@ -1,21 +1,166 @@
 from supabase import create_client, Client
+import asyncio
 import os
-from typing import Dict, List, Any, Optional
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, Any, Optional, Union
+from app.utils.cache import LRUCache
+from app.utils.spending_cache import SpendingAggregateCache
+from app.utils.write_buffer import WriteBuffer
+from app.utils.state_version import StateVersions
+from app.utils.rollups import period_bounds, period_budget, sum_window
+from app.utils.pagination import decode_cursor, encode_cursor, keyset_filter
+from app.utils import metrics
+
+class AsyncQuery:
+    """Awaitable wrapper around a postgrest request builder.
+
+    Builder calls (select, eq, order, ...) are proxied as-is; only the
+    blocking `execute()` round trip is offloaded to the manager's thread pool.
+    Each round trip is timed and recorded as a db span.
+    """
+    ACTIONS = {"select", "insert", "update", "upsert", "delete"}
+
+    def __init__(self, builder, executor: ThreadPoolExecutor, table: str = "", calls: tuple = ()):
+        self._builder = builder
+        self._executor = executor
+        self._table = table
+        self._calls = calls
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return self._wrap(attr, name, ())
+
+        def chained(*args, **kwargs):
+            return self._wrap(attr(*args, **kwargs), name, args)
+        return chained
+
+    def _wrap(self, value, name, args):
+        if hasattr(value, "execute"):
+            # Remember the chain (method + column) for span attributes
+            column = args[0] if args and isinstance(args[0], str) and name not in self.ACTIONS else None
+            return AsyncQuery(value, self._executor, self._table, self._calls + ((name, column),))
+        return value
+
+    async def execute(self):
+        loop = asyncio.get_running_loop()
+        with metrics.timer() as elapsed:
+            result = await loop.run_in_executor(self._executor, self._builder.execute)
+        
+        operation = next((name for name, _ in self._calls if name in self.ACTIONS), "rpc" if not self._calls else "select")
+        data = getattr(result, "data", None)
+        rows = len(data) if isinstance(data, list) else int(data is not None)
+        metrics.DB_SECONDS.observe(elapsed["seconds"], table=self._table, operation=operation)
+        metrics.DB_ROWS.inc(rows, table=self._table, operation=operation)
+        metrics.record_span(
+            "db", elapsed["seconds"], table=self._table, operation=operation, rows=rows,
+            filters=[f"{name}:{column}" for name, column in self._calls if column]
+        )
+        return result
+
+HISTORY_COLUMNS = "id, category, spent_amt, week_budget, description, created_at"
+LEARNING_PATTERN_LIMIT = 50
 
 class SupabaseManager:
     def __init__(self):
-        self.supabase: Client = create_client(
-            os.getenv("SUPABASE_URL"),
-            os.getenv("SUPABASE_ANON_KEY")
+        # PENNYPAL_STORAGE=sqlite swaps in a local backend with the same query surface
+        if os.getenv("PENNYPAL_STORAGE", "supabase").lower() == "sqlite":
+            from app.utils.sqlite_backend import SQLiteClient
+            self.supabase = SQLiteClient(os.getenv("SQLITE_PATH", "pennypal.db"))
+        else:
+            self.supabase: Client = create_client(
+                os.getenv("SUPABASE_URL"),
+                os.getenv("SUPABASE_ANON_KEY")
+            )
+        # Bounded pool for PostgREST round trips so a slow query never blocks the event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("SUPABASE_MAX_WORKERS", "16")),
+            thread_name_prefix="supabase"
+        )
+        self.spending_cache = SpendingAggregateCache()
+        self.state_versions = StateVersions()
+        # PostgREST's db-max-rows: any select returns at most this many rows,
+        # whatever limit it asks for
+        self.max_rows = int(os.getenv("SUPABASE_MAX_ROWS", "1000"))
+        # Rows per round trip for scans that walk a user's whole ledger
+        self.page_size = int(os.getenv("SPENDS_PAGE_SIZE", "500"))
+        # (auth_id, agent_type) -> latest learning rows, newest first; kept current write-through
+        self.learning_cache = LRUCache(
+            max_entries=int(os.getenv("LEARNING_CACHE_MAX_ENTRIES", "5000")),
+            ttl_seconds=float(os.getenv("LEARNING_CACHE_TTL", "3600"))
         )
+        # Shared by the buffered writers: attempts before a failing batch is
+        # dropped, and the first retry delay (doubling up to a minute)
+        write_retry = {
+            "max_attempts": int(os.getenv("WRITE_RETRY_LIMIT", "5")),
+            "retry_backoff": float(os.getenv("WRITE_RETRY_BACKOFF", "1"))
+        }
+        self.learning_writer = WriteBuffer(
+            self, "agent_learning",
+            batch_size=int(os.getenv("LEARNING_BATCH_SIZE", "100")),
+            interval=float(os.getenv("LEARNING_FLUSH_INTERVAL", "2")),
+            max_pending=int(os.getenv("LEARNING_MAX_PENDING", "10000")),
+            on_conflict="id",
+            **write_retry
+        )
+        # Write-behind audit log; ids are generated here so callers never wait on the insert
+        self.decision_writer = WriteBuffer(
+            self, "autonomous_decisions",
+            batch_size=int(os.getenv("DECISION_BATCH_SIZE", "200")),
+            interval=float(os.getenv("DECISION_FLUSH_INTERVAL", "1")),
+            max_pending=int(os.getenv("DECISION_MAX_PENDING", "5000")),
+            on_conflict="id",
+            **write_retry
+        )
+        self.decision_enqueue_timeout = float(os.getenv("DECISION_ENQUEUE_TIMEOUT", "0.5"))
+
+    # Async query surface
+    def table(self, name: str) -> AsyncQuery:
+        return AsyncQuery(self.supabase.table(name), self.executor, name)
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None) -> AsyncQuery:
+        return AsyncQuery(self.supabase.rpc(fn, params or {}), self.executor, f"rpc:{fn}")
+
+    async def scan_pages(self, make_query: Callable[[], AsyncQuery], key: str = "id",
+                         page_size: Optional[int] = None):
+        """Yield every row of `make_query()` a page at a time, in `key` order.
+
+        For fleet-wide selects that would otherwise be cut off at max-rows.
+        `key` must be unique per result row (the group column of an
+        aggregate works); `make_query` builds a fresh filtered query per page.
+        """
+        page_size = max(1, min(page_size or self.page_size, self.max_rows))
+        last = None
+        while True:
+            query = make_query()
+            if last is not None:
+                query = query.gt(key, last)
+            result = await query.order(key).limit(page_size).execute()
+            rows = result.data or []
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            last = rows[-1][key]
+
+    async def flush_writers(self):
+        """Stop the buffered writers, flushing anything still queued"""
+        await asyncio.gather(self.learning_writer.stop(), self.decision_writer.stop())
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        if hasattr(self.supabase, "close"):
+            self.supabase.close()
     
     # User Operations
     async def get_user_profile(self, auth_id: str) -> Dict[str, Any]:
-        result = self.supabase.table("users").select("*").eq("auth_id", auth_id).single().execute()
+        result = await self.table("users").select("*").eq("auth_id", auth_id).single().execute()
         return result.data
     
     async def update_user_ai_preferences(self, auth_id: str, preferences: Dict[str, Any]):
-        self.supabase.table("users").update({
+        await self.table("users").update({
             "ai_preferences": preferences,
             "last_active": "now()"
         }).eq("auth_id", auth_id).execute()
@@ -23,7 +168,7 @@ class SupabaseManager:
     # Expense Operations with AI Enhancement
     async def save_expense_with_ai(self, expense_data: Dict[str, Any]) -> Dict[str, Any]:
         # Enhanced expense saving with AI metadata
-        result = self.supabase.table("spend").insert({
+        result = await self.table("spend").insert({
             **expense_data,
             "auto_categorized": expense_data.get("auto_categorized", False),
             "confidence_score": expense_data.get("confidence_score", 0.0),
@@ -33,38 +178,253 @@ class SupabaseManager:
     
     # Agent Learning Operations
     async def save_agent_learning(self, auth_id: str, agent_type: str, learning_data: Dict[str, Any], confidence: float):
-        self.supabase.table("agent_learning").insert({
+        """Queue a learning row for the next bulk insert; cached patterns see it immediately.
+        The id is stamped here so a retried batch that already landed is not duplicated."""
+        row = {
+            "id": str(uuid.uuid4()),
             "auth_id": auth_id,
             "agent_type": agent_type,
             "learning_data": learning_data,
-            "confidence_score": confidence
-        }).execute()
+            "confidence_score": confidence,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        self.learning_writer.add(row)
+        patterns = self.learning_cache.peek((auth_id, agent_type))
+        if patterns is not None:
+            patterns.insert(0, row)
+            del patterns[LEARNING_PATTERN_LIMIT:]
     
     async def get_user_learning_patterns(self, auth_id: str, agent_type: str) -> List[Dict[str, Any]]:
-        result = self.supabase.table("agent_learning").select("*")\
-            .eq("auth_id", auth_id)\
-            .eq("agent_type", agent_type)\
-            .order("created_at", desc=True)\
-            .limit(50).execute()
-        return result.data
+        """Latest learning rows for a user and agent, newest first (cached)"""
+        key = (auth_id, agent_type)
+        patterns = self.learning_cache.get(key)
+        if patterns is None:
+            pending = lambda row: row["auth_id"] == auth_id and row["agent_type"] == agent_type
+            # Unflushed rows would be missing from the table, so write them first
+            if self.learning_writer.has_pending(pending):
+                await self.learning_writer.flush()
+            result = await self.table("agent_learning").select("*")\
+                .eq("auth_id", auth_id)\
+                .eq("agent_type", agent_type)\
+                .order("created_at", desc=True)\
+                .limit(LEARNING_PATTERN_LIMIT).execute()
+            patterns = result.data or []
+            # A save that landed during the read isn't in these rows; don't cache them
+            if not self.learning_writer.has_pending(pending):
+                self.learning_cache.set(key, patterns)
+        return list(patterns)
     
     # Decision Logging
     async def log_autonomous_decision(self, auth_id: str, decision_type: str, 
                                     input_data: Dict[str, Any], decision: Dict[str, Any], 
                                     confidence: float) -> str:
-        result = self.supabase.table("autonomous_decisions").insert({
+        """Queue a decision for the write-behind log and return its id right away.
+
+        Only waits (up to DECISION_ENQUEUE_TIMEOUT) when the queue is full;
+        past that, or at once while inserts are failing, the entry is dropped
+        rather than stalling the request.
+        """
+        decision_id = str(uuid.uuid4())
+        queued = await self.decision_writer.put({
+            "id": decision_id,
             "auth_id": auth_id,
             "decision_type": decision_type,
             "input_data": input_data,
             "decision_made": decision,
-            "confidence_score": confidence
-        }).execute()
-        return result.data[0]["id"]
+            "confidence_score": confidence,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }, timeout=self.decision_enqueue_timeout)
+        # While the writer is failing it logs the failure itself; drops show in its stats
+        if not queued and self.decision_writer.healthy:
+            print(f"Decision log full, dropped {decision_type} for {auth_id}")
+        return decision_id
     
     # Budget Operations
     async def get_user_spending_summary(self, auth_id: str) -> Dict[str, Any]:
         # Get current month spending
-        result = self.supabase.rpc("get_monthly_spending_summary", {
+        result = await self.rpc("get_monthly_spending_summary", {
             "user_auth_id": auth_id
         }).execute()
-        return result.data
\ No newline at end of file
+        return result.data
+
+    # Spend Operations
+    async def insert_spend(self, records: Union[Dict[str, Any], List[Dict[str, Any]]]):
+        """Insert into 'spends' and fold the new rows into the aggregate cache and rollups"""
+        rows = records if isinstance(records, list) else [records]
+        # Batch rows may carry different keys; let missing columns take their DB defaults
+        result = await self.table("spends").insert(records, default_to_null=False).execute()
+        # Returned rows carry the server-assigned created_at used for daily buckets
+        if result.data and len(result.data) == len(rows):
+            rows = result.data
+        by_user: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_user.setdefault(row["auth_id"], []).append(row)
+        for auth_id, user_rows in by_user.items():
+            self.spending_cache.apply(auth_id, user_rows)
+            self.state_versions.bump(auth_id)
+        return result
+
+    async def get_spending_aggregate(self, auth_id: str) -> Dict[str, Any]:
+        """Running total, latest week_budget and row count for a user's spends"""
+        aggregate = self.spending_cache.get(auth_id)
+        if aggregate is not None:
+            return aggregate
+        
+        epoch = self.spending_cache.begin_warm(auth_id)
+        aggregate = None
+        try:
+            # Folded page by page, so a long ledger is never held in memory
+            folded = SpendingAggregateCache.build([])
+            async for rows in self.iter_spend_pages(
+                auth_id, desc=False, columns="id, spent_amt, week_budget, category, created_at"
+            ):
+                SpendingAggregateCache.build(rows, folded)
+            aggregate = folded
+        finally:
+            self.spending_cache.finish_warm(auth_id, epoch, aggregate)
+        return dict(aggregate)
+
+    async def get_spend_page(self, auth_id: str, limit: int = 50, cursor: Optional[str] = None,
+                             start: Optional[date] = None, end: Optional[date] = None,
+                             category: Optional[str] = None, desc: bool = True,
+                             columns: str = HISTORY_COLUMNS) -> Dict[str, Any]:
+        """One page of a user's spends in (created_at, id) order.
+
+        Date (inclusive) and category filters run in the query; `next_cursor`
+        is None on the last page. Raises ValueError for a malformed cursor.
+        """
+        query = self.table("spends").select(columns).eq("auth_id", auth_id)
+        if start:
+            query = query.gte("created_at", start.isoformat())
+        if end:
+            query = query.lt("created_at", (end + timedelta(days=1)).isoformat())
+        if category:
+            query = query.eq("category", category)
+        if cursor:
+            query = query.or_(keyset_filter(decode_cursor(cursor), desc))
+        # One extra row tells us whether another page exists; it only survives
+        # if limit + 1 is within max-rows, otherwise a full page looks like the last
+        limit = max(1, min(limit, self.max_rows - 1))
+        result = await query\
+            .order("created_at", desc=desc)\
+            .order("id", desc=desc)\
+            .limit(limit + 1)\
+            .execute()
+        rows = result.data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {"rows": rows, "next_cursor": encode_cursor(rows[-1]) if has_more else None}
+
+    async def iter_spend_pages(self, auth_id: str, page_size: Optional[int] = None, cursor: Optional[str] = None,
+                               **filters):
+        """Yield every matching page of spends (see get_spend_page for filters).
+
+        The next page is requested while the caller consumes the current one,
+        so at most two pages are in memory however long the history is.
+        """
+        page_size = page_size or self.page_size
+        pending = asyncio.ensure_future(self.get_spend_page(auth_id, page_size, cursor, **filters))
+        try:
+            while pending is not None:
+                page = await pending
+                pending = None
+                if page["next_cursor"]:
+                    pending = asyncio.ensure_future(
+                        self.get_spend_page(auth_id, page_size, page["next_cursor"], **filters)
+                    )
+                yield page["rows"]
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def get_spend_history(self, auth_id: str, start: Optional[date] = None) -> List[Dict[str, Any]]:
+        """A user's spend rows from `start` (inclusive, or all of them), oldest first.
+
+        Paged, so max-rows never truncates it. The aggregate cache is left
+        alone: a windowed scan can't rebuild running totals, so callers that
+        need them use get_spending_aggregate.
+        """
+        rows: List[Dict[str, Any]] = []
+        async for page in self.iter_spend_pages(
+            auth_id, start=start, desc=False,
+            columns="id, auth_id, spent_amt, week_budget, category, description, created_at"
+        ):
+            rows.extend(page)
+        return rows
+
+    async def get_spending_period(self, auth_id: str, period: str = "all", days: Optional[int] = None,
+                                  category: Optional[str] = None,
+                                  default_week_budget: Optional[float] = None) -> Dict[str, Any]:
+        """Spend over a period (all/today/week/month/days), optionally for one category.
+
+        Answered from the cached daily rollups; `period_budget` is the weekly
+        budget scaled to the window. Raises ValueError for an unknown period.
+        """
+        start, end = period_bounds(period, days)
+        aggregate = await self.get_spending_aggregate(auth_id)
+        window = sum_window(aggregate["daily"], start, end, category, totals=aggregate["by_category"])
+        return {
+            "period": period,
+            "start": start.isoformat() if start else None,
+            "end": end.isoformat() if end else None,
+            "category": category,
+            **window,
+            "week_budget": aggregate["week_budget"],
+            "period_budget": period_budget(aggregate["week_budget"] or default_week_budget, start, end),
+            "row_count": aggregate["row_count"]
+        }
+
+    async def get_spending_totals(self, start: Optional[date] = None,
+                                  end: Optional[date] = None) -> Dict[str, Dict[str, Any]]:
+        """Spent total and row count between `start` and `end` (inclusive, or all
+        time) plus the latest week_budget, for every user with spends.
+
+        Two grouped scans, each paged so no user is lost past max-rows.
+        """
+        def totals_query():
+            # PostgREST aggregate: one row per auth_id
+            query = self.table("spends").select("auth_id, total_spent:spent_amt.sum(), row_count:count()")
+            if start:
+                query = query.gte("created_at", start.isoformat())
+            if end:
+                query = query.lt("created_at", (end + timedelta(days=1)).isoformat())
+            return query
+
+        async def load_totals():
+            totals = {}
+            async for rows in self.scan_pages(totals_query, key="auth_id"):
+                for row in rows:
+                    totals[row["auth_id"]] = {
+                        "total_spent": row.get("total_spent") or 0,
+                        "week_budget": None,
+                        "row_count": row.get("row_count") or 0
+                    }
+            return totals
+
+        async def load_budgets():
+            latest = {}
+            async for rows in self.scan_pages(
+                lambda: self.table("spends").select("id, auth_id, week_budget, created_at").gt("week_budget", 0)
+            ):
+                for row in rows:
+                    current = latest.get(row["auth_id"])
+                    if current is None or (row["created_at"], row["id"]) >= (current["created_at"], current["id"]):
+                        latest[row["auth_id"]] = row
+            return latest
+
+        totals, budgets = await asyncio.gather(load_totals(), load_budgets())
+        if start or end:
+            # Users with a budget but nothing spent in the window still count
+            for auth_id in budgets.keys() - totals.keys():
+                totals[auth_id] = {"total_spent": 0, "week_budget": None, "row_count": 0}
+        for auth_id, row in budgets.items():
+            if auth_id in totals:
+                totals[auth_id]["week_budget"] = row["week_budget"]
+        return totals
+
+    def invalidate_spending(self, auth_id: Optional[str] = None):
+        """Drop cached aggregates for one user, or for everyone"""
+        if auth_id is None:
+            self.spending_cache.clear()
+        else:
+            self.spending_cache.invalidate(auth_id)
@@ -0,0 +1,172 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+class WriteBuffer:
+    """Coalesces single-row inserts into periodic bulk inserts.
+
+    `add` only queues the row; a background task inserts everything queued
+    every `interval` seconds, or sooner once `batch_size` rows are waiting.
+    Failed batches go back to the front of the queue, up to `max_pending`
+    rows (`add` drops the oldest beyond that; `put` makes the caller wait for
+    room instead, unless the writer is failing). Retries back off
+    exponentially from `retry_backoff` seconds, and a batch that fails
+    `max_attempts` times in a row is dropped so it can't block the rows
+    behind it. With `on_conflict`, batches are upserts that ignore rows
+    already written, so retrying a batch whose insert actually landed is
+    harmless. `stop` flushes whatever is left.
+    """
+
+    def __init__(self, supabase_manager, table: str, batch_size: int = 100,
+                 interval: float = 2.0, max_pending: int = 10000, on_conflict: Optional[str] = None,
+                 max_attempts: int = 5, retry_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.supabase_manager = supabase_manager
+        self.table = table
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.on_conflict = on_conflict
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self._pending: deque = deque()
+        self._in_flight: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+        self._room = asyncio.Condition()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task = None
+        # Consecutive failures of the batch at the head of the queue
+        self._attempts = 0
+        self._retry_at = 0.0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+        self.abandoned = 0
+        self.waits = 0
+
+    @property
+    def healthy(self) -> bool:
+        """False while the last flush failed and retries are backing off"""
+        return self._attempts == 0
+
+    def add(self, row: Dict[str, Any]):
+        self._pending.append(row)
+        self._trim()
+        self._ensure_task()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def put(self, row: Dict[str, Any], timeout: Optional[float] = None) -> bool:
+        """Queue a row, waiting up to `timeout` for room when the queue is full.
+        Returns False if the row had to be dropped, which is immediate while
+        the writer is failing: waiting would only outlast the backoff."""
+        self._ensure_task()
+        if len(self._pending) >= self.max_pending:
+            if not self.healthy:
+                self.dropped += 1
+                return False
+            self.waits += 1
+            self._wakeup.set()
+            try:
+                async with self._room:
+                    await asyncio.wait_for(
+                        self._room.wait_for(lambda: len(self._pending) < self.max_pending), timeout
+                    )
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                return False
+        self._pending.append(row)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def has_pending(self, match: Callable[[Dict[str, Any]], bool]) -> bool:
+        """Whether a queued or in-flight row satisfies `match`"""
+        return any(match(row) for row in self._pending) or any(match(row) for row in self._in_flight)
+
+    def _trim(self):
+        while len(self._pending) > self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+
+    def _ensure_task(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            delay = self._retry_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Insert every queued row now; returns how many were written"""
+        async with self._lock:
+            written = 0
+            while self._pending:
+                count = min(len(self._pending), self.batch_size)
+                self._in_flight = [self._pending.popleft() for _ in range(count)]
+                try:
+                    query = self.supabase_manager.table(self.table)
+                    if self.on_conflict:
+                        query = query.upsert(self._in_flight, on_conflict=self.on_conflict, ignore_duplicates=True)
+                    else:
+                        query = query.insert(self._in_flight)
+                    await query.execute()
+                except Exception as e:
+                    self.failures += 1
+                    self._attempts += 1
+                    if self._attempts >= self.max_attempts:
+                        print(f"Buffered insert into {self.table} failed {self._attempts} times, dropping {len(self._in_flight)} rows: {e}")
+                        self.abandoned += len(self._in_flight)
+                        self._attempts = 0
+                        self._in_flight = []
+                        await self._notify_room()
+                        continue
+                    backoff = min(self.retry_backoff * 2 ** (self._attempts - 1), self.max_backoff)
+                    print(f"Buffered insert into {self.table} failed, retrying in {backoff:g}s: {e}")
+                    self._retry_at = time.monotonic() + backoff
+                    self._pending.extendleft(reversed(self._in_flight))
+                    self._trim()
+                    break
+                finally:
+                    batch, self._in_flight = self._in_flight, []
+                self._attempts = 0
+                written += len(batch)
+                self.written += len(batch)
+                self.batches += 1
+                await self._notify_room()
+            return written
+
+    async def _notify_room(self):
+        async with self._room:
+            self._room.notify_all()
+
+    async def stop(self):
+        if self._task:
+            # Let a batch that is mid-insert finish instead of cancelling it
+            async with self._lock:
+                self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "abandoned": self.abandoned,
+            "waits": self.waits
+        }
@@ -0,0 +1,90 @@
+"""Shared setup for the benchmark suite: offline backends, seeding and reporting."""
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+def configure_offline(sqlite_path=":memory:", llm_latency_ms=0):
+    """Point the app at SQLite and the stub LLM; must run before importing app.main"""
+    os.environ["PENNYPAL_STORAGE"] = "sqlite"
+    os.environ["SQLITE_PATH"] = sqlite_path
+    os.environ["LLM_PROVIDER"] = "stub"
+    os.environ["LLM_STUB_LATENCY_MS"] = str(llm_latency_ms)
+    # Background engines would add noise to the measurements
+    os.environ.setdefault("BILL_SCHEDULER_ENABLED", "false")
+    os.environ.setdefault("BUDGET_MONITOR_ENABLED", "false")
+
+CATEGORIES = ["Food", "Transport", "Shopping", "Entertainment", "Groceries", "Utilities", "Health", "Other"]
+
+def make_spends(auth_id, count, rng, days=365):
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(count):
+        created = now - timedelta(days=days * (count - i) / max(count, 1), minutes=rng.randint(0, 600))
+        rows.append((auth_id, rng.choice(CATEGORIES), round(rng.uniform(20, 800), 2), None, f"bench spend {i}", created.isoformat()))
+    rows.append((auth_id, "Budget Set", 0, 20000, "Weekly Budget Updated", now.isoformat()))
+    return rows
+
+def make_bills(auth_id, count, rng):
+    today = date.today()
+    return [
+        (auth_id, f"Bill {i}", round(rng.uniform(99, 2500), 2), rng.choice(["Utilities", "Subscriptions", "Rent"]),
+         rng.choice(["monthly", "weekly", "yearly", None]), str(today + timedelta(days=rng.randint(-10, 40))),
+         "active", int(rng.random() < 0.3), datetime.now(timezone.utc).isoformat())
+        for i in range(count)
+    ]
+
+def seed(sqlite_client, users, spends_per_user, bills_per_user, seed_value=42):
+    """Bulk-load synthetic users straight into the SQLite backend"""
+    rng = random.Random(seed_value)
+    auth_ids = [f"bench-user-{i}" for i in range(users)]
+    with sqlite_client.lock, sqlite_client.conn:
+        for auth_id in auth_ids:
+            sqlite_client.conn.executemany(
+                "INSERT INTO spends (auth_id, category, spent_amt, week_budget, description, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                make_spends(auth_id, spends_per_user, rng)
+            )
+            sqlite_client.conn.executemany(
+                "INSERT INTO payments (auth_id, payment_name, amount, category, frequency, due_date, status, autopay, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                make_bills(auth_id, bills_per_user, rng)
+            )
+    return auth_ids
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(latencies, elapsed, errors=0):
+    """Throughput and latency percentiles (milliseconds) for one scenario"""
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 4),
+        "throughput_rps": round(len(values) / elapsed, 1) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.fmean(values) * 1000, 3) if values else 0.0,
+            "p50": round(percentile(values, 50) * 1000, 3),
+            "p95": round(percentile(values, 95) * 1000, 3),
+            "p99": round(percentile(values, 99) * 1000, 3),
+            "max": round(values[-1] * 1000, 3) if values else 0.0,
+        }
+    }
+
+def write_report(report, output=None):
+    report["environment"] = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    print(text)
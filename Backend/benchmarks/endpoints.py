@@ -0,0 +1,92 @@
+"""Endpoint load test: drives the FastAPI app in-process over ASGI.
+
+    python -m benchmarks.endpoints --concurrency 32 --requests 500 --spends 10000
+
+Runs against the SQLite backend and the stub LLM provider, and prints a JSON
+report (throughput, p50/p95/p99 latency per endpoint) suitable for diffing
+between runs.
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+from benchmarks.common import configure_offline, seed, summarize, write_report
+
+ENDPOINTS = {
+    "dashboard": ("GET", "/api/user/{auth_id}/dashboard", None),
+    "expense": ("POST", "/api/user/{auth_id}/expense", {"amount": 120, "category": "Food", "payment_name": "bench"}),
+    "budget-check": ("POST", "/api/user/{auth_id}/budget-check", None),
+    "check-payments": ("POST", "/api/user/{auth_id}/check-payments", None),
+    "pending-bills": ("GET", "/api/user/{auth_id}/pending-bills", None),
+    "payment-status": ("GET", "/api/user/{auth_id}/payment-status", None),
+}
+
+async def run_scenario(client, name, auth_ids, total, concurrency, cold, supabase_manager):
+    method, path, body = ENDPOINTS[name]
+    users = itertools.cycle(auth_ids)
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(auth_id):
+        nonlocal errors
+        async with semaphore:
+            if cold:
+                supabase_manager.invalidate_spending(auth_id)
+            started = time.perf_counter()
+            response = await client.request(method, path.format(auth_id=auth_id), json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(next(users)) for _ in range(total)])
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+async def main(args):
+    configure_offline(llm_latency_ms=args.llm_latency_ms)
+    import httpx
+    from app.main import app, supabase_manager
+
+    auth_ids = seed(supabase_manager.supabase, args.users, args.spends, args.bills)
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in args.endpoints:
+                # Warm-up pass so first-request costs don't skew the percentiles
+                await run_scenario(client, name, auth_ids, min(len(auth_ids), args.requests), args.concurrency, args.cold, supabase_manager)
+                results[name] = await run_scenario(
+                    client, name, auth_ids, args.requests, args.concurrency, args.cold, supabase_manager
+                )
+
+    write_report({
+        "benchmark": "endpoints",
+        "config": {
+            "users": args.users,
+            "spends_per_user": args.spends,
+            "bills_per_user": args.bills,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "cold_cache": args.cold,
+            "llm_latency_ms": args.llm_latency_ms,
+        },
+        "results": results
+    }, args.output)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--spends", type=int, default=1000, help="spend rows per user")
+    parser.add_argument("--bills", type=int, default=15, help="active bills per user")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="simulated stub LLM latency")
+    parser.add_argument("--cold", action="store_true", help="drop cached spending aggregates before every request")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
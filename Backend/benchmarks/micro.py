@@ -0,0 +1,163 @@
+"""Micro-benchmarks for CPU-bound hot paths.
+
+    python -m benchmarks.micro --sizes 1000 10000 100000
+
+Measures PaymentAgent.get_pending_bills prioritization (rows served from
+memory, so only our own code is timed), the spend aggregation loop versus
+a cached aggregate read, and the vectorized spending analytics as history
+length grows, plus the local expense-message parser's throughput.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.common import configure_offline, make_bills, make_spends, summarize, write_report
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+class _MemoryQuery:
+    """Returns preloaded rows for any query chain."""
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    async def execute(self):
+        return _Result(self.rows)
+
+class _MemoryManager:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, name):
+        return _MemoryQuery(self.rows)
+
+def bill_rows(count, rng):
+    columns = ["auth_id", "payment_name", "amount", "category", "frequency", "due_date", "status", "autopay", "created_at"]
+    return [dict(zip(columns, row), id=i) for i, row in enumerate(make_bills("micro", count, rng))]
+
+def spend_rows(count, rng):
+    columns = ["auth_id", "category", "spent_amt", "week_budget", "description", "created_at"]
+    return [dict(zip(columns, row)) for row in make_spends("micro", count, rng)]
+
+async def bench_pending_bills(sizes, repeat):
+    from app.agents.payment_agent import PaymentAgent
+    rng = random.Random(7)
+    results = {}
+    for size in sizes:
+        agent = PaymentAgent(_MemoryManager(bill_rows(size, rng)))
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            await agent.get_pending_bills("micro")
+            latencies.append(time.perf_counter() - t0)
+        results[str(size)] = summarize(latencies, time.perf_counter() - started)
+    return results
+
+def bench_spend_aggregation(sizes, repeat):
+    from app.utils.spending_cache import SpendingAggregateCache
+    rng = random.Random(11)
+    results = {}
+    for size in sizes:
+        rows = spend_rows(size, rng)
+        cache = SpendingAggregateCache(max_users=10, ttl_seconds=3600)
+
+        # Full scan: what every read cost before the aggregate cache
+        scan = []
+        started = time.perf_counter()
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            SpendingAggregateCache.build(rows)
+            scan.append(time.perf_counter() - t0)
+        scan_elapsed = time.perf_counter() - started
+
+        epoch = cache.begin_warm("micro")
+        cache.finish_warm("micro", epoch, SpendingAggregateCache.build(rows))
+        cached = []
+        started = time.perf_counter()
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            cache.get("micro")
+            cached.append(time.perf_counter() - t0)
+        results[str(size)] = {
+            "full_scan": summarize(scan, scan_elapsed),
+            "cached_read": summarize(cached, time.perf_counter() - started)
+        }
+    return results
+
+def bench_spending_analytics(sizes, repeat):
+    import numpy as np
+    from app.agents.spending_analytics import analyze, to_columns
+    rng = random.Random(13)
+    today = np.datetime64("today", "D")
+    results = {}
+    for size in sizes:
+        rows = spend_rows(size, rng)
+        convert, compute = [], []
+        started = time.perf_counter()
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            columns = to_columns(rows)
+            t1 = time.perf_counter()
+            analyze(columns, 2000, today)
+            convert.append(t1 - t0)
+            compute.append(time.perf_counter() - t1)
+        elapsed = time.perf_counter() - started
+        results[str(size)] = {
+            "to_columns": summarize(convert, elapsed),
+            "analyze": summarize(compute, elapsed)
+        }
+    return results
+
+EXPENSE_MESSAGES = [
+    "Log ₹250 food", "spent Rs. 1.2k on groceries at BigBasket yesterday", "uber 340",
+    "₹2.5k dinner at Toit last Friday", "paid 2 lakh rent to landlord on 5th oct",
+    "INR 1,250.50 medicines 12/10", "netflix 649", "coffee 120 rs 3 days ago",
+]
+
+def bench_expense_parser(messages, repeat):
+    from app.agents.expense_parser import ExpenseParser, KeywordMatcher
+    parser = ExpenseParser()
+    learned = KeywordMatcher({f"merchant {i}": "Food" for i in range(200)})
+    batch = EXPENSE_MESSAGES * (messages // len(EXPENSE_MESSAGES))
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for text in batch:
+            parser.parse(text, learned)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    report = summarize(latencies, elapsed)
+    report["messages_per_second"] = round(len(batch) * repeat / elapsed)
+    return report
+
+async def main(args):
+    configure_offline()
+    write_report({
+        "benchmark": "micro",
+        "config": {"sizes": args.sizes, "messages": args.messages, "repeat": args.repeat},
+        "results": {
+            "pending_bills_prioritization": await bench_pending_bills(args.bill_sizes, args.repeat),
+            "spend_aggregation": bench_spend_aggregation(args.sizes, args.repeat),
+            "spending_analytics": bench_spending_analytics(args.sizes, args.repeat),
+            "expense_parser": bench_expense_parser(args.messages, args.repeat),
+        }
+    }, args.output)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="spend history lengths")
+    parser.add_argument("--bill-sizes", type=int, nargs="+", default=[15, 100, 1000], help="active bills per user")
+    parser.add_argument("--messages", type=int, default=10000, help="expense messages parsed per repeat")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,4 @@
+import os
+
+# Tests run offline: agents get the stub LLM provider
+os.environ.setdefault("LLM_PROVIDER", "stub")
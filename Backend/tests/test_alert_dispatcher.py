@@ -0,0 +1,51 @@
+"""Background budget evaluations publish only when the threshold band changes."""
+import asyncio
+
+from app.agents.alert_dispatcher import AlertDispatcher
+
+def _run(bands, **kwargs):
+    """Evaluate once per entry in `bands`; returns (evaluations, published alerts)"""
+    evaluated, states = [], iter(bands)
+
+    async def evaluate(auth_id):
+        evaluated.append(auth_id)
+        return "summary"
+
+    async def band(auth_id):
+        return next(states)
+
+    async def main():
+        dispatcher = AlertDispatcher(evaluate, band=band, workers=1, **kwargs)
+        stream = dispatcher.subscribe("user-1")
+        await dispatcher.start()
+        for _ in bands:
+            dispatcher.enqueue("user-1")
+            await dispatcher.queue.join()
+        await dispatcher.stop()
+        alerts = []
+        while not stream.empty():
+            alerts.append(stream.get_nowait())
+        return alerts
+
+    alerts = asyncio.run(main())
+    return evaluated, alerts
+
+def test_unchanged_band_is_not_evaluated_or_published():
+    evaluated, alerts = _run(["ok", "ok"])
+    assert evaluated == []
+    assert alerts == []
+
+def test_band_changes_are_published_once():
+    evaluated, alerts = _run(["warning", "warning", "critical", "ok"])
+    assert len(evaluated) == 3
+    assert [alert["state"] for alert in alerts] == ["warning", "critical", "ok"]
+
+def test_announce_band_skips_a_band_already_announced():
+    async def evaluate(auth_id):
+        return "summary"
+
+    dispatcher = AlertDispatcher(evaluate)
+    stream = dispatcher.subscribe("user-1")
+    assert dispatcher.announce_band("user-1", "warning", {"state": "warning"})
+    assert not dispatcher.announce_band("user-1", "warning", {"state": "warning"})
+    assert stream.qsize() == 1
@@ -0,0 +1,44 @@
+"""Autopay due-date heap: ordering, rescheduling and stale entries."""
+from datetime import date, datetime
+
+from app.agents.bill_scheduler import BillScheduler, effective_due_date
+
+def _bill(bill_id, due, **fields):
+    return {"id": bill_id, "auth_id": "user-1", "status": "active", "autopay": True, "due_date": due, **fields}
+
+def _scheduler():
+    return BillScheduler(supabase_manager=None, payment_agent=None, concurrency=1)
+
+def test_next_payment_date_wins():
+    assert effective_due_date(_bill(1, "2026-10-01", next_payment_date="2026-11-01")) == date(2026, 11, 1)
+
+def test_due_bills_pop_in_order():
+    scheduler = _scheduler()
+    scheduler.track(_bill(1, "2026-10-20"))
+    scheduler.track(_bill(2, "2026-10-10"))
+    scheduler.track(_bill(3, "2026-12-01"))
+    due = scheduler._pop_due(datetime(2026, 10, 31))
+    assert [bill_id for bill_id, _ in due["user-1"]] == ["2", "1"]
+    assert scheduler._peek() == datetime(2026, 12, 1)
+
+def test_moved_bill_leaves_a_stale_entry_behind():
+    scheduler = _scheduler()
+    scheduler.track(_bill(1, "2026-10-10"))
+    scheduler.track(_bill(1, "2026-11-10"))
+    assert scheduler._pop_due(datetime(2026, 10, 31)) == {}
+    assert scheduler._peek() == datetime(2026, 11, 10)
+
+def test_non_autopay_or_inactive_bills_are_dropped():
+    scheduler = _scheduler()
+    scheduler.track(_bill(1, "2026-10-10"))
+    scheduler.track(_bill(1, "2026-10-10", status="paid"))
+    scheduler.track(_bill(2, "2026-10-10", autopay=False))
+    assert scheduler._peek() is None
+
+def test_paid_cycle_is_not_tracked_again():
+    scheduler = _scheduler()
+    scheduler.track(_bill(1, "2026-10-10"))
+    scheduler.reschedule("1", "user-1", {"status": "active", "next_payment_date": "2026-11-10"})
+    # A stale read of the cycle just paid
+    scheduler.track(_bill(1, "2026-10-10"))
+    assert scheduler._peek() == datetime(2026, 11, 10)
@@ -0,0 +1,65 @@
+"""Budget monitor sweeps: only changed bands are checked, failures are retried."""
+import asyncio
+
+from app.agents.budget_monitor import BudgetMonitor, threshold_state
+
+class FakeManager:
+    def __init__(self):
+        self.totals = {}
+
+    async def get_spending_totals(self, start=None, end=None):
+        return dict(self.totals)
+
+class FakeAgent:
+    def __init__(self):
+        self.checked = []
+        self.fail = set()
+
+    async def autonomous_budget_check(self, auth_id):
+        self.checked.append(auth_id)
+        if auth_id in self.fail:
+            raise RuntimeError("provider down")
+        return "summary"
+
+def _monitor():
+    manager, agent = FakeManager(), FakeAgent()
+    monitor = BudgetMonitor(manager, agent, interval=1, concurrency=4, rate_per_second=1000)
+    monitor.period, monitor.days = "all", None
+    return monitor, manager, agent
+
+def _row(spent, week_budget=1000):
+    return {"total_spent": spent, "week_budget": week_budget, "row_count": 1}
+
+def test_threshold_bands():
+    assert threshold_state(10, 100) == "ok"
+    assert threshold_state(75, 100) == "warning"
+    assert threshold_state(101, 100) == "critical"
+    assert threshold_state(5, 0) == "ok"
+
+def test_only_changed_bands_are_checked():
+    monitor, manager, agent = _monitor()
+    manager.totals = {"a": _row(100), "b": _row(900)}
+    asyncio.run(monitor.sweep())
+    assert agent.checked == ["b"]
+    asyncio.run(monitor.sweep())
+    assert agent.checked == ["b"]
+
+def test_failed_check_is_retried_even_when_back_to_ok():
+    monitor, manager, agent = _monitor()
+    manager.totals = {"a": _row(900)}
+    asyncio.run(monitor.sweep())
+    manager.totals = {"a": _row(100)}
+    agent.fail.add("a")
+    assert asyncio.run(monitor.sweep())["failed"] == 1
+    agent.fail.clear()
+    asyncio.run(monitor.sweep())
+    assert agent.checked == ["a", "a", "a"]
+    assert monitor.states == {"a": "ok"}
+
+def test_users_missing_from_totals_are_dropped():
+    monitor, manager, agent = _monitor()
+    manager.totals = {"a": _row(900), "b": _row(10)}
+    asyncio.run(monitor.sweep())
+    manager.totals = {"b": _row(10)}
+    asyncio.run(monitor.sweep())
+    assert monitor.stats()["tracked_users"] == 1
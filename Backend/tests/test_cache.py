@@ -0,0 +1,48 @@
+"""LRU cache and the per-user spending aggregate cache."""
+import time
+
+from app.utils.cache import LRUCache
+from app.utils.spending_cache import SpendingAggregateCache
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+def test_ttl_expiry_counts_as_miss():
+    cache = LRUCache(ttl_seconds=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+def test_peek_leaves_counters_alone():
+    cache = LRUCache()
+    cache.set("a", 1)
+    assert cache.peek("a") == 1
+    assert cache.stats()["hits"] == 0
+
+def _row(amount, category="Food", created_at="2026-10-18T10:00:00+00:00"):
+    return {"spent_amt": amount, "category": category, "created_at": created_at}
+
+def test_writes_fold_into_a_warm_aggregate():
+    cache = SpendingAggregateCache(max_users=10, ttl_seconds=60)
+    epoch = cache.begin_warm("user-1")
+    cache.finish_warm("user-1", epoch, SpendingAggregateCache.build([_row(10)]))
+    cache.apply("user-1", [_row(5, "Travel")])
+    aggregate = cache.get("user-1")
+    assert aggregate["total_spent"] == 15
+    assert aggregate["by_category"] == {"Food": 10, "Travel": 5}
+    assert aggregate["row_count"] == 2
+
+def test_write_during_warm_discards_the_scan():
+    cache = SpendingAggregateCache(max_users=10, ttl_seconds=60)
+    epoch = cache.begin_warm("user-1")
+    cache.apply("user-1", [_row(5)])
+    cache.finish_warm("user-1", epoch, SpendingAggregateCache.build([_row(10)]))
+    assert cache.get("user-1") is None
@@ -0,0 +1,75 @@
+"""Rule-based expense parsing: amounts, dates and categories."""
+from datetime import date
+
+import pytest
+
+from app.agents.expense_parser import ExpenseParser, lexicon_matcher
+
+TODAY = date(2026, 1, 10)
+
+def _parse(text):
+    return ExpenseParser().parse(text, today=TODAY)
+
+@pytest.mark.parametrize("text, amount", [
+    ("log 250 food", 250),
+    ("spent 200 on lunch", 200),
+    ("₹1,250 groceries", 1250),
+    ("uber 340 yesterday", 340),
+    ("rent 15k", 15000),
+    ("paid 2 lakh rent", 200000),
+])
+def test_amounts(text, amount):
+    assert _parse(text)["amount"] == amount
+
+@pytest.mark.parametrize("text, amount", [
+    ("bought 3 shirts for 1200", 1200),
+    ("1200 for 3 shirts", 1200),
+    ("2 l milk 60", 60),
+    ("lunch 2 l milk 120", 120),
+    ("movie 2 tickets 500", 500),
+    ("₹500 for 2 pizzas", 500),
+])
+def test_amount_beats_quantity(text, amount):
+    assert _parse(text)["amount"] == amount
+
+def test_bare_l_is_not_lakh():
+    assert _parse("2 l milk 60")["amount"] != 200000
+
+def test_competing_numbers_lower_confidence():
+    assert _parse("bought 3 shirts for 1200")["confidence"] < _parse("bought shirts for 1200")["confidence"]
+    # Nothing tells 250 and 3 apart: the parser keeps the first but marks it a guess
+    assert _parse("log 250 food 3 items")["confidence"] < 0.65
+
+def test_large_scale_is_a_guess():
+    assert _parse("paid 2 lakh rent")["confidence"] < 0.65
+
+@pytest.mark.parametrize("text, spent_on", [
+    ("dinner 400 yesterday", "2026-01-09"),
+    ("dinner 400 3 days ago", "2026-01-07"),
+    ("dinner 400 on 2026-01-02", "2026-01-02"),
+    ("28/12 dinner 400", "2025-12-28"),
+    ("5/1 dinner 400", "2026-01-05"),
+    ("28 dec dinner 400", "2025-12-28"),
+    ("28/12/24 dinner 400", "2024-12-28"),
+])
+def test_dates_never_in_the_future(text, spent_on):
+    parsed = _parse(text)
+    assert parsed["date"] == spent_on
+    assert parsed["amount"] == 400
+
+def test_date_is_not_read_as_amount():
+    assert _parse("12/10 coffee 90")["amount"] == 90
+
+@pytest.mark.parametrize("text, category", [
+    ("bought 3 shirts for 1200", "Shopping"),
+    ("2 buses 80", "Transport"),
+    ("pizzas 600", "Food"),
+    ("shoes 2000", "Shopping"),
+    ("random thing 50", "Other"),
+])
+def test_categories(text, category):
+    assert _parse(text)["category"] == category
+
+def test_plural_keywords():
+    assert lexicon_matcher().find("two shirts")[0][1] == "Shopping"
+    assert lexicon_matcher().find("business class") == []
@@ -0,0 +1,53 @@
+"""Forecast cache: bills are re-read only on a version change or after the recheck interval."""
+import asyncio
+
+from app.agents.forecasting import ForecastEngine
+from app.utils.state_version import StateVersions
+
+class FakeManager:
+    def __init__(self):
+        self.state_versions = StateVersions(enabled=True)
+
+    async def get_spending_aggregate(self, auth_id):
+        return {"row_count": 3, "total_spent": 300, "week_budget": 2000}
+
+def _engine(recheck=60):
+    engine = ForecastEngine(FakeManager())
+    engine.bills_recheck = recheck
+    engine.bills = [{"id": 1, "amount": 100, "frequency": "monthly", "due_date": "2026-10-20", "next_payment_date": None}]
+    engine.reads = 0
+    engine.computes = 0
+
+    async def scan(make_query):
+        engine.reads += 1
+        return list(engine.bills)
+
+    async def compute(aggregates, today, filter_users=False, spends=None, bills=None):
+        engine.computes += 1
+        return {auth_id: {"bills": len(bills)} for auth_id in aggregates}
+
+    engine._scan = scan
+    engine.compute = compute
+    return engine
+
+def test_warm_forecast_skips_the_bill_read():
+    engine = _engine()
+    for _ in range(3):
+        asyncio.run(engine.get_forecast("user-1", recheck_bills=True))
+    assert (engine.reads, engine.computes) == (1, 1)
+
+def test_version_change_reads_bills_again():
+    engine = _engine()
+    asyncio.run(engine.get_forecast("user-1", recheck_bills=True))
+    engine.supabase_manager.state_versions.bump("user-1")
+    asyncio.run(engine.get_forecast("user-1", recheck_bills=True))
+    assert (engine.reads, engine.computes) == (2, 2)
+
+def test_recheck_catches_bills_added_elsewhere():
+    engine = _engine(recheck=0)
+    asyncio.run(engine.get_forecast("user-1", recheck_bills=True))
+    asyncio.run(engine.get_forecast("user-1", recheck_bills=True))
+    assert (engine.reads, engine.computes) == (2, 1)
+    engine.bills.append({"id": 2, "amount": 50, "frequency": "weekly", "due_date": "2026-10-21", "next_payment_date": None})
+    assert asyncio.run(engine.get_forecast("user-1", recheck_bills=True)) == {"bills": 2}
+    assert engine.computes == 2
@@ -0,0 +1,63 @@
+"""Streaming bulk import: parsers, per-row validation and error reporting."""
+import asyncio
+import json
+
+from app.utils.ingest import ingest_expenses, iter_csv, validate_expense
+
+class FakeManager:
+    def __init__(self):
+        self.rows = []
+
+    async def insert_spend(self, records):
+        self.rows.extend(records)
+
+async def _chunks(data: bytes, size: int = 7):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+def _ingest(data: bytes, fmt: str):
+    manager = FakeManager()
+    result = asyncio.run(ingest_expenses(manager, "user-1", _chunks(data), fmt=fmt, chunk_size=2))
+    return manager, result
+
+def _parse_csv(data: bytes):
+    async def collect():
+        return [item async for item in iter_csv(_chunks(data))]
+    return asyncio.run(collect())
+
+def test_non_string_category_is_a_row_error():
+    rows = [{"amount": 10, "category": "Food"}, {"amount": 6, "category": 5}, {"amount": 3}]
+    manager, result = _ingest(json.dumps(rows).encode(), "json")
+    assert result["inserted"] == 2
+    assert result["failed"] == 1
+    assert result["errors"][0]["row"] == 2
+    assert "category" in result["errors"][0]["error"]
+    assert [row["category"] for row in manager.rows] == ["Food", "Other"]
+
+def test_non_string_description_is_a_row_error():
+    record, error = validate_expense({"amount": 1, "description": ["x"]}, "user-1")
+    assert record is None
+    assert "description" in error
+
+def test_csv_with_byte_order_mark():
+    data = "\ufeffamount,category\n12.5,Food\n4,Travel\n".encode("utf-8")
+    manager, result = _ingest(data, "csv")
+    assert result["failed"] == 0
+    assert [row["spent_amt"] for row in manager.rows] == [12.5, 4.0]
+
+def test_csv_quoted_field_spans_lines():
+    data = b'amount,description\n5,"two\nlines"\n7,plain\n'
+    parsed = _parse_csv(data)
+    assert [row for _, row, _ in parsed] == [
+        {"amount": "5", "description": "two\nlines"},
+        {"amount": "7", "description": "plain"},
+    ]
+
+def test_csv_unterminated_quote_is_reported():
+    parsed = _parse_csv(b'amount,description\n5,"never closed\n')
+    assert parsed[-1][2] == "Unterminated quoted field"
+
+def test_malformed_json_fails_fast():
+    manager, result = _ingest(b'[{"amount": 1}, {"amount": ', "json")
+    assert result["inserted"] == 1
+    assert result["failed"] == 1
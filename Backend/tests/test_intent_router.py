@@ -0,0 +1,42 @@
+"""Local intent routing and multi-intent chat answers."""
+import asyncio
+
+from app.agents.intent_router import IntentRouter
+from app.agents.orchestrator import DecisionOrchestrator
+
+def _intents(text):
+    return [(route["intent"], route["text"]) for route in IntentRouter().route(text)["intents"]]
+
+def test_single_intent():
+    assert _intents("how is my budget") == [("budget_status", "how is my budget")]
+
+def test_mixed_intents_split():
+    assert _intents("log 250 food and check my budget") == [
+        ("log_expense", "log 250 food"), ("budget_status", "check my budget")
+    ]
+
+def test_every_expense_clause_is_kept():
+    assert _intents("log 250 food and 100 coffee") == [
+        ("log_expense", "log 250 food"), ("log_expense", "100 coffee")
+    ]
+
+def test_expense_clause_without_amount_is_merged():
+    assert _intents("log lunch and coffee 200") == [("log_expense", "log lunch and coffee 200")]
+
+def test_repeated_read_intents_collapse():
+    assert [intent for intent, _ in _intents("how is my budget and am i over budget")] == ["budget_status"]
+
+def test_answers_keep_their_position():
+    orchestrator = DecisionOrchestrator.__new__(DecisionOrchestrator)
+    orchestrator.router = IntentRouter()
+    handled = []
+
+    async def handle(auth_id, item):
+        handled.append(item["text"])
+        return {"text": f"done: {item['text']}", "data": None}
+
+    orchestrator._handle_intent = handle
+    reply = asyncio.run(orchestrator.process_message("user-1", "log 250 food and 100 coffee"))
+    assert reply["intents"] == ["log_expense", "log_expense"]
+    assert [result["text"] for result in reply["results"]] == ["done: log 250 food", "done: 100 coffee"]
+    assert reply["response"] == "done: log 250 food\ndone: 100 coffee"
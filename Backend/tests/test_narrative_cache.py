@@ -0,0 +1,31 @@
+"""Budget narrative cache: bucketed snapshot keys and invalidation."""
+from app.agents.narrative_cache import BudgetNarrativeCache
+
+def test_same_bucket_hits():
+    cache = BudgetNarrativeCache(max_users=10, ttl_seconds=60, bucket_pct=5)
+    cache.store("user-1", {"spent": 100, "limit": 1000}, "10% used")
+    assert cache.lookup("user-1", {"spent": 120, "limit": 1000}) == "10% used"
+    assert cache.stats()["hits"] == 1
+
+def test_bucket_change_invalidates():
+    cache = BudgetNarrativeCache(max_users=10, ttl_seconds=60, bucket_pct=5)
+    cache.store("user-1", {"spent": 100, "limit": 1000}, "10% used")
+    assert cache.lookup("user-1", {"spent": 500, "limit": 1000}) is None
+    # The stale entry is gone, not just skipped
+    assert cache.lookup("user-1", {"spent": 100, "limit": 1000}) is None
+    stats = cache.stats()
+    assert stats["invalidations"] == 1
+    assert stats["misses"] == 2
+    assert stats["entries"] == 0
+
+def test_limit_change_invalidates():
+    cache = BudgetNarrativeCache(max_users=10, ttl_seconds=60, bucket_pct=5)
+    cache.store("user-1", {"spent": 100, "limit": 1000}, "10% used")
+    assert cache.lookup("user-1", {"spent": 200, "limit": 2000}) is None
+
+def test_lru_eviction():
+    cache = BudgetNarrativeCache(max_users=1, ttl_seconds=60)
+    cache.store("user-1", {"spent": 1, "limit": 10}, "a")
+    cache.store("user-2", {"spent": 1, "limit": 10}, "b")
+    assert cache.lookup("user-1", {"spent": 1, "limit": 10}) is None
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,21 @@
+"""Keyset cursors over (created_at, id)."""
+import pytest
+
+from app.utils.pagination import decode_cursor, encode_cursor, keyset_filter
+
+def test_cursor_round_trip():
+    row = {"created_at": "2026-10-18T10:00:00.123+00:00", "id": 42}
+    assert decode_cursor(encode_cursor(row)) == ("2026-10-18T10:00:00.123+00:00", 42)
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", "WzEsMl0", "eyJhIjoxfQ"])
+def test_bad_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_keyset_filter_quotes_timestamps():
+    cursor = ("2026-10-18T10:00:00+00:00", 7)
+    assert keyset_filter(cursor) == (
+        'created_at.lt."2026-10-18T10:00:00+00:00",'
+        'and(created_at.eq."2026-10-18T10:00:00+00:00",id.lt."7")'
+    )
+    assert keyset_filter(cursor, desc=False).startswith('created_at.gt.')
@@ -0,0 +1,55 @@
+"""Daily rollups: period parsing, window sums and the spending aggregate."""
+from datetime import date
+
+from app.utils.rollups import parse_period, period_bounds, sum_window
+from app.utils.spending_cache import SpendingAggregateCache
+
+DAILY = {
+    "2026-01-30": {"Food": 100, "Travel": 50},
+    "2026-02-01": {"Food": 20},
+    "2026-02-03": {"Shopping": 300, "food": 5},
+}
+
+def test_all_time_walks_every_bucket():
+    window = sum_window(DAILY, None, None)
+    assert window["total_spent"] == 475
+    assert window["by_category"]["Food"] == 120
+
+def test_all_time_uses_running_totals():
+    totals = {"Food": 1, "Travel": 2}
+    window = sum_window(DAILY, None, None, totals=totals)
+    assert window == {"total_spent": 3, "by_category": {"Food": 1, "Travel": 2}}
+    assert sum_window(DAILY, None, None, category="travel", totals=totals)["total_spent"] == 2
+
+def test_bounded_window_is_inclusive():
+    window = sum_window(DAILY, date(2026, 2, 1), date(2026, 2, 3), totals={"Food": 999})
+    assert window["total_spent"] == 325
+
+def test_category_filter_ignores_case():
+    window = sum_window(DAILY, date(2026, 1, 1), date(2026, 12, 31), category="FOOD")
+    assert window["by_category"] == {"Food": 120, "food": 5}
+
+def test_sparse_and_dense_windows_agree():
+    dense = sum_window(DAILY, date(2026, 2, 1), date(2026, 2, 2))
+    sparse = sum_window(DAILY, date(2026, 1, 1), date(2026, 2, 2))
+    assert dense["total_spent"] == 20
+    assert sparse["total_spent"] == 170
+
+def test_aggregate_keeps_running_category_totals():
+    rows = [
+        {"spent_amt": 10, "category": "Food", "created_at": "2026-02-01T10:00:00+00:00"},
+        {"spent_amt": 0, "category": "Budget Set", "week_budget": 2000, "created_at": "2026-02-01T11:00:00+00:00"},
+        {"spent_amt": 5, "category": None, "created_at": "2026-02-02T23:30:00-02:00"},
+    ]
+    aggregate = SpendingAggregateCache.build(rows)
+    assert aggregate["by_category"] == {"Food": 10, "Other": 5}
+    assert aggregate["week_budget"] == 2000
+    assert aggregate["daily"]["2026-02-03"] == {"Other": 5}
+    assert sum_window(aggregate["daily"], None, None)["by_category"] == aggregate["by_category"]
+
+def test_period_parsing_and_bounds():
+    assert parse_period("this month") == ("month", None)
+    assert parse_period("last_7_days") == ("days", 7)
+    assert parse_period("fortnight", default="week") == ("week", None)
+    assert period_bounds("week", today=date(2026, 10, 18)) == (date(2026, 10, 12), date(2026, 10, 18))
+    assert period_bounds("month", today=date(2026, 2, 10)) == (date(2026, 2, 1), date(2026, 2, 28))
@@ -0,0 +1,45 @@
+"""Request coalescing: concurrent reads share a flight unless a write lands between them."""
+import asyncio
+from types import SimpleNamespace
+
+from app.agents.orchestrator import DecisionOrchestrator
+from app.utils.singleflight import SingleFlight
+from app.utils.state_version import StateVersions
+
+class SlowBills:
+    def __init__(self):
+        self.calls = 0
+
+    async def get_pending_bills(self, auth_id):
+        self.calls += 1
+        call = self.calls
+        await asyncio.sleep(0.01)
+        return {"call": call}
+
+def _orchestrator():
+    orchestrator = DecisionOrchestrator.__new__(DecisionOrchestrator)
+    orchestrator.single_flight = SingleFlight()
+    orchestrator.supabase_manager = SimpleNamespace(state_versions=StateVersions(enabled=True))
+    orchestrator.payment_agent = SlowBills()
+    return orchestrator
+
+def test_concurrent_reads_share_a_flight():
+    orchestrator = _orchestrator()
+
+    async def run():
+        return await asyncio.gather(*[orchestrator.get_pending_bills("user-1") for _ in range(3)])
+
+    assert asyncio.run(run()) == [{"call": 1}] * 3
+    assert orchestrator.payment_agent.calls == 1
+
+def test_read_after_write_starts_a_new_flight():
+    orchestrator = _orchestrator()
+
+    async def run():
+        before = asyncio.create_task(orchestrator.get_pending_bills("user-1"))
+        await asyncio.sleep(0)
+        orchestrator.supabase_manager.state_versions.bump("user-1")
+        after = await orchestrator.get_pending_bills("user-1")
+        return await before, after
+
+    assert asyncio.run(run()) == ({"call": 1}, {"call": 2})
@@ -0,0 +1,74 @@
+"""Buffered inserts: batching, retry with backoff and abandoning a poisoned batch."""
+import asyncio
+
+from app.utils.write_buffer import WriteBuffer
+
+class FakeQuery:
+    def __init__(self, manager, rows):
+        self.manager, self.rows = manager, rows
+
+    async def execute(self):
+        if self.manager.failures_left:
+            self.manager.failures_left -= 1
+            raise RuntimeError("database unavailable")
+        self.manager.batches.append(list(self.rows))
+
+class FakeTable:
+    def __init__(self, manager):
+        self.manager = manager
+
+    def insert(self, rows):
+        return FakeQuery(self.manager, rows)
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False):
+        return FakeQuery(self.manager, rows)
+
+class FakeManager:
+    def __init__(self, failures=0):
+        self.failures_left = failures
+        self.batches = []
+
+    def table(self, name):
+        return FakeTable(self)
+
+def test_rows_are_written_in_batches():
+    manager = FakeManager()
+    buffer = WriteBuffer(manager, "agent_learning", batch_size=2)
+    for i in range(5):
+        buffer._pending.append({"id": i})
+    assert asyncio.run(buffer.flush()) == 5
+    assert [len(batch) for batch in manager.batches] == [2, 2, 1]
+
+def test_failed_batch_is_requeued_in_order_with_backoff():
+    manager = FakeManager(failures=1)
+    buffer = WriteBuffer(manager, "agent_learning", batch_size=10, retry_backoff=0.5)
+    for i in range(3):
+        buffer._pending.append({"id": i})
+    assert asyncio.run(buffer.flush()) == 0
+    assert not buffer.healthy
+    assert [row["id"] for row in buffer._pending] == [0, 1, 2]
+    assert buffer._retry_at > 0
+    assert asyncio.run(buffer.flush()) == 3
+    assert buffer.healthy
+
+def test_batch_is_dropped_after_max_attempts():
+    manager = FakeManager(failures=2)
+    buffer = WriteBuffer(manager, "agent_learning", batch_size=1, max_attempts=2, retry_backoff=0)
+    buffer._pending.extend([{"id": 0}, {"id": 1}])
+    asyncio.run(buffer.flush())
+    asyncio.run(buffer.flush())
+    stats = buffer.stats()
+    assert stats["abandoned"] == 1
+    assert stats["written"] == 1
+    assert manager.batches == [[{"id": 1}]]
+
+def test_put_fails_fast_while_unhealthy():
+    async def main():
+        buffer = WriteBuffer(FakeManager(), "agent_learning", max_pending=1, interval=60)
+        buffer._attempts = 1
+        assert await buffer.put({"id": 0})
+        assert not await buffer.put({"id": 1}, timeout=5)
+        buffer._task.cancel()
+        return buffer.stats()["dropped"]
+
+    assert asyncio.run(main()) == 1